@@ -0,0 +1,494 @@
+# ./annotate.py
+
+import os
+import json
+import glob
+import time
+import signal
+import argparse
+import multiprocessing as mp_process
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+if __name__ == "__main__":
+    # .env is loaded before any module reading it at import (constants.py)
+    load_dotenv()
+
+from landmark_cache import cache_key
+from pose_backends import (
+    POSE_BACKENDS, create_pose_backend, backend_options_from_env
+)
+from utils import VectorizedTranslatePose, MOVES, UNUSED_LANDMARKS, bitmask_to_moves
+
+
+ANNOTATION_DIR = os.path.join('logs', 'annotations')
+
+
+def plan_segments(video_path, segment_seconds):
+    """
+    splits the video into ranges of frames that are decoded independently,
+    the last one runs until the end of the video, as frame counts are not
+    exact for every container
+
+    segment_seconds <float>: length of a segment (30 FPS if fps is unknown)
+    returns <tuple<float, int, list<tuple<int, int>>>>: fps, frame count
+        (as reported by the container, 0 if unknown) and (start, end)
+        of every segment, end is None for the last one
+    """
+
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise cv2.error(f"Invalid Video Source: {video_path}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 0
+    frame_count = max(int(capture.get(cv2.CAP_PROP_FRAME_COUNT)), 0)
+    capture.release()
+
+    segment_frames = max(int(segment_seconds * (fps or 30)), 1)
+    starts = list(range(0, frame_count, segment_frames)) or [0]
+    return fps, frame_count, list(zip(starts, starts[1:] + [None]))
+
+
+def seek(capture, frame):
+    """
+    positions capture at the given frame, by decoding (and dropping) the
+    frames before it if the container can not seek exactly
+    """
+
+    if not frame:
+        return
+    if capture.set(cv2.CAP_PROP_POS_FRAMES, frame) and (
+        int(capture.get(cv2.CAP_PROP_POS_FRAMES)) == frame
+    ):
+        return
+
+    capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    for _ in range(frame):
+        if not capture.grab():
+            break
+
+
+def init_worker():
+    # Ctrl+C is handled by the main process, which keeps finished segments
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def annotate_segment(video_path, start, end, backend_options):
+    """
+    Runs in a worker process: every frame of [start, end) goes through the
+    pose model and TranslatePose. Both are created for the segment, so its
+    result does not depend on which segments the worker processed before.
+
+    returns <tuple<int, np.ndarray, int>>: start, uint16 bitmask of the
+        Output Moves of every frame (see utils.MOVES), frames with a body
+    """
+
+    capture = cv2.VideoCapture(video_path)
+    seek(capture, start)
+
+    pose = create_pose_backend(**backend_options)
+    translate_pose = VectorizedTranslatePose()
+    unused_landmarks = np.array(UNUSED_LANDMARKS)
+
+    moves = []
+    found_frames = 0
+    frame = start
+    while end is None or frame < end:
+        success, img = capture.read()
+        if not success:
+            break
+        frame += 1
+
+        pose_landmarks = pose.process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        if pose_landmarks is None:
+            moves.append(0)
+            continue
+        found_frames += 1
+        pose_landmarks[unused_landmarks, 3] = 0
+        moves.append(translate_pose.evaluate_bits(pose_landmarks))
+
+    capture.release()
+    pose.close()
+    return start, np.array(moves, np.uint16), found_frames
+
+
+def move_stats(moves, fps):
+    """
+    moves <np.ndarray>: uint16 bitmask of every frame
+    returns <dict<str:move, dict>>: frames the move was portrayed in,
+        seconds (None if fps is unknown) and count of separate occurrences
+    """
+
+    mask = (moves[:, None] >> np.arange(len(MOVES))) & 1
+    starts = mask[:1].sum(axis=0) + (mask[1:] & (1 - mask[:-1])).sum(axis=0)
+    return {
+        move: {
+            'frames': int(mask[:, bit].sum()),
+            'seconds': float(mask[:, bit].sum() / fps) if fps else None,
+            'count': int(starts[bit]),
+        }
+        for bit, move in enumerate(MOVES)
+    }
+
+
+def move_timeline(moves, fps):
+    """
+    returns <list<dict>>: every change of the Output Moves, same format as
+        the timeline of benchmark.py
+    """
+
+    if not len(moves):
+        return []
+    changes = np.concatenate(([0], np.flatnonzero(moves[1:] ^ moves[:-1]) + 1))
+    return [
+        {
+            'frame': int(frame),
+            'time': frame / fps if fps else None,
+            'bits': int(moves[frame]),
+            'moves': bitmask_to_moves(int(moves[frame])),
+        }
+        for frame in changes
+    ]
+
+
+class VideoAnnotation:
+    """
+    Output folder of a video, named by its landmark_cache.cache_key:
+    segments/<start>-<end>.npz (one per finished segment, kept until merged),
+    then moves.npy (bitmask of every frame) and annotation.json
+    (timeline and move statistics) once every segment is done
+    """
+
+    def __init__(self, video_path, output_dir, segment_seconds, content_hash=False):
+        """
+        content_hash <bool>: see landmark_cache.cache_key
+        """
+
+        self.video_path = video_path
+        self.key = cache_key(video_path, content_hash)
+        self.path = os.path.join(output_dir, self.key)
+        self.segment_dir = os.path.join(self.path, 'segments')
+        self.annotation_path = os.path.join(self.path, 'annotation.json')
+
+        self.fps, self.frame_count, self.segments = plan_segments(
+            video_path, segment_seconds
+        )
+
+    def done(self):
+        return os.path.exists(self.annotation_path)
+
+    def segment_path(self, start, end):
+        # end in the name, so segments of another segment_seconds are not reused
+        return os.path.join(self.segment_dir, f"{start}-{end or 'end'}.npz")
+
+    def pending_segments(self):
+        return [
+            (start, end) for start, end in self.segments
+            if not os.path.exists(self.segment_path(start, end))
+        ]
+
+    def pending_frames(self):
+        """
+        returns <int>: frames of the pending segments, as far as the
+            container reports them
+        """
+
+        return sum(
+            (end if end is not None else max(self.frame_count, start)) - start
+            for start, end in self.pending_segments()
+        )
+
+    def clear_segments(self):
+        if os.path.exists(self.segment_dir):
+            for name in os.listdir(self.segment_dir):
+                os.remove(os.path.join(self.segment_dir, name))
+            os.rmdir(self.segment_dir)
+
+    def clear(self):
+        self.clear_segments()
+        if os.path.exists(self.annotation_path):
+            os.remove(self.annotation_path)
+
+    def save_segment(self, start, end, moves, found_frames):
+        if not os.path.exists(self.segment_dir):
+            os.makedirs(self.segment_dir)
+
+        # Written under a temporary name, so an interrupted write is redone
+        path = self.segment_path(start, end)
+        with open(f"{path}.tmp", 'wb') as segment_file:
+            np.savez(segment_file, moves=moves, found_frames=found_frames)
+        os.replace(f"{path}.tmp", path)
+
+    def merge(self):
+        """
+        joins the segments into moves.npy and annotation.json,
+        then removes them
+        returns <dict>: the annotation
+        """
+
+        segments = [
+            np.load(self.segment_path(start, end)) for start, end in self.segments
+        ]
+        moves = np.concatenate([segment['moves'] for segment in segments])
+        found_frames = sum(int(segment['found_frames']) for segment in segments)
+
+        np.save(os.path.join(self.path, 'moves.npy'), moves)
+        annotation = {
+            'video': self.video_path,
+            'key': self.key,
+            'fps': self.fps,
+            'frames': len(moves),
+            'found_frames': found_frames,
+            'segments': len(self.segments),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'moves': move_stats(moves, self.fps),
+            'timeline': move_timeline(moves, self.fps),
+        }
+        with open(self.annotation_path, 'w') as annotation_file:
+            json.dump(annotation, annotation_file, indent=2)
+
+        self.clear_segments()
+        return annotation
+
+    def load(self):
+        with open(self.annotation_path) as annotation_file:
+            return json.load(annotation_file)
+
+
+def summarize_annotations(annotations):
+    """
+    returns <dict>: frames, seconds and move statistics over every video
+    """
+
+    totals = {
+        move: {'frames': 0, 'seconds': 0.0, 'count': 0} for move in MOVES
+    }
+    for annotation in annotations:
+        for move, stats in annotation['moves'].items():
+            totals[move]['frames'] += stats['frames']
+            totals[move]['seconds'] += stats['seconds'] or 0
+            totals[move]['count'] += stats['count']
+
+    return {
+        'videos': len(annotations),
+        'frames': sum(annotation['frames'] for annotation in annotations),
+        'found_frames': sum(annotation['found_frames'] for annotation in annotations),
+        'seconds': sum(
+            annotation['frames'] / annotation['fps']
+            for annotation in annotations if annotation['fps']
+        ),
+        'moves': totals,
+        'per_video': {
+            annotation['video']: {
+                'key': annotation['key'],
+                'frames': annotation['frames'],
+                'moves': {
+                    move: stats['count']
+                    for move, stats in annotation['moves'].items()
+                },
+            }
+            for annotation in annotations
+        },
+    }
+
+
+def annotate_corpus(
+    video_paths, output_dir=ANNOTATION_DIR, workers=None, segment_seconds=60,
+    backend_options=None, force=False, content_hash=False
+):
+    """
+    Annotates every video with the Output Moves of every frame, splitting
+    videos into segments of segment_seconds that are processed in parallel
+    by a pool of worker processes (each with its own pose model and
+    TranslatePose).
+
+    Finished segments are kept in output_dir, so an interrupted run resumes
+    from them, videos already annotated are skipped (unless force).
+
+    video_paths <list<str>>: recorded videos (eg: logs/log_*.avi)
+    workers <int>: worker processes, defaults to the number of CPUs
+    backend_options <dict>: arguments of pose_backends.create_pose_backend
+    content_hash <bool>: if True, videos are keyed by the sha256 of their
+        content (reads every video in full, but copies are annotated once)
+        instead of their name, size and modification time
+    returns <dict>: summarize_annotations() of every video
+    """
+
+    backend_options = backend_options or {'name': 'mediapipe'}
+    workers = workers or os.cpu_count()
+
+    annotations = {}
+    videos = {}
+    # key -> first path, copies of a video (same content hash) are annotated once
+    keys = {}
+    copies = {}
+    for video_path in video_paths:
+        video = VideoAnnotation(video_path, output_dir, segment_seconds, content_hash)
+        if video.key in keys:
+            copies[video_path] = keys[video.key]
+            continue
+        keys[video.key] = video_path
+
+        if force:
+            video.clear()
+        if video.done():
+            annotations[video_path] = video.load()
+        elif not video.pending_segments():
+            # Interrupted after its last segment, before merging
+            annotations[video_path] = video.merge()
+        else:
+            videos[video_path] = video
+
+    tasks = [
+        (video, start, end)
+        for video in videos.values() for start, end in video.pending_segments()
+    ]
+    remaining = {
+        video_path: len(video.pending_segments())
+        for video_path, video in videos.items()
+    }
+    pending_frames = sum(video.pending_frames() for video in videos.values())
+    print(
+        f"[annotate] {len(video_paths)} videos: {len(annotations)} annotated, "
+        f"{len(tasks)} segments ({pending_frames} frames) to process "
+        f"on {workers} workers"
+    )
+
+    processed_frames = 0
+    start_time = time.perf_counter()
+
+    # spawn: same behaviour on every platform, workers do not inherit models
+    executor = ProcessPoolExecutor(
+        workers, mp_context=mp_process.get_context('spawn'),
+        initializer=init_worker
+    )
+    futures = {}
+    saved = set()
+    try:
+        futures = {
+            executor.submit(
+                annotate_segment, video.video_path, start, end, backend_options
+            ): (video, end)
+            for video, start, end in tasks
+        }
+        for finished, future in enumerate(as_completed(futures), 1):
+            video, end = futures[future]
+            start, moves, found_frames = future.result()
+            video.save_segment(start, end, moves, found_frames)
+            saved.add(future)
+
+            processed_frames += len(moves)
+            elapsed = time.perf_counter() - start_time
+            fps = processed_frames / elapsed if elapsed else 0
+            left = max(pending_frames - processed_frames, 0)
+            eta = time.strftime('%H:%M:%S', time.gmtime(left / fps)) if fps else '-'
+            print(
+                f"[annotate] {finished}/{len(tasks)} segments, "
+                f"{processed_frames}/{pending_frames} frames, "
+                f"{fps:.1f} FPS, eta {eta}"
+            )
+
+            remaining[video.video_path] -= 1
+            if not remaining[video.video_path]:
+                annotations[video.video_path] = video.merge()
+                print(f"[annotate] {video.video_path} -> {video.path}")
+    except KeyboardInterrupt:
+        print("[annotate] interrupted, waiting for the segments being processed")
+        executor.shutdown(cancel_futures=True)
+        # Segments finished meanwhile are kept as well, not decoded again
+        kept = 0
+        for future, (video, end) in futures.items():
+            if (
+                future in saved or not future.done() or future.cancelled()
+                or future.exception() is not None
+            ):
+                continue
+            start, moves, found_frames = future.result()
+            video.save_segment(start, end, moves, found_frames)
+            kept += 1
+        print(
+            f"[annotate] {len(saved) + kept} finished segments are kept, "
+            "run again to resume"
+        )
+        raise
+    finally:
+        # Segments not started yet are dropped if a worker (or Ctrl+C) failed
+        executor.shutdown(cancel_futures=True)
+
+    for video_path, original_path in copies.items():
+        annotations[video_path] = {**annotations[original_path], 'video': video_path}
+
+    summary = summarize_annotations([
+        annotations[video_path] for video_path in video_paths
+    ])
+    with open(os.path.join(output_dir, 'summary.json'), 'w') as summary_file:
+        json.dump(summary, summary_file, indent=2)
+    return summary
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        prog="Pose2Input-MK9 Annotate",
+        description="Annotate a folder of recorded videos with the Output Moves "
+            "of every frame, using every core"
+    )
+    parser.add_argument(
+        'video_dir', help='folder of recorded videos (eg: logs)'
+    )
+    parser.add_argument(
+        '-p', '--pattern', metavar='', default='log_*.avi',
+        help='file names to annotate, defaults to "log_*.avi"'
+    )
+    parser.add_argument(
+        '-o', '--output_dir', metavar='', default=ANNOTATION_DIR,
+        help=f'folder of the annotations, defaults to "{ANNOTATION_DIR}"'
+    )
+    parser.add_argument(
+        '-j', '--workers', type=int, metavar='', default=0,
+        help='worker processes, 0 for the number of CPUs'
+    )
+    parser.add_argument(
+        '-s', '--segment_seconds', type=float, metavar='', default=60,
+        help='length of the segments processed in parallel'
+    )
+    parser.add_argument(
+        '-b', '--backend', metavar='', choices=POSE_BACKENDS,
+        default=os.getenv('POSE_BACKEND', 'mediapipe'),
+        help=f'pose estimation model <{", ".join(POSE_BACKENDS)}>'
+    )
+    parser.add_argument(
+        '-f', '--force', action='store_true', help='annotate even if annotated'
+    )
+    parser.add_argument(
+        '-H', '--content_hash', action='store_true',
+        help='keys videos by the sha256 of their content instead of their '
+            'name, size and modification time (reads every video in full)'
+    )
+    args = parser.parse_args()
+
+    video_paths = sorted(glob.glob(os.path.join(args.video_dir, args.pattern)))
+    if not video_paths:
+        raise SystemExit(f"no {args.pattern} in {args.video_dir}")
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    try:
+        summary = annotate_corpus(
+            video_paths, args.output_dir, args.workers or None,
+            args.segment_seconds, backend_options_from_env(args.backend), args.force,
+            args.content_hash
+        )
+    except KeyboardInterrupt:
+        raise SystemExit(1)
+
+    print(
+        f"{summary['videos']} videos, {summary['frames']} frames "
+        f"({summary['found_frames']} with a body)"
+    )
+    print(f"{'move':<14}{'count':>10}{'seconds':>10}")
+    for move, stats in summary['moves'].items():
+        print(f"{move:<14}{stats['count']:>10}{stats['seconds']:>10.1f}")
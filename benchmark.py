@@ -0,0 +1,181 @@
+# ./benchmark.py
+
+import os
+import json
+import time
+import argparse
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+if __name__ == "__main__":
+    # .env is loaded before any module reading it at import (constants.py)
+    load_dotenv()
+
+from utils import bitmask_to_moves
+from metrics import summarize_latencies
+from translate import FrameProcessor
+from replay import open_frame_source, RecordingSink
+from pose_backends import (
+    POSE_BACKENDS, create_pose_backend, backend_options_from_env
+)
+
+
+def run_benchmark(
+    source_path, max_frames=0, motion_threshold_factor=48,
+    motion_downscale=4, motion_grayscale=False, roi_flag=False,
+    backend_options=None
+):
+    """
+    replays a recorded video or a directory of frames through FrameProcessor,
+    as fast as possible, with keystrokes going to a RecordingSink
+
+    source_path <str>: video file or directory of frames
+    max_frames <int>: stop after these many frames, 0 for whole source
+    backend_options <dict>: arguments of pose_backends.create_pose_backend
+    other arguments are same as translate()
+
+    returns <dict>: results, which can be dumped as JSON
+    """
+
+    source = open_frame_source(source_path)
+    success, first_img = source.read()
+    if not success:
+        raise ValueError(f"Empty Video Source: {source_path}")
+
+    backend_options = backend_options or {'name': 'mediapipe'}
+    sink = RecordingSink()
+    frame_processor = FrameProcessor(
+        first_img, create_pose_backend(**backend_options),
+        motion_threshold_factor, motion_downscale,
+        motion_grayscale, roi_flag, key_sink=sink
+    )
+
+    stage_samples = {stage: [] for stage in FrameProcessor.STAGES}
+    stage_samples['frame'] = []
+    timeline = []
+    prv_moves = 0
+    frames = 0
+
+    start = time.perf_counter()
+    while not max_frames or frames < max_frames:
+        success, img = source.read()
+        if not success:
+            break
+        frames += 1
+        sink.frame = frames
+
+        frame_start = time.perf_counter()
+        motion_detected, pose_landmarks, _ = frame_processor.infer(img)
+        moves = frame_processor.dispatch(pose_landmarks, motion_detected)
+        stage_samples['frame'].append(time.perf_counter() - frame_start)
+
+        for stage, duration in frame_processor.stage_times.items():
+            if duration is not None:
+                stage_samples[stage].append(duration)
+
+        # Only changes of the Output Moves are kept
+        if moves ^ prv_moves:
+            timeline.append({
+                'frame': frames,
+                'time': frames / source.fps if source.fps else None,
+                'bits': moves,
+                'moves': bitmask_to_moves(moves),
+            })
+            prv_moves = moves
+
+    wall_time = time.perf_counter() - start
+    source.release()
+    frame_processor.pose.close()
+
+    return {
+        'source': source_path,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'settings': {
+            'max_frames': max_frames,
+            'motion_threshold_factor': motion_threshold_factor,
+            'motion_downscale': motion_downscale,
+            'motion_grayscale': motion_grayscale,
+            'roi_flag': roi_flag,
+            'pose_backend': backend_options,
+        },
+        'frames': frames,
+        'inferred_frames': len(stage_samples['pose_process']),
+        'wall_time': wall_time,
+        'fps': frames / wall_time if wall_time else 0,
+        'latency_ms': {
+            stage: summarize_latencies(samples)
+            for stage, samples in stage_samples.items()
+        },
+        'keystrokes': sum(1 for _, keys in sink.records if keys),
+        'timeline': timeline,
+    }
+
+
+def print_results(results):
+    print(
+        f"{results['source']}: {results['frames']} frames "
+        f"({results['inferred_frames']} inferred) in {results['wall_time']:.2f}s"
+        f" -> {results['fps']:.2f} FPS"
+    )
+    print(f"{'stage':<16}{'count':>8}{'mean':>10}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}")
+    for stage, summary in results['latency_ms'].items():
+        if not summary['count']:
+            print(f"{stage:<16}{0:>8}")
+            continue
+        print(f"{stage:<16}{summary['count']:>8}" + "".join(
+            f"{summary[key]:>10.3f}" for key in ('mean', 'p50', 'p90', 'p99', 'max')
+        ))
+    print(f"{len(results['timeline'])} move changes, {results['keystrokes']} keystrokes")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        prog="Pose2Input-MK9 Benchmark",
+        description="Replay a recorded video (or directory of frames) "
+            "as fast as possible and report per-stage latencies"
+    )
+    parser.add_argument(
+        'source', help='video file (eg: logs/log_*.avi) or directory of frames'
+    )
+    parser.add_argument(
+        '-o', '--output', metavar='',
+        help='JSON file for the results, defaults to "logs/bench_<time>.json"'
+    )
+    parser.add_argument(
+        '-n', '--max_frames', type=int, metavar='', default=0,
+        help='stop after these many frames, 0 for whole source'
+    )
+    parser.add_argument(
+        '-r', '--roi_flag', action='store_true',
+        help='pose estimation only processes a region around the player'
+    )
+    parser.add_argument(
+        '-b', '--backend', metavar='', choices=POSE_BACKENDS,
+        default=os.getenv('POSE_BACKEND', 'mediapipe'),
+        help=f'pose estimation model <{", ".join(POSE_BACKENDS)}>'
+    )
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        args.source,
+        max_frames=args.max_frames,
+        motion_threshold_factor=int(
+            os.getenv('MOTION_THRESHOLD_FACTOR', 64)
+        ),
+        motion_downscale=int(os.getenv('MOTION_DOWNSCALE', 4)),
+        motion_grayscale=os.getenv('MOTION_GRAYSCALE', 'false').lower() == 'true',
+        roi_flag=args.roi_flag,
+        backend_options=backend_options_from_env(args.backend),
+    )
+    print_results(results)
+
+    output = args.output or (
+        f"logs/bench_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json"
+    )
+    if os.path.dirname(output) and not os.path.exists(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+    with open(output, 'w') as results_file:
+        json.dump(results, results_file, indent=2)
+    print(f"results saved to {output}")
@@ -0,0 +1,229 @@
+# ./calibration.py
+
+import os
+import json
+import time
+import platform
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from translate import open_camera
+from metrics import summarize_latencies
+from pose_backends import create_pose_backend, MediaPipeBackend
+
+
+CACHE_PATH = os.path.join('logs', 'calibration.json')
+
+# Scales of the frame given to the pose model, largest (most accurate) first
+INFER_SCALES = (1.0, 0.75, 0.5)
+
+# MediaPipe model complexities, heaviest (most accurate) first, 2 is only
+# tried if allowed (max_model_complexity), as the mediapipe package does not
+# ship it: it is downloaded on first use, which fails offline
+MODEL_COMPLEXITIES = (2, 1, 0)
+
+
+def profile_key(
+    camera_port, camera_options, backend_name, latency_budget, max_model_complexity=1
+):
+    """
+    returns <str>: identifies the machine, the camera (and its requested
+        settings), the backend, the budget and the heaviest model allowed,
+        a profile is only reused for the same key
+    """
+
+    return json.dumps({
+        'machine': platform.node(),
+        'arch': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'camera_port': camera_port,
+        'camera_options': camera_options,
+        'backend': backend_name,
+        'latency_budget_ms': round(latency_budget * 1000, 3),
+        'max_model_complexity': max_model_complexity,
+    }, sort_keys=True)
+
+
+def load_profile(key, cache_path=CACHE_PATH):
+    if not os.path.exists(cache_path):
+        return None
+    with open(cache_path) as cache_file:
+        return json.load(cache_file).get(key)
+
+
+def save_profile(key, profile, cache_path=CACHE_PATH):
+    profiles = {}
+    if os.path.exists(cache_path):
+        with open(cache_path) as cache_file:
+            profiles = json.load(cache_file)
+    profiles[key] = profile
+
+    if os.path.dirname(cache_path) and not os.path.exists(os.path.dirname(cache_path)):
+        os.makedirs(os.path.dirname(cache_path))
+    with open(cache_path, 'w') as cache_file:
+        json.dump(profiles, cache_file, indent=2)
+
+
+def prepare_frame(img, infer_scale):
+    """
+    same resize and color conversion as FrameProcessor.infer
+    """
+
+    if infer_scale < 1:
+        img = cv2.resize(
+            img, None, fx=infer_scale, fy=infer_scale, interpolation=cv2.INTER_AREA
+        )
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+def time_inference(camera, pose_backend, infer_scale, frames=20, warmup=5):
+    """
+    returns <list<float>>: seconds of resize, color conversion and inference
+        for every live frame after the warm up ones
+    """
+
+    samples = []
+    for i in range(warmup + frames):
+        success, img = camera.read()
+        if not success:
+            break
+
+        start = time.perf_counter()
+        pose_backend.process(prepare_frame(img, infer_scale))
+        if i >= warmup:
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def calibrate(
+    camera_port="0", camera_options=None, backend_options=None,
+    latency_budget=1 / 30, frames=20, warmup=5, cache_path=CACHE_PATH, force=False,
+    open_camera_func=None, max_model_complexity=1
+):
+    """
+    Picks the most accurate model settings (MediaPipe model_complexity, then
+    infer_scale) whose p90 inference time on live frames fits latency_budget,
+    or the fastest ones if none fits. Candidates are timed from the most
+    accurate down, so the sweep stops at the first one that fits.
+
+    The profile is cached per machine and camera in cache_path, later calls
+    only load and warm up the chosen model.
+
+    camera_port <str>, camera_options <dict>: same as translate()
+    backend_options <dict>: arguments of pose_backends.create_pose_backend,
+        model_complexity is overridden for MediaPipe
+    latency_budget <float>: seconds the inference of a frame may take
+    frames <int>: frames timed per candidate, after warmup frames
+    force <bool>: if True, calibrate again even if a profile is cached
+    open_camera_func <callable>: returns the (camera, first frame) to time
+        on, only called if not cached, the camera is then left open for the
+        caller, by default camera_port is opened and released
+    max_model_complexity <int>: heaviest MediaPipe model tried, 2 needs
+        network access the first time (the model is downloaded)
+
+    returns <tuple<PoseBackend, float, dict>>: warmed up pose model,
+        infer_scale for FrameProcessor, and the profile
+    """
+
+    camera_options = camera_options or {}
+    backend_options = dict(backend_options or {'name': MediaPipeBackend.name})
+    key = profile_key(
+        camera_port, camera_options, backend_options['name'], latency_budget,
+        max_model_complexity
+    )
+
+    profile = None if force else load_profile(key, cache_path)
+    if profile is not None:
+        backend_options.update(profile['backend_options'])
+        pose_backend = create_pose_backend(**backend_options)
+
+        # Warm up on blank frames, so the first live frame is not slower
+        blank = np.zeros(profile['frame_shape'], np.uint8)
+        for _ in range(warmup):
+            pose_backend.process(prepare_frame(blank, profile['infer_scale']))
+
+        print(f"[calibration] cached profile {profile['backend_options']} "
+              f"infer_scale={profile['infer_scale']}")
+        return pose_backend, profile['infer_scale'], profile
+
+    complexities = (
+        tuple(
+            complexity for complexity in MODEL_COMPLEXITIES
+            if complexity <= max_model_complexity
+        )
+        if backend_options['name'] == MediaPipeBackend.name else (None,)
+    )
+    if open_camera_func is None:
+        camera, first_img = open_camera(camera_port, **camera_options)
+    else:
+        camera, first_img = open_camera_func()
+
+    results = []
+    chosen = None
+    try:
+        for complexity in complexities:
+            options = {} if complexity is None else {'model_complexity': complexity}
+            pose_backend = create_pose_backend(**{**backend_options, **options})
+
+            for infer_scale in INFER_SCALES:
+                latency = summarize_latencies(time_inference(
+                    camera, pose_backend, infer_scale, frames,
+                    warmup if infer_scale == INFER_SCALES[0] else 1
+                ))
+                result = {
+                    'backend_options': options, 'infer_scale': infer_scale,
+                    'latency_ms': latency,
+                }
+                results.append(result)
+                print(f"[calibration] {options} infer_scale={infer_scale} "
+                      f"p90={latency.get('p90', float('nan')):.2f}ms")
+
+                if not latency['count']:
+                    # Capturing Device ran out of frames, nothing more to time
+                    break
+                if latency['p90'] <= latency_budget * 1000:
+                    chosen = (result, pose_backend)
+                    break
+
+            if chosen:
+                break
+            pose_backend.close()
+            if not latency['count']:
+                break
+    finally:
+        if open_camera_func is None:
+            camera.release()
+
+    timed = [result for result in results if result['latency_ms']['count']]
+    if not timed:
+        raise cv2.error(
+            "Calibration failed: no frame could be read from the Capturing Device"
+        )
+
+    if chosen is None:
+        # Nothing fits, fastest candidate
+        result = min(timed, key=lambda result: result['latency_ms']['p90'])
+        pose_backend = create_pose_backend(
+            **{**backend_options, **result['backend_options']}
+        )
+        for _ in range(warmup):
+            pose_backend.process(prepare_frame(first_img, result['infer_scale']))
+        chosen = (result, pose_backend)
+
+    result, pose_backend = chosen
+    profile = {
+        'backend_options': result['backend_options'],
+        'infer_scale': result['infer_scale'],
+        'latency_budget_ms': latency_budget * 1000,
+        'fits_budget': result['latency_ms']['p90'] <= latency_budget * 1000,
+        'frame_shape': list(first_img.shape),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'results': results,
+    }
+    save_profile(key, profile, cache_path)
+    print(f"[calibration] chose {profile['backend_options']} "
+          f"infer_scale={profile['infer_scale']}")
+    return pose_backend, profile['infer_scale'], profile
@@ -0,0 +1,176 @@
+# ./camera.py
+
+import sys
+import threading
+
+import cv2
+
+
+# Names accepted for CAMERA_BACKEND, 'auto' picks one per platform
+BACKENDS = {
+    'auto': None,
+    'any': cv2.CAP_ANY,
+    'v4l2': cv2.CAP_V4L2,
+    'dshow': cv2.CAP_DSHOW,
+    'msmf': cv2.CAP_MSMF,
+    'avfoundation': cv2.CAP_AVFOUNDATION,
+    'gstreamer': cv2.CAP_GSTREAMER,
+    'ffmpeg': cv2.CAP_FFMPEG,
+}
+
+
+def default_backend(camera_port):
+    """
+    camera_port <int | str>: port number, or url / path
+    returns <int>: native backend of the platform for a port number,
+        cv2.CAP_ANY for an url / path
+    """
+
+    if not isinstance(camera_port, int):
+        return cv2.CAP_ANY
+    if sys.platform.startswith('linux'):
+        return cv2.CAP_V4L2
+    if sys.platform == 'win32':
+        return cv2.CAP_DSHOW
+    if sys.platform == 'darwin':
+        return cv2.CAP_AVFOUNDATION
+    return cv2.CAP_ANY
+
+
+def decode_fourcc(value):
+    """
+    value <float>: CAP_PROP_FOURCC as returned by cv2.VideoCapture.get
+    returns <str>: eg: 'MJPG', empty if unknown
+    """
+
+    value = int(value)
+    return "".join(chr((value >> 8 * i) & 0xFF) for i in range(4)) if value > 0 else ""
+
+
+class Camera:
+    """
+    Same `read`, `get` and `release` as cv2.VideoCapture, but opened with the
+    native backend of the platform (V4L2 on Linux), with the requested
+    resolution, FPS and pixel format (FourCC), and a driver buffer of
+    `buffer_size` frames, so `read` does not return frames that are several
+    intervals old.
+
+    If the driver does not honour the buffer size (or drain is True), frames
+    are drained on a background thread and `read` returns the newest one.
+    """
+
+    def __init__(
+        self, camera_port, backend='auto', width=0, height=0, fps=0, fourcc='',
+        buffer_size=1, drain=None
+    ):
+        """
+        camera_port <int | str>: port number, or url / path
+        backend <str>: key of BACKENDS
+        width, height <int>: requested resolution, 0 for driver default
+        fps <float>: requested FPS, 0 for driver default
+        fourcc <str>: requested pixel format (eg: MJPG, YUYV), empty for default
+        buffer_size <int>: requested driver buffer (frames), 0 for default
+        drain <bool>: always drain on a thread, None to only do so if the
+            driver kept a deeper buffer than requested
+        """
+
+        api = BACKENDS[backend.lower()]
+        if api is None:
+            api = default_backend(camera_port)
+
+        self.capture = cv2.VideoCapture(camera_port, api)
+        if not self.capture.isOpened():
+            raise cv2.error("Invalid Video Source")
+
+        # FourCC first, V4L2 only lists resolutions of the current format
+        if fourcc:
+            self.capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        if width:
+            self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        if height:
+            self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if fps:
+            self.capture.set(cv2.CAP_PROP_FPS, fps)
+        if buffer_size:
+            self.capture.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+
+        self.requested = {
+            'backend': backend, 'width': width, 'height': height, 'fps': fps,
+            'fourcc': fourcc, 'buffer_size': buffer_size,
+        }
+        self.settings = self.negotiated()
+
+        if drain is None:
+            drain = bool(buffer_size) and self.settings['buffer_size'] != buffer_size
+        self.drain = drain
+
+        # Frames grabbed but never returned by read
+        self.drained = 0
+
+        self._worker = None
+        if drain:
+            self._latest = (False, None)
+            self._grabbed = 0
+            self._returned = 0
+            self._ended = False
+            self._closed = False
+            self._new_frame = threading.Condition()
+            self._worker = threading.Thread(
+                target=self._run, name='camera_drain', daemon=True
+            )
+            self._worker.start()
+
+    def negotiated(self):
+        """
+        returns <dict>: settings the driver actually applied
+        """
+
+        get = self.capture.get
+        return {
+            'backend': self.capture.getBackendName(),
+            'width': int(get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'fps': get(cv2.CAP_PROP_FPS),
+            'fourcc': decode_fourcc(get(cv2.CAP_PROP_FOURCC)),
+            'buffer_size': int(get(cv2.CAP_PROP_BUFFERSIZE)),
+        }
+
+    def read(self):
+        if self._worker is None:
+            return self.capture.read()
+
+        # Waits for a frame newer than the last one returned
+        with self._new_frame:
+            while self._grabbed == self._returned and not self._ended:
+                self._new_frame.wait()
+            if self._grabbed == self._returned:
+                return False, None
+
+            self.drained += self._grabbed - self._returned - 1
+            self._returned = self._grabbed
+            return self._latest
+
+    def get(self, prop):
+        return self.capture.get(prop)
+
+    def release(self):
+        if self._worker is not None:
+            with self._new_frame:
+                self._closed = True
+            self._worker.join()
+        self.capture.release()
+
+    def _run(self):
+        while True:
+            success, img = self.capture.read()
+            with self._new_frame:
+                if self._closed:
+                    return
+                if not success:
+                    self._ended = True
+                else:
+                    self._latest = (success, img)
+                    self._grabbed += 1
+                self._new_frame.notify()
+            if not success:
+                return
@@ -0,0 +1,214 @@
+# ./classifier_benchmark.py
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+from collections import namedtuple
+
+import numpy as np
+
+from utils import TranslatePose, VectorizedTranslatePose, MOVES, moves_to_bitmask
+from synthetic_poses import KINDS, generate_corpus, load_corpus
+
+
+# Same fields as the landmarks returned by MediaPipe (pose_landmarks.landmark)
+Landmark = namedtuple('Landmark', ('x', 'y', 'z', 'visibility'))
+
+# Returned by an implementation for a sample it fails on (eg: ZeroDivisionError)
+FAILED = -1
+
+
+def landmark_lists(landmarks):
+    """
+    returns <list<list<Landmark>>>: every (33, 4) landmarks as MediaPipe gives them
+    """
+
+    return [
+        [Landmark(*mark) for mark in sample.tolist()] for sample in landmarks
+    ]
+
+
+def classifier_implementations():
+    """
+    every way of deducing the Output Moves, each one is called with the
+    corpus (landmarks array and landmark lists) and returns the bitmask of
+    every sample (FAILED if it raised), the first one is the reference
+
+    returns <dict<str, callable>>
+    """
+
+    translate_pose = TranslatePose()
+    vectorized = VectorizedTranslatePose()
+
+    def each(classify, lists=False):
+        def run(landmarks, landmark_lists):
+            samples = landmark_lists if lists else landmarks
+            bits = np.empty(len(samples), np.int64)
+            for i, sample in enumerate(samples):
+                try:
+                    bits[i] = classify(sample)
+                except ZeroDivisionError:
+                    bits[i] = FAILED
+            return bits
+        return run
+
+    return {
+        # scalar TranslatePose, on MediaPipe like landmarks
+        'reference': each(
+            lambda sample: moves_to_bitmask(translate_pose.process(sample)), lists=True
+        ),
+        # VectorizedTranslatePose, converting MediaPipe like landmarks
+        'vectorized_list': each(vectorized.evaluate_bits, lists=True),
+        'vectorized_process': each(
+            lambda sample: moves_to_bitmask(vectorized.process(sample))
+        ),
+        'vectorized_bits': each(vectorized.evaluate_bits),
+        'vectorized_mask': each(
+            lambda sample: vectorized.mask_to_bits(vectorized.evaluate(sample))
+        ),
+        'vectorized_batch': lambda landmarks, landmark_lists: (
+            vectorized.mask_to_bits(vectorized.evaluate_batch(landmarks))
+        ),
+    }
+
+
+def run_classifier_benchmark(corpus, implementations=None, repeat=3, max_mismatches=20):
+    """
+    times every implementation over the whole corpus (best of `repeat`) and
+    checks that all of them deduce the same Output Moves as the reference
+    for every sample, failing on a sample (FAILED) is a mismatch as well,
+    unless the reference fails on it too
+
+    corpus <dict>: see synthetic_poses.generate_corpus
+    implementations <dict<str, callable>>: see classifier_implementations
+    max_mismatches <int>: mismatching samples listed per implementation
+    returns <dict>: results, which can be dumped as JSON
+    """
+
+    implementations = implementations or classifier_implementations()
+    landmarks = np.ascontiguousarray(corpus['landmarks'], np.float32)
+    lists = landmark_lists(landmarks)
+
+    outputs = {}
+    results = {'samples': len(landmarks), 'implementations': {}}
+    for name, implementation in implementations.items():
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            bits = implementation(landmarks, lists)
+            best = min(best, time.perf_counter() - start)
+        outputs[name] = np.asarray(bits, np.int64)
+        results['implementations'][name] = {
+            'seconds': best,
+            'classifications_per_sec': len(landmarks) / best if best else None,
+            'failed': int((outputs[name] == FAILED).sum()),
+        }
+
+    reference_name = next(iter(implementations))
+    reference = outputs[reference_name]
+    results['reference'] = reference_name
+
+    for name, bits in outputs.items():
+        mismatches = np.flatnonzero(bits != reference)
+        differing = int(np.bitwise_or.reduce(
+            bits[mismatches] ^ reference[mismatches], initial=0
+        ))
+        results['implementations'][name].update({
+            'mismatches': len(mismatches),
+            'mismatched_moves': [
+                move for bit, move in enumerate(MOVES) if differing >> bit & 1
+            ],
+            'mismatched_samples': [
+                {
+                    'index': int(i), 'kind': KINDS[corpus['kinds'][i]],
+                    'reference': int(reference[i]), 'bits': int(bits[i]),
+                }
+                for i in mismatches[:max_mismatches]
+            ],
+        })
+
+    # How often every move fires (per the reference), and how often the
+    # moves a sample is meant to portray are exactly the ones deduced
+    intended = corpus['intended'].astype(np.int64)
+    results['coverage'] = {}
+    for kind_index, kind in enumerate(KINDS):
+        in_kind = (reference != FAILED) & (corpus['kinds'] == kind_index)
+        fired = (reference[in_kind, np.newaxis] >> np.arange(len(MOVES))) & 1
+        results['coverage'][kind] = {
+            'samples': int(in_kind.sum()),
+            'intended_matched': int((reference[in_kind] == intended[in_kind]).sum()),
+            'moves': dict(zip(MOVES, fired.sum(axis=0).tolist())),
+        }
+
+    # the frame loop would crash on a sample any implementation fails on
+    results['passed'] = all(
+        result['mismatches'] == 0 and result['failed'] == 0
+        for result in results['implementations'].values()
+    )
+    return results
+
+
+def print_results(results):
+    print(f"{results['samples']} samples compared against {results['reference']}")
+    print(f"{'implementation':<22}{'per sec':>12}{'sec':>10}{'failed':>8}{'mismatches':>12}")
+    for name, result in results['implementations'].items():
+        print(
+            f"{name:<22}{result['classifications_per_sec']:>12.0f}"
+            f"{result['seconds']:>10.3f}{result['failed']:>8}{result['mismatches']:>12}"
+            + (f"  {'+'.join(result['mismatched_moves'])}" if result['mismatches'] else "")
+        )
+    for kind, coverage in results['coverage'].items():
+        print(
+            f"{kind:<16}{coverage['samples']:>8} intended={coverage['intended_matched']} "
+            + " ".join(f"{move}={count}" for move, count in coverage['moves'].items() if count)
+        )
+    print("all implementations agree" if results['passed'] else "MISMATCH")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        prog="Pose2Input-MK9 Classifier Benchmark",
+        description="Time every implementation of TranslatePose on synthetic "
+            "landmarks and check that they all deduce the same moves"
+    )
+    parser.add_argument(
+        '-c', '--corpus', metavar='',
+        help='.npz corpus from synthetic_poses.py, generated on the fly if not given'
+    )
+    parser.add_argument(
+        '-n', '--size', type=int, metavar='', default=20000,
+        help='number of landmark sets generated on the fly'
+    )
+    parser.add_argument(
+        '-s', '--seed', type=int, metavar='', default=0,
+        help='seed of the corpus generated on the fly'
+    )
+    parser.add_argument(
+        '-r', '--repeat', type=int, metavar='', default=3,
+        help='every implementation is timed this many times, best is kept'
+    )
+    parser.add_argument(
+        '-o', '--output', metavar='',
+        help='JSON file for the results, defaults to "logs/classifier_bench_<time>.json"'
+    )
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else generate_corpus(args.size, args.seed)
+    results = run_classifier_benchmark(corpus, repeat=args.repeat)
+    print_results(results)
+
+    output = args.output or (
+        f"logs/classifier_bench_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json"
+    )
+    if os.path.dirname(output) and not os.path.exists(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+    with open(output, 'w') as results_file:
+        json.dump(results, results_file, indent=2)
+    print(f"results saved to {output}")
+
+    if not results['passed']:
+        sys.exit(1)
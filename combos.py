@@ -0,0 +1,253 @@
+# ./combos.py
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from utils import MOVES, MOVE_FLAGS, LandmarkIndexEnum, input_sequence
+
+
+class MoveHistory:
+    """
+    Ring buffer of the last `capacity` frames: landmarks (NaN if no body),
+    bitmask of the Output Moves and timestamp, preallocated so a push
+    never allocates.
+    """
+
+    def __init__(self, capacity=32):
+        self.capacity = capacity
+        self.landmarks = np.full(
+            (capacity, len(LandmarkIndexEnum), 4), np.nan, np.float32
+        )
+        self.moves = np.zeros(capacity, np.uint16)
+        self.times = np.zeros(capacity, np.float64)
+
+        # Frames pushed so far, the newest one is at (size - 1) % capacity
+        self.size = 0
+
+    def push(self, landmarks, moves, now):
+        """
+        landmarks <np.ndarray>: (33, 4) landmarks of the frame, None if no body
+        moves <int>: bitmask of the Output Moves of the frame
+        now <float>: time.perf_counter() of the frame
+        """
+
+        index = self.size % self.capacity
+        if landmarks is None:
+            self.landmarks[index] = np.nan
+        else:
+            self.landmarks[index] = landmarks
+        self.moves[index] = moves
+        self.times[index] = now
+        self.size += 1
+
+    def __len__(self):
+        return min(self.size, self.capacity)
+
+    def last(self, count=None):
+        """
+        returns <tuple<np.ndarray>>: landmarks, moves and times of the last
+            count frames (all kept frames if None), oldest first, as copies
+        """
+
+        count = len(self) if count is None else min(count, len(self))
+        indices = np.arange(self.size - count, self.size) % self.capacity
+        return self.landmarks[indices], self.moves[indices], self.times[indices]
+
+
+class MoveDebouncer:
+    """
+    A move only turns on (or off) after being on (or off) for min_frames
+    consecutive frames, so a pose flickering for a frame does not press
+    (or release) its key.
+    """
+
+    def __init__(self, min_frames=2):
+        self.min_frames = min_frames
+        self.moves = 0
+        self._bits = 1 << np.arange(len(MOVES))
+        # consecutive frames every move differed from self.moves
+        self._runs = np.zeros(len(MOVES), np.int32)
+
+    def update(self, moves):
+        """
+        moves <int>: bitmask of the Output Moves of the frame
+        returns <int>: debounced bitmask
+        """
+
+        if self.min_frames <= 1:
+            self.moves = moves
+            return moves
+
+        differs = ((moves ^ self.moves) & self._bits) != 0
+        self._runs += 1
+        self._runs *= differs
+        flips = self._runs >= self.min_frames
+        if flips.any():
+            self.moves ^= int(self._bits[flips].sum())
+            self._runs[flips] = 0
+        return self.moves
+
+
+class Combo:
+    """
+    Sequence of steps, every step being one or more moves portrayed at
+    once (eg: DOWN+FRONT_PUNCH), each step within `window` seconds of the
+    previous one, which types `keys` one after the other.
+    """
+
+    def __init__(self, name, steps, keys, window=0.5):
+        """
+        name <str>: shown in logs
+        steps <list<int>>: bitmask of every step
+        keys <list<str>>: PyAutoGUI keys typed in order once matched
+        window <float>: max seconds between two steps
+        """
+
+        self.name = name
+        self.steps = tuple(steps)
+        self.keys = list(keys)
+        self.window = window
+        # Moves the combo is made of, others do not break it
+        self.mask = 0
+        for step in self.steps:
+            self.mask |= step
+
+        # Prefix function (KMP) of the steps, where to continue on a mismatch
+        self.fallback = [0] * len(self.steps)
+        matched = 0
+        for i in range(1, len(self.steps)):
+            while matched and self.steps[i] != self.steps[matched]:
+                matched = self.fallback[matched - 1]
+            if self.steps[i] == self.steps[matched]:
+                matched += 1
+            self.fallback[i] = matched
+
+    @classmethod
+    def from_dict(cls, config):
+        """
+        config <dict>: {"name": ..., "sequence": ["DOWN", "DOWN+FRONT_PUNCH"],
+            "keys": ["s", "a"], "window": 0.5}
+        """
+
+        steps = []
+        for step in config['sequence']:
+            bits = 0
+            for move in step.split('+'):
+                bits |= MOVE_FLAGS[move.strip().upper()]
+            steps.append(bits)
+        return cls(config['name'], steps, config['keys'], config.get('window', 0.5))
+
+
+def load_combos(path):
+    """
+    path <str>: JSON file with a list of Combo.from_dict configs
+    returns <list<Combo>>
+    """
+
+    with open(path) as combo_file:
+        return [Combo.from_dict(config) for config in json.load(combo_file)]
+
+
+class ComboMatcher:
+    """
+    Matches every Combo against the moves as they start, one frame at a
+    time: a step is matched on the frame its last move starts, so holding a
+    pose does not repeat it, a move of the combo starting out of order
+    breaks it. Only the progress of every combo is kept, so a frame costs
+    O(1) per combo (amortized), whatever the history length.
+    """
+
+    def __init__(self, combos):
+        self.combos = list(combos)
+        self.matched = 0
+        self._prv_moves = 0
+        self._progress = [0] * len(self.combos)
+        self._deadline = [0.0] * len(self.combos)
+
+    def update(self, moves, now):
+        """
+        moves <int>: bitmask of the Output Moves of the frame
+        now <float>: time.perf_counter() of the frame
+        returns <list<Combo>>: combos completed by this frame
+        """
+
+        started = moves & ~self._prv_moves
+        self._prv_moves = moves
+        if not started:
+            return []
+
+        completed = []
+        for i, combo in enumerate(self.combos):
+            if not started & combo.mask:
+                continue
+            progress = self._progress[i]
+            if progress and now > self._deadline[i]:
+                progress = 0
+
+            # Step is matched when all its moves are portrayed, one just started
+            while progress and not (
+                moves & combo.steps[progress] == combo.steps[progress]
+                and started & combo.steps[progress]
+            ):
+                progress = combo.fallback[progress - 1]
+            step = combo.steps[progress]
+            if moves & step == step and started & step:
+                progress += 1
+                self._deadline[i] = now + combo.window
+
+            if progress == len(combo.steps):
+                completed.append(combo)
+                self.matched += 1
+                progress = 0
+            self._progress[i] = progress
+        return completed
+
+
+class MoveTracker:
+    """
+    Keeps the MoveHistory of a FrameProcessor, debounces its Output Moves,
+    and types the keys of every completed Combo through combo_sink, on its
+    own thread so the frame loop never waits for it.
+    """
+
+    def __init__(
+        self, history_size=32, debounce_frames=1, combos=None,
+        combo_sink=input_sequence
+    ):
+        """
+        history_size <int>: frames kept in self.history
+        debounce_frames <int>: see MoveDebouncer, 1 to disable
+        combos <list<Combo>>: special moves to match
+        combo_sink <callable>: called with the keys of every completed Combo,
+            defaults to input_sequence (pyAutoGUI)
+        """
+
+        self.history = MoveHistory(history_size)
+        self.debouncer = MoveDebouncer(debounce_frames)
+        self.matcher = ComboMatcher(combos or [])
+        self.combo_sink = combo_sink
+        self._executor = ThreadPoolExecutor(1) if self.matcher.combos else None
+
+    def update(self, landmarks, moves, now):
+        """
+        landmarks <np.ndarray>: (33, 4) landmarks of the frame, None if no body
+        moves <int>: bitmask of the Output Moves of the frame
+        now <float>: time.perf_counter() of the frame
+        returns <int>: debounced bitmask, the one to type
+        """
+
+        self.history.push(landmarks, moves, now)
+        moves = self.debouncer.update(moves)
+        if self._executor is not None:
+            for combo in self.matcher.update(moves, now):
+                self._executor.submit(self.combo_sink, combo.keys)
+        return moves
+
+    def stats(self):
+        return f"combos={self.matcher.matched}"
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
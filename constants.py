@@ -3,16 +3,12 @@
 import os
 import enum
 
-from dotenv import load_dotenv
-
-
-load_dotenv()
-
 
 @enum.unique
 class InputConfig(enum.Enum):
     '''
     Config for the gameplay, Takes input from .env
+    (loaded by the entry point, before this module is imported)
     Value should be something tha can be used by pyAutoGUI
     If not available then, uses default input config (mine)
     and Yes I use arrow keys, deal with it!
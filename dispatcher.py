@@ -0,0 +1,135 @@
+# ./dispatcher.py
+
+import time
+import threading
+
+from constants import InputConfig
+
+
+class KeyDispatcher:
+    """
+    Replacement for input_keys that types on its own worker thread.
+
+    Instead of pressing and releasing every key for every frame, it keeps
+    track of the keys currently held and only sends the transitions between
+    consecutive lists of keys: new keys are pressed, keys no longer wanted
+    are released once they have been held for their minimum duration.
+
+    Calling it only hands the keys over to the worker, so the frame loop
+    never waits for pyAutoGUI (or pyautogui.PAUSE), if the worker is busy
+    only the latest list of keys is applied.
+    """
+
+    def __init__(self, min_hold=None, default_min_hold=0.0, key_down=None, key_up=None):
+        """
+        min_hold <dict<str:move, float>>: minimum seconds the key of a move
+            stays held once pressed, eg: {'BLOCK': 0.3}
+        default_min_hold <float>: minimum seconds for all other moves
+        key_down, key_up <callable>: defaults to pyautogui.keyDown, pyautogui.keyUp
+        """
+
+        self.default_min_hold = default_min_hold
+        self.min_hold = {
+            getattr(InputConfig, move).value: seconds
+            for move, seconds in (min_hold or {}).items()
+        }
+        if key_down is None or key_up is None:
+            # Only loaded when keys are actually typed
+            import pyautogui
+
+            key_down = key_down or pyautogui.keyDown
+            key_up = key_up or pyautogui.keyUp
+        self.key_down = key_down
+        self.key_up = key_up
+
+        self.presses = 0
+        self.releases = 0
+
+        # key -> time it was pressed, only touched by the worker
+        self._held = {}
+        self._wanted = []
+        self._pending = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._worker = threading.Thread(
+            target=self._run, name='key_dispatcher', daemon=True
+        )
+        self._worker.start()
+
+    def __call__(self, inputs):
+        """
+        hands over the keys that should be held from now on, returns immediately
+
+        inputs <list<str:PyAutoGUI recognizes key string>>
+        """
+
+        with self._condition:
+            self._pending = list(inputs)
+            self._condition.notify()
+
+    def close(self):
+        """
+        stops the worker, after releasing every held key
+        """
+
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._worker.join()
+
+    def held_keys(self):
+        return list(self._held)
+
+    def _next_release_in(self):
+        """
+        returns <float | None>: seconds until a key that is no longer wanted
+            may be released, None if there is no such key
+        """
+
+        now = time.perf_counter()
+        waits = [
+            pressed_at + self.min_hold.get(key, self.default_min_hold) - now
+            for key, pressed_at in self._held.items() if key not in self._wanted
+        ]
+        return max(min(waits), 0) if waits else None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    timeout = self._next_release_in()
+                    if timeout == 0:
+                        break
+                    self._condition.wait(timeout)
+
+                if self._pending is not None:
+                    self._wanted, self._pending = self._pending, None
+                closed = self._closed
+
+            if closed:
+                self._wanted = []
+                self._apply(force=True)
+                return
+
+            self._apply()
+
+    def _apply(self, force=False):
+        now = time.perf_counter()
+
+        # Press new keys in given order
+        for key in self._wanted:
+            if key and key not in self._held:
+                self.key_down(key)
+                self._held[key] = now
+                self.presses += 1
+
+        # Release keys no longer wanted, in reverse order of pressing
+        for key, pressed_at in reversed(list(self._held.items())):
+            if key in self._wanted:
+                continue
+            if force or (
+                now - pressed_at >= self.min_hold.get(key, self.default_min_hold)
+            ):
+                self.key_up(key)
+                del self._held[key]
+                self.releases += 1
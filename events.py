@@ -0,0 +1,449 @@
+# ./events.py
+
+import time
+import socket
+import struct
+import argparse
+from collections import namedtuple
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+from utils import LandmarkIndexEnum, bitmask_to_moves
+
+
+# Default name of the SharedMemory holding the ring
+SHM_NAME = 'pose2input_events'
+
+LANDMARKS_SHAPE = (len(LandmarkIndexEnum), 4)
+
+# Flags of an event
+MOTION_DETECTED = 1
+BODY_FOUND = 2
+# UDP only, the datagram carries the landmarks after the header
+HAS_LANDMARKS = 4
+
+# sequence, captured time, published time (time.time()), bitmask of
+# utils.MOVES, flags, then (33, 4) float32 landmarks if HAS_LANDMARKS
+DATAGRAM_HEADER = struct.Struct('!QddHB')
+LANDMARKS_DTYPE = np.dtype('<f4')
+
+# One slot of the ring, `begin` and `end` are set to the sequence of the
+# event before and after the rest is written, so a reader can tell a slot
+# being overwritten (seqlock)
+SLOT_DTYPE = np.dtype([
+    ('begin', '<u8'), ('captured_time', '<f8'), ('published_time', '<f8'),
+    ('moves', '<u2'), ('flags', 'u1'), ('landmarks', '<f4', LANDMARKS_SHAPE),
+    ('end', '<u8'),
+], align=True)
+# events published so far, slots of the ring
+RING_HEADER_DTYPE = np.dtype([('published', '<u8'), ('capacity', '<u8')], align=True)
+
+MoveEvent = namedtuple('MoveEvent', (
+    'sequence', 'captured_time', 'published_time', 'moves',
+    'motion_detected', 'landmarks',
+))
+MoveEvent.__doc__ = """
+Moves of a frame as seen by consumers, sequence starts at 1, landmarks is a
+(33, 4) float32 array, None if no body was found (or not sent over UDP)
+"""
+
+# Names of the rings created by this process, see attach_shared_memory
+_created_rings = set()
+
+
+def pack_event(sequence, captured_time, published_time, moves, flags, landmarks=None):
+    """
+    returns <bytes>: UDP datagram of the event, landmarks are only
+        packed if given (and BODY_FOUND is in flags)
+    """
+
+    if landmarks is not None and flags & BODY_FOUND:
+        return DATAGRAM_HEADER.pack(
+            sequence, captured_time, published_time, moves, flags | HAS_LANDMARKS
+        ) + landmarks.astype(LANDMARKS_DTYPE, copy=False).tobytes()
+    return DATAGRAM_HEADER.pack(sequence, captured_time, published_time, moves, flags)
+
+
+def unpack_event(datagram):
+    """
+    returns <MoveEvent>: event packed by pack_event
+    """
+
+    sequence, captured_time, published_time, moves, flags = (
+        DATAGRAM_HEADER.unpack_from(datagram)
+    )
+    landmarks = None
+    if flags & HAS_LANDMARKS:
+        landmarks = np.frombuffer(
+            datagram, LANDMARKS_DTYPE, offset=DATAGRAM_HEADER.size
+        ).reshape(LANDMARKS_SHAPE)
+    return MoveEvent(
+        sequence, captured_time, published_time, moves,
+        bool(flags & MOTION_DETECTED), landmarks
+    )
+
+
+def attach_shared_memory(name):
+    """
+    opens an existing SharedMemory without registering it to the resource
+    tracker of this process, which would otherwise unlink it at exit
+    (before Python 3.13, see bpo-39959)
+    """
+
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if name not in _created_rings:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class SharedMemoryRing:
+    """
+    Ring of the last `capacity` events in a SharedMemory, for consumers on
+    the same host (see SharedMemoryRingReader).
+
+    There is a single writer (the frame loop) and no lock: publishing is a
+    copy into the next slot, overwriting the oldest event whether or not it
+    was read, so a slow (or dead) consumer never holds up the frame loop,
+    it only loses events. Readers check the sequence around every slot to
+    drop the ones overwritten while they were copied.
+    """
+
+    def __init__(self, name=SHM_NAME, capacity=256):
+        """
+        name <str>: name of the SharedMemory, a stale one (eg: after a
+            crash) is replaced
+        capacity <int>: slots of the ring
+        """
+
+        size = RING_HEADER_DTYPE.itemsize + capacity * SLOT_DTYPE.itemsize
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        _created_rings.add(name)
+        self.name = name
+        self.capacity = capacity
+        self.header = np.ndarray((), RING_HEADER_DTYPE, buffer=self.shm.buf)
+        self.slots = np.ndarray(
+            (capacity,), SLOT_DTYPE, buffer=self.shm.buf,
+            offset=RING_HEADER_DTYPE.itemsize
+        )
+        self.slots[:] = np.zeros((), SLOT_DTYPE)
+        self.header['capacity'] = capacity
+        self.header['published'] = 0
+
+    def publish(self, sequence, captured_time, published_time, moves, flags, landmarks):
+        slot = self.slots[(sequence - 1) % self.capacity]
+        slot['begin'] = sequence
+        slot['captured_time'] = captured_time
+        slot['published_time'] = published_time
+        slot['moves'] = moves
+        slot['flags'] = flags
+        if landmarks is not None:
+            slot['landmarks'] = landmarks
+        slot['end'] = sequence
+        self.header['published'] = sequence
+        return True
+
+    def close(self):
+        del self.header, self.slots
+        self.shm.close()
+        self.shm.unlink()
+        _created_rings.discard(self.name)
+
+
+class SharedMemoryRingReader:
+    """
+    Consumer of a SharedMemoryRing, from any process of the same host,
+    only sees the events published after it attached
+    """
+
+    def __init__(self, name=SHM_NAME):
+        self.shm = attach_shared_memory(name)
+        self.header = np.ndarray((), RING_HEADER_DTYPE, buffer=self.shm.buf)
+        self.capacity = int(self.header['capacity'])
+        self.slots = np.ndarray(
+            (self.capacity,), SLOT_DTYPE, buffer=self.shm.buf,
+            offset=RING_HEADER_DTYPE.itemsize
+        )
+
+        self.received = 0
+        self.lost = 0
+        self.next_sequence = int(self.header['published']) + 1
+
+    def read(self):
+        """
+        returns <list<MoveEvent>>: events published since the last read,
+            oldest first, events overwritten before being read are counted
+            in self.lost
+        """
+
+        published = int(self.header['published'])
+        oldest = published - self.capacity + 1
+        if self.next_sequence < oldest:
+            self.lost += oldest - self.next_sequence
+            self.next_sequence = oldest
+
+        events = []
+        while self.next_sequence <= published:
+            sequence = self.next_sequence
+            self.next_sequence += 1
+
+            slot = self.slots[(sequence - 1) % self.capacity]
+            end = int(slot['end'])
+            record = slot.copy()
+            if end != sequence or int(slot['begin']) != sequence:
+                # Overwritten by the writer meanwhile
+                self.lost += 1
+                continue
+
+            events.append(MoveEvent(
+                sequence, float(record['captured_time']),
+                float(record['published_time']), int(record['moves']),
+                bool(record['flags'] & MOTION_DETECTED),
+                record['landmarks'] if record['flags'] & BODY_FOUND else None,
+            ))
+
+        self.received += len(events)
+        return events
+
+    def close(self):
+        del self.header, self.slots
+        self.shm.close()
+
+
+class UdpEventSender:
+    """
+    Sends every event as one datagram to `address`, for consumers on other
+    hosts (or processes that can't map the SharedMemory). The socket is
+    non-blocking, a datagram that can't be sent right away is dropped.
+    """
+
+    def __init__(self, address, landmarks_flag=True):
+        """
+        address <tuple<str, int>>: host and port of the consumer
+        landmarks_flag <bool>: if False, only moves and timestamps are sent
+            (27 bytes instead of 555)
+        """
+
+        self.address = address
+        self.landmarks_flag = landmarks_flag
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+
+    def publish(self, sequence, captured_time, published_time, moves, flags, landmarks):
+        try:
+            self.socket.sendto(
+                pack_event(
+                    sequence, captured_time, published_time, moves, flags,
+                    landmarks if self.landmarks_flag else None
+                ),
+                self.address
+            )
+        except OSError:
+            # Send buffer full, or the consumer is unreachable
+            return False
+        return True
+
+    def close(self):
+        self.socket.close()
+
+
+class UdpEventReceiver:
+    """
+    Consumer of an UdpEventSender, events lost (or reordered) on the way
+    are counted from the gaps in their sequence
+    """
+
+    def __init__(self, address):
+        """
+        address <tuple<str, int>>: host and port to listen on
+        """
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(address)
+        self.address = self.socket.getsockname()
+
+        self.received = 0
+        self.lost = 0
+        self.next_sequence = None
+
+    def read(self, timeout=None):
+        """
+        returns <list<MoveEvent>>: events received within timeout (sec),
+            stops waiting at the first one, and returns every one queued
+        """
+
+        events = []
+        self.socket.settimeout(timeout)
+        try:
+            while True:
+                events.append(unpack_event(self.socket.recv(65535)))
+                self.socket.setblocking(False)
+        except (socket.timeout, BlockingIOError):
+            pass
+
+        for event in events:
+            if self.next_sequence is not None and event.sequence > self.next_sequence:
+                self.lost += event.sequence - self.next_sequence
+            self.next_sequence = max(self.next_sequence or 0, event.sequence + 1)
+
+        self.received += len(events)
+        return events
+
+    def close(self):
+        self.socket.close()
+
+
+class MoveEventPublisher:
+    """
+    Publishes the Output Moves of every frame, with its landmarks and
+    timestamps, to every channel (SharedMemoryRing, UdpEventSender).
+
+    Publishing never waits for a consumer, events a channel can't take
+    right away are dropped and counted.
+
+    Frames without motion keep the keys held, so their events repeat the
+    moves of the last frame with motion (without MOTION_DETECTED).
+    """
+
+    def __init__(self, channels):
+        """
+        channels <list>: objects with publish(sequence, captured_time,
+            published_time, moves, flags, landmarks) returning whether the
+            event was taken, and close()
+        """
+
+        self.channels = channels
+        self.sequence = 0
+        self.dropped = {type(channel).__name__: 0 for channel in channels}
+        self._moves = 0
+
+    def publish(self, moves, pose_landmarks, motion_detected=True, captured_time=None):
+        """
+        moves <int>: bitmask of the Output Moves, see utils.MOVES
+        pose_landmarks <np.ndarray>: (33, 4) landmarks, None if no body found
+        motion_detected <bool>: result of FrameProcessor.infer
+        captured_time <float>: time.time() the frame was captured
+        """
+
+        published_time = time.time()
+        if motion_detected:
+            self._moves = moves
+        flags = (
+            (MOTION_DETECTED if motion_detected else 0)
+            | (BODY_FOUND if pose_landmarks is not None else 0)
+        )
+
+        self.sequence += 1
+        for channel in self.channels:
+            if not channel.publish(
+                self.sequence, captured_time or published_time, published_time,
+                self._moves, flags, pose_landmarks
+            ):
+                self.dropped[type(channel).__name__] += 1
+
+    def stats(self):
+        return {'published': self.sequence, 'dropped': self.dropped}
+
+    def close(self):
+        for channel in self.channels:
+            channel.close()
+
+
+def parse_address(address, default_host='127.0.0.1'):
+    """
+    address <str>: "host:port" or "port"
+    returns <tuple<str, int>>
+    """
+
+    host, _, port = address.rpartition(':')
+    return host or default_host, int(port)
+
+
+def create_event_publisher(shm_name=SHM_NAME, shm_slots=256, udp_address='',
+                           udp_landmarks=True):
+    """
+    shm_name <str>: name of the SharedMemoryRing, empty to disable
+    udp_address <str>: "host:port" of the UdpEventSender, empty to disable
+    returns <MoveEventPublisher>
+    """
+
+    channels = []
+    if shm_name:
+        channels.append(SharedMemoryRing(shm_name, shm_slots))
+    if udp_address:
+        channels.append(UdpEventSender(parse_address(udp_address), udp_landmarks))
+    print(
+        "[events] publishing to "
+        + (", ".join(
+            f"shm:{channel.name}" if isinstance(channel, SharedMemoryRing)
+            else f"udp:{channel.address[0]}:{channel.address[1]}"
+            for channel in channels
+        ) or "nothing")
+    )
+    return MoveEventPublisher(channels)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        prog="Pose2Input-MK9 Events",
+        description="Prints the move events published by run.py --events_flag, "
+            "with their latency since capture"
+    )
+    subparsers = parser.add_subparsers(dest='channel', required=True)
+
+    shm_parser = subparsers.add_parser('shm', help='reads the shared memory ring')
+    shm_parser.add_argument('name', nargs='?', default=SHM_NAME)
+    shm_parser.add_argument(
+        '-i', '--interval', type=float, metavar='', default=5,
+        help='ms between two reads of the ring'
+    )
+
+    udp_parser = subparsers.add_parser('udp', help='listens for datagrams')
+    udp_parser.add_argument(
+        'address', nargs='?', default='127.0.0.1:9103', help='"host:port" or "port"'
+    )
+
+    for channel_parser in (shm_parser, udp_parser):
+        channel_parser.add_argument(
+            '-a', '--all', action='store_true',
+            help='prints every event, not only changes of the moves'
+        )
+    args = parser.parse_args()
+
+    if args.channel == 'shm':
+        reader = SharedMemoryRingReader(args.name)
+        read = lambda: (time.sleep(args.interval / 1000), reader.read())[1]
+    else:
+        reader = UdpEventReceiver(parse_address(args.address))
+        read = lambda: reader.read(timeout=0.5)
+    print(f"[events] reading {args.channel}, Ctrl+C to stop")
+
+    moves = None
+    try:
+        while True:
+            for event in read():
+                if args.all or event.moves != moves:
+                    moves = event.moves
+                    print(
+                        f"#{event.sequence} "
+                        f"{(time.time() - event.captured_time) * 1000:7.2f}ms "
+                        f"{'+'.join(bitmask_to_moves(event.moves)) or '-'}"
+                        + ("" if event.motion_detected else " (no motion)")
+                        + ("" if event.landmarks is None else " [landmarks]")
+                    )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"[events] received={reader.received} lost={reader.lost}")
+        reader.close()
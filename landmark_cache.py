@@ -0,0 +1,254 @@
+# ./landmark_cache.py
+
+import os
+import json
+import time
+import hashlib
+import argparse
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from replay import VideoFileSource
+from pose_backends import MediaPipeBackend
+from utils import VectorizedTranslatePose, LandmarkIndexEnum, bitmask_to_moves
+
+
+CACHE_DIR = os.path.join('logs', 'landmarks')
+
+# Thresholds of TranslatePose that can be tuned from the command line
+THRESHOLDS = (
+    'visibility_threshold', 'parallel_threshold', 'kick_threshold',
+    'down_ratio_threshold', 'tag_ratio_threshold',
+)
+
+
+def video_hash(path, chunk_size=1 << 20):
+    """
+    returns <str>: sha256 of the content of the video file
+    """
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as video_file:
+        for chunk in iter(lambda: video_file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(path, content_hash=False):
+    """
+    returns <str>: key of the video in the cache, its name, size and
+        modification time (a stat, no read), or the sha256 of its content
+        if content_hash (reads the whole file, but survives copies)
+    """
+
+    if content_hash:
+        return video_hash(path)
+    stat = os.stat(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return f"{name}_{stat.st_size}_{stat.st_mtime_ns}"
+
+
+def cache_paths(key, cache_dir=CACHE_DIR):
+    """
+    returns <tuple<str, str>>: path of landmarks (.npy) and metadata (.json)
+    """
+
+    base = os.path.join(cache_dir, key)
+    return f"{base}.npy", f"{base}.json"
+
+
+def extract_landmarks(
+    video_path, cache_dir=CACHE_DIR, pose=None, force=False, content_hash=False
+):
+    """
+    runs the pose model once over every frame of the video and stores
+    the landmarks as a (frames, 33, 4) float32 .npy file (x, y, z, visibility),
+    frames without a body are filled with NaN
+
+    video_path <str>: recorded video (eg: logs/log_*.avi)
+    cache_dir <str>: folder of the cache, files are named by cache_key
+    pose <pose_backends.PoseBackend>: pose model, MediaPipeBackend if not given
+    force <bool>: if True, extract again even if already cached
+    content_hash <bool>: see cache_key
+    returns <str>: path of the .npy file
+    """
+
+    key = cache_key(video_path, content_hash)
+    landmarks_path, meta_path = cache_paths(key, cache_dir)
+    if not force and os.path.exists(landmarks_path) and os.path.exists(meta_path):
+        return landmarks_path
+
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+
+    pose = pose if pose is not None else MediaPipeBackend()
+    source = VideoFileSource(video_path)
+    row = np.empty((len(LandmarkIndexEnum), 4), np.float32)
+    frames = found_frames = 0
+
+    # Frame count is not reliable for every container, so rows are
+    # streamed to a raw file first, then wrapped into a .npy file
+    raw_path = f"{landmarks_path}.tmp"
+    with open(raw_path, 'wb') as raw_file:
+        while True:
+            success, img = source.read()
+            if not success:
+                break
+            frames += 1
+
+            pose_landmarks = pose.process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+            if pose_landmarks is not None:
+                found_frames += 1
+                row[:] = pose_landmarks
+            else:
+                row.fill(np.nan)
+            raw_file.write(row.tobytes())
+
+    source.release()
+
+    shape = (frames, len(LandmarkIndexEnum), 4)
+    landmarks = np.lib.format.open_memmap(
+        landmarks_path, mode='w+', dtype=np.float32, shape=shape
+    )
+    if frames:
+        landmarks[:] = np.memmap(raw_path, dtype=np.float32, mode='r', shape=shape)
+    landmarks.flush()
+    del landmarks
+    os.remove(raw_path)
+
+    with open(meta_path, 'w') as meta_file:
+        json.dump({
+            'video': video_path,
+            'key': key,
+            'sha256': key if content_hash else None,
+            'fps': source.fps,
+            'frames': frames,
+            'found_frames': found_frames,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+        }, meta_file, indent=2)
+
+    return landmarks_path
+
+
+def load_landmarks(video_path, cache_dir=CACHE_DIR, content_hash=False):
+    """
+    returns <tuple<np.memmap, dict>>: read only, memory mapped landmarks of
+        the video (extracted first if not cached) and their metadata
+    """
+
+    landmarks_path = extract_landmarks(video_path, cache_dir, content_hash=content_hash)
+    with open(landmarks_path[:-len('.npy')] + '.json') as meta_file:
+        meta = json.load(meta_file)
+    return np.load(landmarks_path, mmap_mode='r'), meta
+
+
+def evaluate_landmarks(landmarks, translate_pose, chunk_size=65536):
+    """
+    classifies every cached frame
+
+    landmarks <np.ndarray>: (frames, 33, 4) array returned by load_landmarks
+    translate_pose <VectorizedTranslatePose>: classifier with thresholds to try
+    returns <np.ndarray>: (frames, len(translate_pose.MOVES)) boolean array
+    """
+
+    moves = np.zeros((len(landmarks), len(translate_pose.MOVES)), dtype=bool)
+    for start in range(0, len(landmarks), chunk_size):
+        chunk = np.asarray(landmarks[start:start + chunk_size])
+        found = ~np.isnan(chunk[:, 0, 0])
+        moves[start:start + chunk_size][found] = (
+            translate_pose.evaluate_batch(chunk[found])
+        )
+    return moves
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        prog="Pose2Input-MK9 Landmark Cache",
+        description="Extract landmarks of recorded videos once, "
+            "then evaluate TranslatePose thresholds on them"
+    )
+    parser.add_argument(
+        '-c', '--cache_dir', metavar='', default=CACHE_DIR,
+        help=f'folder of the cache, defaults to "{CACHE_DIR}"'
+    )
+    parser.add_argument(
+        '-H', '--content_hash', action='store_true',
+        help='keys the cache on the sha256 of the video instead of its size and '
+            'modification time, slower but survives copies'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    extract_parser = subparsers.add_parser(
+        'extract', help='run MediaPipe Pose over videos and cache the landmarks'
+    )
+    extract_parser.add_argument('videos', nargs='+')
+    extract_parser.add_argument(
+        '-f', '--force', action='store_true', help='extract even if cached'
+    )
+
+    evaluate_parser = subparsers.add_parser(
+        'evaluate', help='classify cached landmarks with given thresholds'
+    )
+    evaluate_parser.add_argument('video')
+    for threshold in THRESHOLDS:
+        evaluate_parser.add_argument(
+            f'--{threshold}', type=float, metavar='',
+            help='defaults to the value in TranslatePose'
+        )
+    evaluate_parser.add_argument(
+        '-t', '--timeline', action='store_true',
+        help='prints every change of the Output Moves'
+    )
+    args = parser.parse_args()
+
+    if args.command == 'extract':
+        for video in args.videos:
+            start = time.perf_counter()
+            path = extract_landmarks(
+                video, args.cache_dir, force=args.force, content_hash=args.content_hash
+            )
+            print(f"{video} -> {path} ({time.perf_counter() - start:.2f}s)")
+
+    else:
+        landmarks, meta = load_landmarks(
+            args.video, args.cache_dir, args.content_hash
+        )
+
+        default_pose = VectorizedTranslatePose()
+        trial_pose = VectorizedTranslatePose()
+        for threshold in THRESHOLDS:
+            if getattr(args, threshold) is not None:
+                setattr(trial_pose, threshold, getattr(args, threshold))
+
+        start = time.perf_counter()
+        default_moves = evaluate_landmarks(landmarks, default_pose)
+        trial_moves = evaluate_landmarks(landmarks, trial_pose)
+        elapsed = time.perf_counter() - start
+
+        print(
+            f"{args.video}: {meta['frames']} frames "
+            f"({meta['found_frames']} with a body), evaluated in {elapsed:.3f}s"
+        )
+        print(f"{'move':<14}{'default':>10}{'trial':>10}{'changed':>10}")
+        for i, move in enumerate(trial_pose.MOVES):
+            print(
+                f"{move:<14}{default_moves[:, i].sum():>10}"
+                f"{trial_moves[:, i].sum():>10}"
+                f"{(default_moves[:, i] != trial_moves[:, i]).sum():>10}"
+            )
+        print(
+            f"frames with different Output Moves: "
+            f"{(default_moves != trial_moves).any(axis=1).sum()}"
+        )
+
+        if args.timeline and len(trial_moves):
+            trial_bits = trial_pose.mask_to_bits(trial_moves)
+            changes = np.flatnonzero(trial_bits[1:] ^ trial_bits[:-1]) + 1
+            for frame in np.concatenate(([0], changes)):
+                print(
+                    f"{frame:>8}: {trial_bits[frame]:#06x} "
+                    f"{bitmask_to_moves(trial_bits[frame])}"
+                )
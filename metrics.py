@@ -0,0 +1,287 @@
+# ./metrics.py
+
+import json
+import time
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+# Upper bounds (sec) of histogram buckets, 10µs to ~10s, √2 apart
+BUCKETS = tuple(1e-5 * 2 ** (i / 2) for i in range(41))
+
+PERCENTILES = (50, 90, 99)
+
+
+def summarize_latencies(samples):
+    """
+    samples <list<float>>: durations in sec
+    returns <dict>: count, mean, percentiles and max in milliseconds
+    """
+
+    if not samples:
+        return {'count': 0}
+
+    samples_ms = np.asarray(samples) * 1000
+    summary = {'count': len(samples), 'mean': float(samples_ms.mean())}
+    for percentile, value in zip(
+        PERCENTILES, np.percentile(samples_ms, PERCENTILES)
+    ):
+        summary[f'p{percentile}'] = float(value)
+    summary['max'] = float(samples_ms.max())
+    return summary
+
+
+class LatencyHistogram:
+    """
+    Histogram of latencies with fixed buckets, so memory never grows.
+
+    Keeps cumulative counts (for Prometheus) and a rolling window made of
+    `slots` sub-histograms, the oldest one is cleared when the window moves.
+
+    Not thread safe, StageMetrics serializes every access to it.
+    """
+
+    def __init__(self, window=60, slots=6):
+        """
+        window <float>: seconds covered by the rolling histogram
+        slots <int>: number of sub-histograms the window is split into
+        """
+
+        self.slot_length = window / slots
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+        self._slots = [[0] * (len(BUCKETS) + 1) for _ in range(slots)]
+        self._slot = 0
+        self._slot_started = time.monotonic()
+
+    def _rotate(self, now):
+        """
+        moves the window forward, clearing one slot per elapsed slot_length
+        """
+
+        elapsed_slots = int((now - self._slot_started) // self.slot_length)
+        if not elapsed_slots:
+            return
+
+        for _ in range(min(elapsed_slots, len(self._slots))):
+            self._slot = (self._slot + 1) % len(self._slots)
+            slot_counts = self._slots[self._slot]
+            slot_counts[:] = [0] * len(slot_counts)
+        self._slot_started += elapsed_slots * self.slot_length
+
+    def observe(self, seconds, now):
+        self._rotate(now)
+
+        bucket = bisect.bisect_left(BUCKETS, seconds)
+        self.counts[bucket] += 1
+        self._slots[self._slot][bucket] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def rolling_counts(self):
+        self._rotate(time.monotonic())
+        return [sum(counts) for counts in zip(*self._slots)]
+
+    @staticmethod
+    def percentile(counts, percentile):
+        """
+        returns <float | None>: upper bound (sec) of the bucket holding the
+            given percentile, None if counts are empty
+        """
+
+        total = sum(counts)
+        if not total:
+            return None
+
+        rank = total * percentile / 100
+        seen = 0
+        for bucket, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                return BUCKETS[bucket] if bucket < len(BUCKETS) else float('inf')
+
+
+class StageMetrics:
+    """
+    Rolling latency histograms of every frame stage (and counters, eg: of
+    the gate decisions), exported as a periodic JSON log line and/or as
+    Prometheus text on http://<host>:<port>/metrics
+    """
+
+    def __init__(self, stages, window=60, log_interval=10, port=None, host='127.0.0.1'):
+        """
+        stages <tuple<str>>: names of the stages that will be observed
+        window <float>: seconds covered by the rolling percentiles
+        log_interval <float>: seconds between two log lines, 0 to disable
+        port <int>: port of the Prometheus endpoint, None to disable
+        """
+
+        self.window = window
+        self.log_interval = log_interval
+        self.histograms = {stage: LatencyHistogram(window) for stage in stages}
+        # counter -> value -> count since start
+        self.counts = {}
+        # Frame threads observe while the log and HTTP threads read
+        self._lock = threading.Lock()
+
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._server = None
+
+        if port is not None:
+            self._server = ThreadingHTTPServer((host, port), self._handler())
+            self._threads.append(threading.Thread(
+                target=self._server.serve_forever, name='metrics_http', daemon=True
+            ))
+        if log_interval:
+            self._threads.append(threading.Thread(
+                target=self._log_loop, name='metrics_log', daemon=True
+            ))
+        for thread in self._threads:
+            thread.start()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self.histograms[stage].observe(seconds, time.monotonic())
+
+    def count(self, counter, value):
+        """
+        counter <str>: name of the counter, eg: gate_decisions
+        value <str>: what is counted, eg: moving
+        """
+
+        with self._lock:
+            values = self.counts.setdefault(counter, {})
+            values[value] = values.get(value, 0) + 1
+
+    def record(self, stage_times, stages=None):
+        """
+        stage_times <dict<str, float | None>>: seconds per stage, None if skipped
+        stages <tuple<str>>: only these keys of stage_times are recorded
+        """
+
+        now = time.monotonic()
+        with self._lock:
+            for stage in stages or stage_times:
+                seconds = stage_times[stage]
+                if seconds is not None:
+                    self.histograms[stage].observe(seconds, now)
+
+    def snapshot(self):
+        """
+        returns <tuple<dict, dict>>: copy of every histogram (stage ->
+            cumulative counts, sum, count, rolling counts) and of the counters,
+            taken at once
+        """
+
+        with self._lock:
+            histograms = {
+                stage: (
+                    list(histogram.counts), histogram.sum, histogram.count,
+                    histogram.rolling_counts()
+                )
+                for stage, histogram in self.histograms.items()
+            }
+            counts = {counter: dict(values) for counter, values in self.counts.items()}
+        return histograms, counts
+
+    def summary(self):
+        """
+        returns <dict>: rolling count and percentiles (ms) of every stage
+        """
+
+        histograms, counts_by_counter = self.snapshot()
+        stages = {}
+        for stage, (_, _, _, counts) in histograms.items():
+            stage_summary = {'count': sum(counts)}
+            for percentile in PERCENTILES:
+                value = LatencyHistogram.percentile(counts, percentile)
+                stage_summary[f'p{percentile}_ms'] = (
+                    None if value is None else round(value * 1000, 3)
+                )
+            stages[stage] = stage_summary
+        return {
+            'time': time.time(), 'window': self.window, 'stages': stages,
+            'counts': counts_by_counter,
+        }
+
+    def prometheus_text(self):
+        """
+        returns <str>: all histograms in Prometheus text exposition format
+        """
+
+        histograms, counts_by_counter = self.snapshot()
+        name = 'pose2input_stage_latency_seconds'
+        lines = [
+            f'# HELP {name} Latency of each frame stage.',
+            f'# TYPE {name} histogram',
+        ]
+        for stage, (counts, total_seconds, total_count, _) in histograms.items():
+            cumulative = 0
+            for bucket, count in enumerate(counts):
+                cumulative += count
+                le = f'{BUCKETS[bucket]:.6g}' if bucket < len(BUCKETS) else '+Inf'
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total_seconds}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {total_count}')
+
+        rolling = 'pose2input_stage_latency_rolling_seconds'
+        lines += [
+            f'# HELP {rolling} Percentiles of each frame stage '
+                f'over the last {self.window}s.',
+            f'# TYPE {rolling} gauge',
+        ]
+        for stage, (_, _, _, counts) in histograms.items():
+            for percentile in PERCENTILES:
+                value = LatencyHistogram.percentile(counts, percentile)
+                if value is not None:
+                    lines.append(
+                        f'{rolling}{{stage="{stage}",quantile="{percentile / 100}"}} {value}'
+                    )
+
+        for counter, values in counts_by_counter.items():
+            total = f'pose2input_{counter}_total'
+            lines += [
+                f'# HELP {total} Frames counted by {counter}.',
+                f'# TYPE {total} counter',
+            ]
+            for value, count in values.items():
+                lines.append(f'{total}{{value="{value}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        self._stop_event.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        for thread in self._threads:
+            thread.join()
+
+    def _log_loop(self):
+        while not self._stop_event.wait(self.log_interval):
+            print(f"metrics {json.dumps(self.summary())}", flush=True)
+
+    def _handler(self):
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return MetricsHandler
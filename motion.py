@@ -0,0 +1,333 @@
+# ./motion.py
+
+import os
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Counts the decision of a gate for every frame, so that how often (and
+    why) inference is skipped can be checked, see stats()
+    """
+
+    # Decisions of the gate, the first PASSING ones let the frame through
+    DECISIONS = ('moving', 'still')
+    PASSING = 1
+
+    def __init__(self):
+        self.decisions = dict.fromkeys(self.DECISIONS, 0)
+        self.last_decision = None
+
+    def _decide(self, decision):
+        """
+        returns <bool>: whether the decision lets the frame through
+        """
+
+        self.decisions[decision] += 1
+        self.last_decision = decision
+        return decision in self.DECISIONS[:self.PASSING]
+
+    def skip_ratio(self):
+        """
+        returns <float>: ratio of the frames the gate kept from inference
+        """
+
+        frames = sum(self.decisions.values())
+        skipped = sum(
+            self.decisions[decision] for decision in self.DECISIONS[self.PASSING:]
+        )
+        return skipped / frames if frames else 0.0
+
+    def stats(self):
+        return " ".join(
+            f"{decision}={count}" for decision, count in self.decisions.items()
+        ) + f" skipped={self.skip_ratio():.0%}"
+
+
+class MotionDetector(MotionGate):
+    """
+    Frame differencing for motion detection, done on a downscaled (and
+    optionally grayscale) copy of each frame. Downscaling samples every
+    `downscale`-th pixel (nearest neighbour), which keeps the gate well
+    under a millisecond even for 1080p frames.
+
+    Both the reduced current frame and the reduced previous frame live in
+    two preallocated buffers that swap roles every frame, so detecting
+    motion allocates nothing and never copies the full resolution frame.
+    """
+
+    def __init__(
+        self, first_img, motion_threshold_factor=48, downscale=4, grayscale=False
+    ):
+        """
+        first_img <np.ndarray>: first BGR frame from the Capturing Device
+        motion_threshold_factor <int>: More the value is, More the Motion is Captured
+        downscale <int>: frame width and height are divided by this factor
+        grayscale <bool>: if True, difference a single gray channel instead of
+            BGR, cheaper but the mean difference of a gray pixel is lower than
+            over BGR for the same change, so less motion is captured at the
+            same motion_threshold_factor
+        """
+
+        super().__init__()
+        self.height, self.width = first_img.shape[:2]
+        self.downscale = max(int(downscale), 1)
+        self.grayscale = grayscale
+
+        self.size = (
+            max(self.width // self.downscale, 1),
+            max(self.height // self.downscale, 1)
+        )
+        shape = (self.size[1], self.size[0]) + (() if grayscale else (3,))
+
+        # `_small` receives the resized BGR frame before gray conversion
+        self._small = np.empty((self.size[1], self.size[0], 3), np.uint8)
+        self._buffers = (np.empty(shape, np.uint8), np.empty(shape, np.uint8))
+        self._current = 0
+
+        # Same ratio as the full frame threshold, i.e. the mean absolute
+        # difference per pixel per channel has to exceed 255 / factor
+        channel = 1 if grayscale else 3
+        self.motion_theshold = (
+            self.size[0] * self.size[1] * channel * 255 / motion_threshold_factor
+        )
+        self.last_score = 0.0
+
+        self._reduce(first_img, self._buffers[self._current])
+
+    def _reduce(self, img, dst):
+        if not self.grayscale:
+            cv2.resize(img, self.size, dst=dst, interpolation=cv2.INTER_NEAREST)
+            return
+
+        cv2.resize(
+            img, self.size, dst=self._small, interpolation=cv2.INTER_NEAREST
+        )
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=dst)
+
+    def detect(self, img):
+        """
+        returns <bool>: True if img differs enough from the previous frame
+        """
+
+        self._current ^= 1
+        cur_img = self._buffers[self._current]
+        prv_img = self._buffers[self._current ^ 1]
+
+        self._reduce(img, cur_img)
+
+        # Sum of absolute differences, computed without an output image
+        self.last_score = cv2.norm(cur_img, prv_img, cv2.NORM_L1)
+        return self._decide(
+            'moving' if self.last_score > self.motion_theshold else 'still'
+        )
+
+    def diff_image(self, size=None):
+        """
+        size <tuple<int>>: (width, height) of the image, full resolution if None
+        returns <np.ndarray>: BGR image of the last difference,
+        only meant for debug, as it allocates
+        """
+
+        diff_img = cv2.resize(
+            cv2.absdiff(self._buffers[self._current], self._buffers[self._current ^ 1]),
+            size or (self.width, self.height), interpolation=cv2.INTER_NEAREST
+        )
+        if self.grayscale:
+            diff_img = cv2.cvtColor(diff_img, cv2.COLOR_GRAY2BGR)
+        return diff_img
+
+
+def play_zone_mask(play_zone, size):
+    """
+    play_zone <str>: image file, white (non zero) where the player plays,
+        or normalized rectangles "x0,y0,x1,y1" joined by ";",
+        whole frame if empty
+    size <tuple<int>>: (width, height) of the mask
+    returns <np.ndarray>: uint8 mask, 255 inside the play zone
+    """
+
+    width, height = size
+    if not play_zone:
+        return np.full((height, width), 255, np.uint8)
+
+    if os.path.exists(play_zone):
+        zone_img = cv2.imread(play_zone, cv2.IMREAD_GRAYSCALE)
+        if zone_img is None:
+            raise ValueError(f"Invalid play zone image: {play_zone}")
+        zone_img = cv2.resize(zone_img, size, interpolation=cv2.INTER_NEAREST)
+        return np.where(zone_img > 0, 255, 0).astype(np.uint8)
+
+    mask = np.zeros((height, width), np.uint8)
+    for rectangle in play_zone.split(';'):
+        x0, y0, x1, y1 = (float(value) for value in rectangle.split(','))
+        mask[
+            int(y0 * height):max(int(round(y1 * height)), int(y0 * height) + 1),
+            int(x0 * width):max(int(round(x1 * width)), int(x0 * width) + 1)
+        ] = 255
+    return mask
+
+
+class ForegroundGate(MotionGate):
+    """
+    Alternative to MotionDetector, only letting through frames with a
+    player in the play zone, instead of any change in the frame.
+
+    A background model (running average of the frames) is kept on a
+    downscaled grayscale copy, pixels far enough from it are foreground,
+    only those in the play zone count. The background keeps learning
+    everywhere but on the foreground, which is only absorbed slowly, so
+    lighting drifts and objects moved for good fade away, but a player
+    standing still does not. If nearly the whole zone turns foreground at
+    once (lights switched, camera moved) the background starts over.
+
+    Decisions, for every frame:
+        - empty: too little foreground, no player in the zone
+        - moving: enough of the foreground changed since the previous frame
+        - held: player in the zone but still (eg: holding BLOCK), the frame
+          is let through once every hold_interval seconds, so held moves
+          keep being recognized
+        - still: same as held, until hold_interval is over
+
+    All the buffers are preallocated, detecting allocates nothing.
+    """
+
+    DECISIONS = ('moving', 'held', 'still', 'empty')
+    PASSING = 2
+
+    def __init__(
+        self, first_img, downscale=8, play_zone='', pixel_threshold=25,
+        min_foreground=0.02, min_change=0.005, hold_interval=0.25,
+        learning_rate=0.02, foreground_rate=0.001, max_foreground=0.9
+    ):
+        """
+        first_img <np.ndarray>: first BGR frame, the initial background
+        downscale <int>: frame width and height are divided by this factor
+        play_zone <str>: where the player plays, see play_zone_mask
+        pixel_threshold <int>: gray level difference making a pixel foreground
+        min_foreground <float>: ratio of the zone the foreground has to cover
+        min_change <float>: ratio of the zone that has to change between two
+            frames (on the foreground) for the player to be moving
+        hold_interval <float>: seconds between two frames let through while
+            the player holds a pose, <= 0 to let every held frame through
+        learning_rate <float>: weight of a frame in the background
+        foreground_rate <float>: same, on the foreground
+        max_foreground <float>: ratio of the zone above which the background
+            is replaced by the frame
+        """
+
+        super().__init__()
+        self.height, self.width = first_img.shape[:2]
+        self.downscale = max(int(downscale), 1)
+        self.size = (
+            max(self.width // self.downscale, 1),
+            max(self.height // self.downscale, 1)
+        )
+
+        self.mask = play_zone_mask(play_zone, self.size)
+        self.zone_pixels = max(cv2.countNonZero(self.mask), 1)
+        self.pixel_threshold = pixel_threshold
+        self.min_foreground = min_foreground
+        self.min_change = min_change
+        self.hold_interval = hold_interval
+        self.learning_rate = learning_rate
+        self.foreground_rate = foreground_rate
+        self.max_foreground = max_foreground
+
+        shape = (self.size[1], self.size[0])
+        self._small = np.empty(shape + (3,), np.uint8)
+        # current and previous gray frames swap roles every frame
+        self._buffers = (np.empty(shape, np.uint8), np.empty(shape, np.uint8))
+        self._current = 0
+        self._background_gray = np.empty(shape, np.uint8)
+        self._diff = np.empty(shape, np.uint8)
+        self._foreground = np.empty(shape, np.uint8)
+        self._background_mask = np.empty(shape, np.uint8)
+
+        self._reduce(first_img, self._buffers[self._current])
+        self.background = self._buffers[self._current].astype(np.float32)
+
+        # Ratios of the zone covered by foreground, and by its changes
+        self.last_score = 0.0
+        self.last_change = 0.0
+        self._last_passed = -np.inf
+
+    def _reduce(self, img, dst):
+        cv2.resize(img, self.size, dst=self._small, interpolation=cv2.INTER_NEAREST)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=dst)
+
+    def detect(self, img, now=None):
+        """
+        now <float>: time.perf_counter() of the frame
+        returns <bool>: True if the frame should be inferred
+        """
+
+        now = time.perf_counter() if now is None else now
+        self._current ^= 1
+        cur_img = self._buffers[self._current]
+        prv_img = self._buffers[self._current ^ 1]
+        self._reduce(img, cur_img)
+
+        # Foreground: far enough from the background, inside the play zone
+        cv2.convertScaleAbs(self.background, dst=self._background_gray)
+        cv2.absdiff(cur_img, self._background_gray, dst=self._diff)
+        cv2.threshold(
+            self._diff, self.pixel_threshold, 255, cv2.THRESH_BINARY,
+            dst=self._foreground
+        )
+        cv2.bitwise_and(self._foreground, self.mask, dst=self._foreground)
+        self.last_score = cv2.countNonZero(self._foreground) / self.zone_pixels
+
+        # Changes since the previous frame, only on the foreground
+        cv2.absdiff(cur_img, prv_img, dst=self._diff)
+        cv2.threshold(
+            self._diff, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=self._diff
+        )
+        cv2.bitwise_and(self._diff, self._foreground, dst=self._diff)
+        self.last_change = cv2.countNonZero(self._diff) / self.zone_pixels
+
+        self._learn(cur_img)
+
+        if self.last_score < self.min_foreground:
+            decision = 'empty'
+        elif self.last_change >= self.min_change:
+            decision = 'moving'
+        elif now - self._last_passed >= self.hold_interval:
+            decision = 'held'
+        else:
+            decision = 'still'
+
+        passed = self._decide(decision)
+        if passed:
+            self._last_passed = now
+        return passed
+
+    def _learn(self, cur_img):
+        if self.last_score >= self.max_foreground:
+            self.background[:] = cur_img
+            return
+
+        cv2.bitwise_not(self._foreground, dst=self._background_mask)
+        cv2.accumulateWeighted(
+            cur_img, self.background, self.learning_rate, mask=self._background_mask
+        )
+        if self.foreground_rate:
+            cv2.accumulateWeighted(
+                cur_img, self.background, self.foreground_rate, mask=self._foreground
+            )
+
+    def diff_image(self, size=None):
+        """
+        size <tuple<int>>: (width, height) of the image, full resolution if None
+        returns <np.ndarray>: BGR image of the last foreground (white) and
+        play zone (gray), only meant for debug, as it allocates
+        """
+
+        diff_img = cv2.max(self._foreground, self.mask // 4)
+        diff_img = cv2.resize(
+            diff_img, size or (self.width, self.height), interpolation=cv2.INTER_NEAREST
+        )
+        return cv2.cvtColor(diff_img, cv2.COLOR_GRAY2BGR)
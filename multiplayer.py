@@ -0,0 +1,363 @@
+# ./multiplayer.py
+
+import os
+import time
+import signal
+import threading
+import multiprocessing as mp_process
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from utils import input_keys
+from constants import InputConfig
+from preview import DebugOverlay
+from translate import open_camera, FrameProcessor
+from pose_backends import create_pose_backend
+
+
+def player_key_map(player):
+    """
+    Player 1 uses InputConfig (UP, DOWN, ... in .env),
+    player n uses P<n>_UP, P<n>_DOWN, ... in .env, moves without a key are ignored
+
+    player <int>: 1 for the first player
+    returns <dict<str:move, str:key>>
+    """
+
+    if player == 1:
+        return {
+            move.name: os.getenv(f'P1_{move.name}', move.value).lower()
+            for move in InputConfig
+        }
+    return {
+        move.name: os.getenv(f'P{player}_{move.name}', '').lower()
+        for move in InputConfig
+    }
+
+
+def player_worker(
+    shm_name, shape, frame_conn, result_conn, key_map, processor_options,
+    backend_options
+):
+    """
+    Runs in its own process, with its own MediaPipe Pose and TranslatePose.
+
+    Frames are read from two slots of shared memory, the slot to process is
+    received on frame_conn, the result (frame index, bitmask of the Output
+    Moves, keys or None if keys are unchanged) is sent back on result_conn.
+    A result with frame index 0 tells the worker is ready.
+
+    shm_name <str>: name of the SharedMemory holding (2, *shape) uint8 frames
+    shape <tuple<int>>: (height, width, 3) of the frames
+    key_map <dict<str:move, str:key>>: keys of the player
+    processor_options <dict>: other arguments of FrameProcessor
+    backend_options <dict>: arguments of pose_backends.create_pose_backend
+    """
+
+    # Ctrl+C is handled by the supervisor, which stops the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # unlinked by the supervisor (spawned workers share its resource tracker)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frames = np.ndarray((2,) + shape, np.uint8, buffer=shm.buf)
+
+    # dispatch calls the key sink on every frame with motion (not on still
+    # frames), the keys it was called with go in the result
+    outbox = []
+    frame_processor = FrameProcessor(
+        frames[0].copy(), create_pose_backend(**backend_options),
+        key_sink=outbox.append, key_map=key_map, **processor_options
+    )
+    result_conn.send((0, 0, None))
+
+    while True:
+        message = frame_conn.recv()
+        if message is None:
+            break
+
+        index, slot = message
+        motion_detected, pose_landmarks, _ = frame_processor.infer(frames[slot])
+        moves = frame_processor.dispatch(pose_landmarks, motion_detected)
+        result_conn.send((index, moves, outbox.pop() if outbox else None))
+        outbox.clear()
+
+    result_conn.send(None)
+    frame_processor.pose.close()
+    del frames
+    shm.close()
+
+
+class MergedKeySink:
+    """
+    Merges the keys of every player into one list for a single key sink
+    (eg: dispatcher.KeyDispatcher), called from any thread
+    """
+
+    def __init__(self, key_sink, players):
+        """
+        key_sink <callable>: called with the merged list of keys
+        players <iterable<int>>: player numbers
+        """
+
+        self.key_sink = key_sink
+        self.player_keys = {player: [] for player in players}
+        self._lock = threading.Lock()
+
+    def __call__(self, player, keys):
+        with self._lock:
+            self.player_keys[player] = keys
+            self.key_sink(list(dict.fromkeys(
+                key for keys in self.player_keys.values() for key in keys
+            )))
+
+
+class PlayerChannel:
+    """
+    Supervisor side of a player: reads its camera on a thread, copies the
+    newest frame into the free shared memory slot, and hands it to the
+    worker as soon as the worker is idle (frames arriving meanwhile
+    overwrite each other, so the worker always gets the newest one).
+    """
+
+    def __init__(
+        self, player, camera_port, camera_options, key_map, processor_options,
+        backend_options, context
+    ):
+        self.player = player
+        self.camera, self.first_img = open_camera(camera_port, **camera_options)
+        self.shape = self.first_img.shape
+
+        scheduler = processor_options.get('scheduler')
+        if scheduler and not scheduler.source_fps:
+            scheduler.source_fps = self.camera.get(cv2.CAP_PROP_FPS) or None
+
+        self.shm = shared_memory.SharedMemory(
+            create=True, size=2 * self.first_img.nbytes
+        )
+        self.frames = np.ndarray((2,) + self.shape, np.uint8, buffer=self.shm.buf)
+        self.frames[0] = self.first_img
+
+        self.latest_img = self.first_img
+        self.moves = 0
+        self.processed = 0
+        self.dropped = 0
+        self.started = None
+        # Set when the worker died before being asked to stop
+        self.failed = False
+
+        # Worker is busy until it says it is ready
+        self._busy = True
+        self._pending = None
+        self._processing_slot = 0
+        self._closing = False
+        self._lock = threading.Lock()
+
+        frame_recv, self._frame_send = context.Pipe(duplex=False)
+        self._result_recv, result_send = context.Pipe(duplex=False)
+        self.process = context.Process(
+            target=player_worker, name=f'player_{player}', daemon=True,
+            args=(
+                self.shm.name, self.shape, frame_recv, result_send,
+                key_map, processor_options, backend_options
+            ),
+        )
+        self.process.start()
+        frame_recv.close()
+        result_send.close()
+
+    def start(self, on_keys, stop_event):
+        """
+        on_keys <callable>: called with (player, keys) when keys should change
+        stop_event <threading.Event>: stops the capture thread
+        """
+
+        self.threads = [
+            threading.Thread(
+                target=self._capture, args=(stop_event,),
+                name=f'player_{self.player}_capture', daemon=True
+            ),
+            threading.Thread(
+                target=self._results, args=(on_keys,),
+                name=f'player_{self.player}_results', daemon=True
+            ),
+        ]
+        self.started = time.perf_counter()
+        for thread in self.threads:
+            thread.start()
+
+    def capturing(self):
+        return self.threads[0].is_alive() and not self.failed
+
+    def fps(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0
+        return self.processed / elapsed if elapsed else 0
+
+    def close(self):
+        self.threads[0].join()
+        with self._lock:
+            self._closing = True
+            try:
+                self._frame_send.send(None)
+            except OSError:
+                # Worker already gone
+                pass
+        self.threads[1].join()
+        self.process.join()
+
+        self.camera.release()
+        del self.frames
+        self.shm.close()
+        self.shm.unlink()
+
+    def _send_pending(self):
+        # lock held
+        self._processing_slot = 1 - self._processing_slot
+        self._frame_send.send((self._pending, self._processing_slot))
+        self._pending = None
+        self._busy = True
+
+    def _capture(self, stop_event):
+        index = 0
+        while not (stop_event.is_set() or self.failed):
+            success, img = self.camera.read()
+            if not success:
+                break
+            index += 1
+
+            with self._lock:
+                self.frames[1 - self._processing_slot] = img
+                if self._pending is not None:
+                    self.dropped += 1
+                self._pending = index
+                if not self._busy:
+                    self._send_pending()
+            self.latest_img = img
+
+    def _results(self, on_keys):
+        while True:
+            try:
+                message = self._result_recv.recv()
+            except EOFError:
+                # Worker died (its clean stop sends None first)
+                with self._lock:
+                    self.failed = not self._closing
+                if self.failed:
+                    # Keys of the player would stay held for the session
+                    on_keys(self.player, [])
+                break
+            if message is None:
+                break
+
+            index, moves, keys = message
+            with self._lock:
+                self._busy = False
+                if index:
+                    self.processed += 1
+                    self.moves = moves
+                if self._pending is not None and not self._closing:
+                    self._send_pending()
+
+            if keys is not None:
+                on_keys(self.player, keys)
+
+
+def translate_multiplayer(
+    camera_ports, key_maps=None, live_flag=False, debug_level=0,
+    motion_threshold_factor=48, motion_downscale=4, motion_grayscale=False,
+    roi_flag=False, key_sink=input_keys, scheduler=None, camera_options=None,
+    backend_options=None
+):
+    """
+    translate() for several players, one camera and one worker process each
+    (own MediaPipe Pose and TranslatePose), so players scale across cores.
+    Keys of all players are merged into the single key_sink.
+
+    camera_ports <list<str>>: one port (or url) per player
+    key_maps <list<dict<str:move, str:key>>>: keys per player,
+        defaults to player_key_map(1), player_key_map(2), ...
+    scheduler <scheduler.InferenceScheduler>: copied into every worker
+    backend_options <dict>: arguments of pose_backends.create_pose_backend,
+        every worker creates its own pose model
+    other arguments are same as translate(),
+    video logs and metrics are not available with several players
+
+    raises <RuntimeError>: if the worker of a player died, once every
+        player is stopped
+    """
+
+    players = range(1, len(camera_ports) + 1)
+    key_maps = key_maps or [player_key_map(player) for player in players]
+    processor_options = {
+        'motion_threshold_factor': motion_threshold_factor,
+        'motion_downscale': motion_downscale,
+        'motion_grayscale': motion_grayscale,
+        'roi_flag': roi_flag,
+        'scheduler': scheduler,
+    }
+
+    # spawn: workers must not inherit the threads of the supervisor
+    context = mp_process.get_context('spawn')
+    channels = [
+        PlayerChannel(
+            player, camera_port, camera_options or {}, key_map,
+            processor_options, backend_options or {}, context
+        )
+        for player, camera_port, key_map in zip(players, camera_ports, key_maps)
+    ]
+
+    merged_sink = MergedKeySink(key_sink, players)
+    stop_event = threading.Event()
+    for channel in channels:
+        channel.start(merged_sink, stop_event)
+
+    debug_overlays = [
+        DebugOverlay(channel.shape[1], channel.shape[0], min(debug_level, 1))
+        for channel in channels
+    ]
+
+    status_time = time.perf_counter()
+    try:
+        while any(channel.capturing() for channel in channels):
+            if any(channel.failed for channel in channels):
+                break
+
+            if live_flag:
+                for channel, debug_overlay in zip(channels, debug_overlays):
+                    img = channel.latest_img.copy()
+                    if debug_level > 0:
+                        img = debug_overlay.draw(
+                            img, channel.fps(), channel.moves, True
+                        )
+                    cv2.imshow(f'Pose2Input P{channel.player}', img)
+                if cv2.waitKey(1) & 0xFF == 27:
+                    break
+            else:
+                time.sleep(0.05)
+
+            if debug_level > 0 and time.perf_counter() - status_time >= 5:
+                status_time = time.perf_counter()
+                print("[multiplayer] " + " ".join(
+                    f"P{channel.player}={channel.fps():.1f}fps(-{channel.dropped})"
+                    for channel in channels
+                ))
+    finally:
+        stop_event.set()
+        for channel in channels:
+            channel.close()
+        if live_flag:
+            cv2.destroyAllWindows()
+
+    print("[multiplayer] final " + " ".join(
+        f"P{channel.player}={channel.processed}frames(-{channel.dropped})"
+        for channel in channels
+    ))
+
+    failed = [channel for channel in channels if channel.failed]
+    if failed:
+        raise RuntimeError(", ".join(
+            f"worker of player {channel.player} died "
+            f"(exit code {channel.process.exitcode})"
+            for channel in failed
+        ))
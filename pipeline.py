@@ -0,0 +1,382 @@
+# ./pipeline.py
+
+import time
+import threading
+from collections import deque
+
+import cv2
+
+from utils import input_keys
+from preview import PreviewCompositor
+from translate import open_camera, open_video_log, FrameProcessor
+
+
+class DropOldestQueue:
+    """
+    Bounded queue between two pipeline stages, when it is full `put` drops
+    the oldest item instead of blocking, so the consumer always gets the
+    freshest item and a slow consumer never holds up its producer
+    """
+
+    def __init__(self, name, maxsize=1):
+        self.name = name
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.max_depth = 0
+        self.closed = False
+        self._items = deque()
+        self._not_empty = threading.Condition()
+
+    def put(self, item):
+        with self._not_empty:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._not_empty.notify()
+
+    def get(self, timeout=None):
+        """
+        returns the oldest item, or None if the queue is closed
+        or nothing arrived within timeout (sec)
+        """
+
+        with self._not_empty:
+            if not self._items and not self.closed:
+                self._not_empty.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def close(self):
+        """
+        wakes up the consumer, after this get returns None once drained
+        """
+
+        with self._not_empty:
+            self.closed = True
+            self._not_empty.notify_all()
+
+    def depth(self):
+        return len(self._items)
+
+
+class FramePacket:
+    """
+    Everything known about one captured frame, passed from stage to stage
+    """
+
+    __slots__ = (
+        'index', 'captured_at', 'captured_time', 'img', 'diff_img', 'motion_detected',
+        'pose_landmarks', 'moves', 'roi',
+    )
+
+    def __init__(self, index, img):
+        self.index = index
+        self.captured_at = time.perf_counter()
+        self.captured_time = time.time()
+        self.img = img
+        self.diff_img = None
+        self.motion_detected = False
+        self.pose_landmarks = None
+        self.moves = 0
+        self.roi = None
+
+
+class TranslatePipeline:
+    """
+    Runs translate() as four stages linked by DropOldestQueues:
+        - capture: grabs images from the Capturing Device
+        - inference: motion gate + MediaPipe Pose
+        - dispatch: deduces the Move(s), types the associated keystroke
+            and publishes the move events (if any)
+        - render: hands frames to the PreviewCompositor (which draws the
+            overlay on its own thread) and video_log, and shows the live
+            feed, on the main thread as OpenCV GUI calls are not thread safe
+    """
+
+    # Seconds between two queue depth reports
+    REPORT_INTERVAL = 5
+
+    def __init__(
+        self, log_flag=True, live_flag=False, debug_level=0, log_fps=0,
+        camera_port="0", motion_threshold_factor=48, motion_downscale=4,
+        motion_grayscale=False, roi_flag=False, key_sink=input_keys,
+        metrics=None, log_options=None, scheduler=None, camera_options=None,
+        pose_backend=None, infer_scale=1.0, tracker=None, preview_options=None,
+        log_annotated=True, opened_camera=None, gate_options=None, events=None,
+        video_log=None, queue_size=1
+    ):
+        """
+        takes same arguments as translate()
+
+        queue_size <int>: max items waiting between two stages
+        """
+
+        self.log_flag = log_flag
+        self.live_flag = live_flag
+        self.debug_level = debug_level
+        self.metrics = metrics
+        self.events = events
+
+        self.camera, self.first_img = opened_camera or open_camera(
+            camera_port, **(camera_options or {})
+        )
+        height, width, _ = self.first_img.shape
+
+        if scheduler and not scheduler.source_fps:
+            # Budget of a frame, to keep up with the camera
+            scheduler.source_fps = self.camera.get(cv2.CAP_PROP_FPS) or None
+
+        # infer is only called by the inference stage,
+        # and dispatch only by the dispatch stage
+        self.frame_processor = FrameProcessor(
+            self.first_img, pose_backend, motion_threshold_factor, motion_downscale,
+            motion_grayscale, roi_flag, key_sink, scheduler,
+            infer_scale=infer_scale, tracker=tracker, gate_options=gate_options
+        )
+
+        self.video_log = (
+            video_log or open_video_log(log_fps, width, height, **(log_options or {}))
+            if log_flag else None
+        )
+
+        # Overlay and preview are drawn on their own thread
+        self.annotated_log = log_flag and log_annotated and debug_level > 0
+        self.preview = None
+        if live_flag or self.annotated_log:
+            self.preview = PreviewCompositor(
+                width, height, debug_level, live_flag,
+                video_log=self.video_log if self.annotated_log else None,
+                **(preview_options or {})
+            )
+
+        self.stop_event = threading.Event()
+        self.capture_queue = DropOldestQueue('capture', queue_size)
+        self.inference_queue = DropOldestQueue('inference', queue_size)
+        self.render_queue = DropOldestQueue('render', queue_size)
+        self.queues = (self.capture_queue, self.inference_queue, self.render_queue)
+
+        # Exceptions raised by the stage threads, re-raised by run()
+        self.errors = []
+        self.threads = [
+            threading.Thread(
+                target=self.run_stage, args=(stage, output_queue),
+                name=name, daemon=True
+            )
+            for name, stage, output_queue in (
+                ('capture', self.capture_stage, self.capture_queue),
+                ('inference', self.inference_stage, self.inference_queue),
+                ('dispatch', self.dispatch_stage, self.render_queue),
+            )
+        ]
+
+    def queue_stats(self):
+        """
+        returns <str>: current depth, max depth and dropped items per queue
+            (and inferred/predicted frames if there is a scheduler)
+        """
+
+        stats = " ".join(
+            f"{queue.name}={queue.depth()}/{queue.max_depth}(-{queue.dropped})"
+            for queue in self.queues
+        )
+        if self.frame_processor.scheduler:
+            stats += f" {self.frame_processor.scheduler.stats()}"
+        if self.frame_processor.tracker:
+            stats += f" {self.frame_processor.tracker.stats()}"
+        return stats
+
+    def run_stage(self, stage, output_queue):
+        """
+        runs a stage on its thread, whether it returns or raises its output
+        queue is closed, so the next stages drain and stop instead of
+        waiting for frames forever
+        """
+
+        try:
+            stage()
+        except Exception as error:
+            self.errors.append(error)
+            # Upstream stages stop as well
+            self.stop_event.set()
+        finally:
+            output_queue.close()
+
+    def capture_stage(self):
+        index = 0
+        while not self.stop_event.is_set():
+            start = time.perf_counter()
+            success, img = self.camera.read()
+            if not success:
+                break
+            if self.metrics:
+                self.metrics.observe('camera_read', time.perf_counter() - start)
+            index += 1
+            self.capture_queue.put(FramePacket(index, img))
+
+    def inference_stage(self):
+        try:
+            self.infer_packets()
+        finally:
+            self.frame_processor.pose.close()
+
+    def infer_packets(self):
+        frame_processor = self.frame_processor
+
+        while True:
+            packet = self.capture_queue.get()
+            if packet is None:
+                break
+
+            # Motion gate against the last frame that was inferred,
+            # then MediaPipe finds marker for all body parts
+            (
+                packet.motion_detected, packet.pose_landmarks, packet.roi
+            ) = frame_processor.infer(packet.img)
+
+            if (
+                self.debug_level > 2 and not packet.motion_detected
+                and self.preview and self.preview.wants()
+            ):
+                packet.diff_img = frame_processor.motion_detector.diff_image(
+                    self.preview.diff_size
+                )
+
+            if self.metrics:
+                self.metrics.record(
+                    frame_processor.stage_times, FrameProcessor.INFER_STAGES
+                )
+                self.metrics.count(
+                    'gate_decisions', frame_processor.motion_detector.last_decision
+                )
+
+            self.inference_queue.put(packet)
+
+    def dispatch_stage(self):
+        while True:
+            packet = self.inference_queue.get()
+            if packet is None:
+                break
+
+            # Deduces the Move(s), and inputs the associated key(s)
+            packet.moves = self.frame_processor.dispatch(
+                packet.pose_landmarks, packet.motion_detected
+            )
+
+            if self.events:
+                start = time.perf_counter()
+                self.events.publish(
+                    packet.moves, packet.pose_landmarks, packet.motion_detected,
+                    packet.captured_time
+                )
+                if self.metrics:
+                    self.metrics.observe('publish_events', time.perf_counter() - start)
+
+            if self.metrics:
+                self.metrics.record(
+                    self.frame_processor.stage_times, FrameProcessor.DISPATCH_STAGES
+                )
+
+            self.render_queue.put(packet)
+
+    def render_stage(self):
+        """
+        consumes rendered frames on the calling thread until ESC is pressed
+        or the Capturing Device runs out of frames
+        """
+
+        prv_time = cur_time = time.perf_counter()
+        next_report = cur_time + self.REPORT_INTERVAL
+
+        if self.log_flag:
+            self.video_log.write(self.first_img)
+
+        while not (
+            self.preview.show() if self.live_flag
+            else cv2.waitKey(1) & 0xFF == 27
+        ):
+            packet = self.render_queue.get(timeout=0.1)
+            if packet is None:
+                if self.render_queue.closed:
+                    break
+                continue
+
+            prv_time, cur_time = cur_time, time.perf_counter()
+
+            if self.preview and self.preview.wants(cur_time):
+                fps = 1/(cur_time - prv_time) if (cur_time - prv_time) != 0 else 0
+
+                # live_flag is set to True, Display the (downscaled) captured image
+                self.preview.submit(
+                    packet.img, fps, packet.moves, packet.motion_detected,
+                    packet.pose_landmarks, packet.diff_img,
+                    status=self.queue_stats() if self.debug_level > 1 else None,
+                    roi=packet.roi, captured_time=packet.captured_time
+                )
+            draw_end = time.perf_counter()
+
+            # log_flag is set to True, Store the captured image
+            if self.log_flag and not self.annotated_log:
+                self.video_log.write(packet.img, packet.captured_time)
+
+            if self.metrics:
+                # `frame` is the end to end latency, from capture to render
+                frame_end = time.perf_counter()
+                self.metrics.observe('draw', draw_end - cur_time)
+                if self.log_flag:
+                    self.metrics.observe('video_log', frame_end - draw_end)
+                self.metrics.observe('frame', frame_end - packet.captured_at)
+
+            if self.debug_level > 0 and cur_time >= next_report:
+                next_report = cur_time + self.REPORT_INTERVAL
+                print(f"[pipeline] queues: {self.queue_stats()}")
+
+    def run(self):
+        for thread in self.threads:
+            thread.start()
+
+        try:
+            self.render_stage()
+        finally:
+            self.stop_event.set()
+            for thread in self.threads:
+                thread.join()
+
+            # Closes Capturing Device
+            self.camera.release()
+
+            if self.frame_processor.tracker:
+                self.frame_processor.tracker.close()
+
+            if self.events:
+                self.events.close()
+                print(f"[events] {self.events.stats()}")
+
+            if self.preview:
+                # Draws (and logs) the frames still queued
+                self.preview.close()
+
+            if self.log_flag:
+                # Closes Video Writer
+                self.video_log.release()
+
+            # Closes all the frames
+            cv2.destroyAllWindows()
+
+            print(f"[pipeline] final queues: {self.queue_stats()}")
+            print(f"[gate] {self.frame_processor.motion_detector.stats()}")
+
+        if self.errors:
+            # A stage failed, frames stopped flowing because of it
+            raise self.errors[0]
+
+
+def translate_pipelined(**kwargs):
+    """
+    same as translate(), but capture, inference, keystrokes and
+    rendering/logging run concurrently, see TranslatePipeline
+    """
+
+    TranslatePipeline(**kwargs).run()
@@ -0,0 +1,189 @@
+# ./pose_backends.py
+
+import os
+
+import cv2
+import numpy as np
+
+from utils import landmarks_to_array, LandmarkIndexEnum
+
+
+class PoseBackend:
+    """
+    Interface of the pose estimation models.
+
+    process takes an RGB frame and returns a (33, 4) float32 array, rows in
+    LandmarkIndexEnum order with x, y (normalized to the frame), z and
+    visibility columns, or None if no body is found. Body parts a model
+    does not estimate have a visibility of 0.
+    """
+
+    name = None
+
+    def process(self, rgb_img):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MediaPipeBackend(PoseBackend):
+    """
+    MediaPipe Pose (BlazePose), model_complexity: 0 (lite), 1 (full), 2 (heavy)
+    """
+
+    name = 'mediapipe'
+
+    def __init__(
+        self, model_complexity=1, smooth_landmarks=True,
+        min_detection_confidence=0.5, min_tracking_confidence=0.5
+    ):
+        # Loaded with the model, not when pose_backends is imported
+        import mediapipe.python.solutions as mp
+
+        self.pose = mp.pose.Pose(
+            model_complexity=model_complexity,
+            smooth_landmarks=smooth_landmarks,
+            min_detection_confidence=min_detection_confidence,
+            min_tracking_confidence=min_tracking_confidence,
+        )
+
+    def process(self, rgb_img):
+        pose_landmarks = self.pose.process(rgb_img).pose_landmarks
+        if pose_landmarks is None:
+            return None
+        return landmarks_to_array(pose_landmarks.landmark)
+
+    def close(self):
+        self.pose.close()
+
+
+class MoveNetBackend(PoseBackend):
+    """
+    MoveNet single pose (Lightning: 192px, Thunder: 256px) TFLite model,
+    run by tflite_runtime (or tensorflow.lite), lighter than MediaPipe Pose
+    on most CPUs. Its 17 COCO keypoints are all the body parts TranslatePose
+    uses, the other landmarks have a visibility of 0.
+
+    Download: https://tfhub.dev/google/lite-model/movenet/singlepose/lightning/tflite/int8/4
+    """
+
+    name = 'movenet'
+
+    # LandmarkIndexEnum of every MoveNet (COCO) keypoint, in output order
+    KEYPOINTS = np.array([
+        LandmarkIndexEnum.NOSE,
+        LandmarkIndexEnum.LEFT_EYE, LandmarkIndexEnum.RIGHT_EYE,
+        LandmarkIndexEnum.LEFT_EAR, LandmarkIndexEnum.RIGHT_EAR,
+        LandmarkIndexEnum.LEFT_SHOULDER, LandmarkIndexEnum.RIGHT_SHOULDER,
+        LandmarkIndexEnum.LEFT_ELBOW, LandmarkIndexEnum.RIGHT_ELBOW,
+        LandmarkIndexEnum.LEFT_WRIST, LandmarkIndexEnum.RIGHT_WRIST,
+        LandmarkIndexEnum.LEFT_HIP, LandmarkIndexEnum.RIGHT_HIP,
+        LandmarkIndexEnum.LEFT_KNEE, LandmarkIndexEnum.RIGHT_KNEE,
+        LandmarkIndexEnum.LEFT_ANKLE, LandmarkIndexEnum.RIGHT_ANKLE,
+    ])
+
+    # MoveNet scores are lower than MediaPipe visibilities, a score of
+    # min_score is mapped to TranslatePose's default visibility_threshold
+    VISIBILITY_AT_MIN_SCORE = 0.9
+
+    def __init__(self, model_path, num_threads=None, min_score=0.3, min_person_score=0.2):
+        """
+        model_path <str>: .tflite file of MoveNet single pose
+        num_threads <int>: threads of the interpreter, None for default
+        min_score <float>: keypoint score considered reliable
+        min_person_score <float>: mean score below which no body is found
+        """
+
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tensorflow.lite import Interpreter
+            except ImportError:
+                raise ImportError(
+                    "MoveNet backend needs tflite_runtime (pip install tflite-runtime)"
+                ) from None
+
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        input_details = self.interpreter.get_input_details()[0]
+        self.input_index = input_details['index']
+        self.input_dtype = input_details['dtype']
+        self.input_size = int(input_details['shape'][1])
+        self.output_index = self.interpreter.get_output_details()[0]['index']
+
+        self.min_score = min_score
+        self.min_person_score = min_person_score
+
+        # Square input, frame is resized into its top left corner
+        self._input = np.zeros(
+            (1, self.input_size, self.input_size, 3), self.input_dtype
+        )
+
+    def process(self, rgb_img):
+        height, width, _ = rgb_img.shape
+        scale = self.input_size / max(height, width)
+        resized_width = max(int(round(width * scale)), 1)
+        resized_height = max(int(round(height * scale)), 1)
+
+        self._input.fill(0)
+        self._input[0, :resized_height, :resized_width] = cv2.resize(
+            rgb_img, (resized_width, resized_height), interpolation=cv2.INTER_AREA
+        )
+        self.interpreter.set_tensor(self.input_index, self._input)
+        self.interpreter.invoke()
+
+        # (y, x, score) of every keypoint, normalized to the square input
+        keypoints = self.interpreter.get_tensor(self.output_index).reshape(-1, 3)
+        if keypoints[:, 2].mean() < self.min_person_score:
+            return None
+
+        landmarks = np.zeros((len(LandmarkIndexEnum), 4), np.float32)
+        landmarks[self.KEYPOINTS, 0] = keypoints[:, 1] * self.input_size / resized_width
+        landmarks[self.KEYPOINTS, 1] = keypoints[:, 0] * self.input_size / resized_height
+        landmarks[self.KEYPOINTS, 3] = np.interp(
+            keypoints[:, 2], (0, self.min_score, 1),
+            (0, self.VISIBILITY_AT_MIN_SCORE, 1)
+        )
+        return landmarks
+
+
+POSE_BACKENDS = {
+    backend.name: backend for backend in (MediaPipeBackend, MoveNetBackend)
+}
+
+
+def create_pose_backend(name='mediapipe', **options):
+    """
+    name <str>: key of POSE_BACKENDS
+    options: arguments of the backend
+    returns <PoseBackend>
+    """
+
+    return POSE_BACKENDS[name](**options)
+
+
+def backend_options_from_env(name='mediapipe'):
+    """
+    name <str>: key of POSE_BACKENDS
+    returns <dict>: arguments of create_pose_backend, read from .env
+    """
+
+    if name == MoveNetBackend.name:
+        return {
+            'name': name,
+            'model_path': os.getenv('MOVENET_MODEL', 'models/movenet_lightning.tflite'),
+            'num_threads': int(os.getenv('MOVENET_THREADS', 0)) or None,
+        }
+    return {
+        'name': name,
+        'model_complexity': int(os.getenv('POSE_MODEL_COMPLEXITY', 1)),
+        'smooth_landmarks': os.getenv('POSE_SMOOTH_LANDMARKS', 'true').lower() == 'true',
+        'min_detection_confidence': float(
+            os.getenv('POSE_MIN_DETECTION_CONFIDENCE', 0.5)
+        ),
+        'min_tracking_confidence': float(
+            os.getenv('POSE_MIN_TRACKING_CONFIDENCE', 0.5)
+        ),
+    }
@@ -0,0 +1,314 @@
+# ./preview.py
+
+import time
+import threading
+from collections import deque
+
+import cv2
+
+from utils import bitmask_to_moves
+
+
+class DebugOverlay:
+    """
+    Draws the debug information (FPS, Output Moves, Exoskeleton)
+    onto the captured frame, according to debug_level
+    """
+
+    # Body Parts below this visibility are not drawn
+    MIN_VISIBILITY = 0.5
+
+    def __init__(self, width, height, debug_level, scale=1.0):
+        """
+        width, height <int>: size of the frames drawn upon
+        scale <float>: size of the text, relative to a full resolution frame
+        """
+
+        # FPS and Output Moves setting
+        self.debug_level = debug_level
+        self.cv_font_vars_outline = (
+            cv2.FONT_HERSHEY_PLAIN, 1.7 * scale, (192, 44, 44), max(round(3 * scale), 1)
+        )
+        self.cv_font_vars = (
+            cv2.FONT_HERSHEY_PLAIN, 1.7 * scale, (245,66,66), max(round(2 * scale), 1)
+        )
+        self.fps_coord = (width - int(100 * scale), int(50 * scale))
+        self.movelist_coord = (int(50 * scale), height - int(50 * scale))
+        self.status_coord = (int(50 * scale), int(50 * scale))
+
+        # Exoskeleton is only drawn from level 2, MediaPipe is loaded for it
+        self.connections = ()
+        if debug_level > 1:
+            from mediapipe.python.solutions.pose import POSE_CONNECTIONS
+
+            self.connections = tuple(POSE_CONNECTIONS)
+
+    def draw(
+        self, img, fps, moves, motion_detected, pose_landmarks=None,
+        diff_img=None, status=None, roi=None
+    ):
+        """
+        returns the image to be displayed/logged
+
+        img <np.ndarray>: captured frame, drawn upon in place
+        fps <float>: FPS to display
+        moves <int>: bitmask of the Output Moves (see utils.MOVES)
+        motion_detected <bool>: whether motion gate passed for this frame
+        pose_landmarks <np.ndarray>: (33, 4) Body Parts Found, if any
+        diff_img <np.ndarray>: shown instead of img at debug_level 3 if no motion
+        status <str>: optional extra line of text (eg: queue depths)
+        roi <tuple<int>>: (x0, y0, x1, y1) Region of Interest given to MediaPipe
+        """
+
+        if self.debug_level > 1 and motion_detected and pose_landmarks is not None:
+            self.draw_landmarks(img, pose_landmarks)
+
+        if self.debug_level > 1 and roi:
+            cv2.rectangle(img, roi[:2], roi[2:], (66,245,66), 1)
+
+        if self.debug_level > 2 and not motion_detected and diff_img is not None:
+            img = diff_img
+
+        # FPS and Output Moves Output
+        movelist = bitmask_to_moves(moves)
+        for font_vars in (self.cv_font_vars_outline, self.cv_font_vars):
+            cv2.putText(img, f"{fps:.2f}", self.fps_coord, *font_vars)
+            cv2.putText(img, f"{movelist}", self.movelist_coord, *font_vars)
+            if status:
+                cv2.putText(img, status, self.status_coord, *font_vars)
+
+        return img
+
+    def draw_landmarks(self, img, pose_landmarks):
+        """
+        draws the Virtual Exoskeleton of visible Body Parts, in place
+
+        pose_landmarks <np.ndarray>: (33, 4) normalized landmarks
+        """
+
+        height, width, _ = img.shape
+        points = (pose_landmarks[:, :2] * (width, height)).astype(int).tolist()
+        visible = (pose_landmarks[:, 3] >= self.MIN_VISIBILITY).tolist()
+
+        for start, end in self.connections:
+            if visible[start] and visible[end]:
+                cv2.line(img, points[start], points[end], (66,245,66), 2)
+        for point, point_visible in zip(points, visible):
+            if point_visible:
+                cv2.circle(img, point, 2, (66,66,245), 2)
+
+
+class PreviewCompositor:
+    """
+    Draws the debug overlay (and the live preview) on its own thread, so
+    debugging does not change the timing of the frame loop.
+
+    The preview is a downscaled copy of the frame, shown at most max_fps
+    times per second, the overlay is drawn on that copy. If annotated_log
+    is set, the overlay is also drawn at full resolution on the frames
+    given to video_log, otherwise the frame loop logs raw frames itself.
+
+    `submit` only queues the frame. If the thread falls behind, the oldest
+    frame still to draw is dropped, unless it is meant for the video log:
+    it is then logged raw (without the overlay), in order, so the log never
+    loses frames to a slow overlay.
+
+    Only the drawing is done on the thread, HighGUI calls (imshow, waitKey)
+    are not thread safe (and must stay on the main thread on macOS), so the
+    frame loop calls `show` to display the last preview drawn and handle the
+    window events: ESC sets self.stopped, any other key is given to on_key.
+    """
+
+    def __init__(
+        self, width, height, debug_level, live_flag=True, scale=0.5, max_fps=15,
+        video_log=None, window_name="Pose2Input-MK9", buffer_size=4, on_key=None
+    ):
+        """
+        width, height <int>: size of the captured frames
+        debug_level <int>: same as translate()
+        live_flag <bool>: if True, the preview window is shown
+        scale <float>: preview is resized by this factor
+        max_fps <float>: max frames per second of the preview, <= 0 for all
+        video_log <video_log.AsyncVideoLog>: if given, every submitted frame
+            is annotated and logged (annotated_log)
+        buffer_size <int>: max frames waiting to be drawn (frames waiting to
+            be logged raw are not counted)
+        on_key <callable>: called (by `show`) with the code of every other
+            key pressed in the preview window
+        """
+
+        self.debug_level = debug_level
+        self.live_flag = live_flag
+        self.window_name = window_name
+        self.video_log = video_log
+        self.buffer_size = buffer_size
+        self.on_key = on_key
+
+        self.size = (width, height)
+        self.preview_size = (max(int(width * scale), 1), max(int(height * scale), 1))
+        # (width, height) the level 3 image of the difference is needed at
+        self.diff_size = self.size if video_log is not None else self.preview_size
+        self.scale = self.preview_size[0] / width
+        self.interval = 1 / max_fps if max_fps > 0 else 0
+
+        self.preview_overlay = DebugOverlay(*self.preview_size, debug_level, self.scale)
+        self.log_overlay = DebugOverlay(width, height, debug_level)
+
+        self.shown = 0
+        self.logged = 0
+        self.dropped = 0
+        # Frames logged without their overlay, the thread being behind
+        self.logged_raw = 0
+        self.stopped = threading.Event()
+
+        self._next_preview = 0.0
+        # Frames to log raw are always the oldest ones of the buffer
+        self._buffer = deque()
+        self._raw_frames = 0
+        # Last preview drawn, not shown yet
+        self._preview_img = None
+        self._closed = False
+        self._not_empty = threading.Condition()
+        self._worker = threading.Thread(
+            target=self._run, name='preview', daemon=True
+        )
+        self._worker.start()
+
+    def preview_due(self, now=None):
+        """
+        returns <bool>: whether a frame submitted now would be previewed
+        """
+
+        now = time.perf_counter() if now is None else now
+        return self.live_flag and now >= self._next_preview
+
+    def wants(self, now=None):
+        """
+        returns <bool>: whether a frame submitted now would be used at all,
+            to skip the work of gathering its overlay otherwise
+        """
+
+        return self.video_log is not None or self.preview_due(now)
+
+    def submit(
+        self, img, fps, moves, motion_detected, pose_landmarks=None,
+        diff_img=None, status=None, roi=None, captured_time=None
+    ):
+        """
+        img <np.ndarray>: captured frame, must not be modified afterwards
+        diff_img <np.ndarray | callable>: level 3 image of the difference,
+            or a function called (on the calling thread, and only if
+            needed) with self.diff_size to make it
+        captured_time <float>: time.time() the frame was captured, for the log
+        other arguments are same as DebugOverlay.draw
+        """
+
+        now = time.perf_counter()
+        preview = self.preview_due(now)
+        if not preview and self.video_log is None:
+            return
+        if preview:
+            self._next_preview = max(self._next_preview + self.interval, now)
+
+        if self.debug_level < 3 or motion_detected:
+            diff_img = None
+        elif callable(diff_img):
+            # motion buffers change with the next frame, so made here
+            diff_img = diff_img(self.diff_size)
+
+        with self._not_empty:
+            if len(self._buffer) - self._raw_frames >= self.buffer_size:
+                # Oldest frame still to draw
+                oldest = self._buffer[self._raw_frames]
+                if self.video_log is None:
+                    del self._buffer[self._raw_frames]
+                    self.dropped += 1
+                else:
+                    self._buffer[self._raw_frames] = (True, False) + oldest[2:]
+                    self._raw_frames += 1
+                    self.logged_raw += 1
+            self._buffer.append((
+                False, preview, img, fps, moves, motion_detected, pose_landmarks,
+                diff_img, status, roi, captured_time
+            ))
+            self._not_empty.notify()
+
+    def show(self):
+        """
+        called by the frame loop, on the main thread: shows the last preview
+        drawn (if any) and handles the events of the window
+        returns <bool>: whether ESC was pressed
+        """
+
+        with self._not_empty:
+            img, self._preview_img = self._preview_img, None
+        if img is not None:
+            cv2.imshow(self.window_name, img)
+            self.shown += 1
+
+        if self.shown:
+            key = cv2.waitKey(1) & 0xFF
+            if key == 27:
+                self.stopped.set()
+            elif key != 0xFF and self.on_key:
+                self.on_key(key)
+        return self.stopped.is_set()
+
+    def close(self):
+        """
+        draws (and logs) the frames still queued, then stops the thread
+        """
+
+        with self._not_empty:
+            self._closed = True
+            self._not_empty.notify()
+        self._worker.join()
+
+        if self.shown:
+            cv2.destroyWindow(self.window_name)
+
+    def _draw(
+        self, raw, preview, img, fps, moves, motion_detected, pose_landmarks,
+        diff_img, status, roi, captured_time
+    ):
+        if raw:
+            self.video_log.write(img, captured_time)
+            self.logged += 1
+            return
+
+        if preview:
+            small = cv2.resize(img, self.preview_size, interpolation=cv2.INTER_NEAREST)
+            small_diff = diff_img
+            if diff_img is not None and diff_img.shape[1::-1] != self.preview_size:
+                small_diff = cv2.resize(
+                    diff_img, self.preview_size, interpolation=cv2.INTER_NEAREST
+                )
+            small_roi = tuple(int(value * self.scale) for value in roi) if roi else None
+            small = self.preview_overlay.draw(
+                small, fps, moves, motion_detected, pose_landmarks, small_diff,
+                status, small_roi
+            )
+            with self._not_empty:
+                self._preview_img = small
+
+        if self.video_log is not None:
+            if self.debug_level > 0:
+                img = self.log_overlay.draw(
+                    img, fps, moves, motion_detected, pose_landmarks, diff_img,
+                    status, roi
+                )
+            self.video_log.write(img, captured_time)
+            self.logged += 1
+
+    def _run(self):
+        while True:
+            with self._not_empty:
+                while not self._buffer and not self._closed:
+                    self._not_empty.wait()
+                if not self._buffer:
+                    break
+                item = self._buffer.popleft()
+                if item[0]:
+                    self._raw_frames -= 1
+
+            self._draw(*item)
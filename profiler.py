@@ -0,0 +1,215 @@
+# ./profiler.py
+
+import os
+import sys
+import signal
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+
+# Signal toggling the profiler (kill -USR1 <pid>), Ctrl+Break on Windows
+TOGGLE_SIGNAL = getattr(signal, 'SIGUSR1', None) or getattr(signal, 'SIGBREAK', None)
+
+# Key of the preview window toggling the profiler
+TOGGLE_KEY = ord('p')
+
+
+def collapse_stack(thread_name, frame):
+    """
+    returns <str>: stack of the frame in collapsed (flamegraph) format,
+        root first, the thread name being the root
+    """
+
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+
+class FrameProfiler:
+    """
+    Stack sampler for the frame loop of translate(), started and stopped
+    while playing, by TOGGLE_SIGNAL or TOGGLE_KEY in the preview window,
+    and stopped anyway after `duration` seconds.
+
+    While it runs, a thread samples the stacks of every other thread each
+    `interval` seconds, and the frame loop records the stage times of
+    every frame. Once stopped, both are written next to the video log,
+    on a background thread so the frame loop does not stutter:
+        - <log>.profile_<time>.folded: collapsed stacks with their sample
+          counts, for flamegraph.pl / speedscope
+        - <log>.profile_<time>.frames.csv: timing of every frame, keyed by
+          the same capture timestamps as <log>.timestamps.csv
+    """
+
+    def __init__(self, log_base=None, duration=10, interval=0.005):
+        """
+        log_base <str>: path of the video log, profiles are named after it,
+            set by translate() if None
+        duration <float>: max seconds of a profile
+        interval <float>: seconds between two stack samples
+        """
+
+        self.log_base = log_base
+        self.duration = duration
+        self.interval = interval
+
+        self.active = False
+        self.profiles = 0
+
+        self._toggle_requested = False
+        self._deadline = 0.0
+        self._stacks = Counter()
+        self._frames = []
+        self._stages = None
+        self._stop_event = threading.Event()
+        self._sampler = None
+        self._writers = []
+
+    def install(self):
+        """
+        toggles the profiler on TOGGLE_SIGNAL, if the platform has one
+        returns <bool>: whether the handler was installed
+        """
+
+        if TOGGLE_SIGNAL is None:
+            return False
+        signal.signal(TOGGLE_SIGNAL, self.request_toggle)
+        return True
+
+    def request_toggle(self, *_):
+        """
+        safe to call from a signal handler or another thread,
+        the profiler starts or stops on the next frame
+        """
+
+        self._toggle_requested = True
+
+    def on_key(self, key):
+        if key == TOGGLE_KEY:
+            self.request_toggle()
+
+    def poll(self, now=None):
+        """
+        called by the frame loop once per frame
+        returns <bool>: whether this frame should be recorded
+        """
+
+        if self._toggle_requested:
+            self._toggle_requested = False
+            if self.active:
+                self.stop()
+            else:
+                self.start()
+        elif self.active and (now or time.perf_counter()) >= self._deadline:
+            self.stop()
+        return self.active
+
+    def start(self):
+        self.active = True
+        self.started_at = datetime.now()
+        self._deadline = time.perf_counter() + self.duration
+        # New ones, the previous profile may still be being written
+        self._stacks = Counter()
+        self._frames = []
+        self._stages = None
+        self._stop_event = threading.Event()
+        self._sampler = threading.Thread(
+            target=self._sample,
+            args=(threading.get_ident(), self._stacks, self._stop_event),
+            name='profiler', daemon=True
+        )
+        self._sampler.start()
+        print(f"[profiler] started for {self.duration}s")
+
+    def record(self, timestamp, stage_times):
+        """
+        timestamp <float>: time.time() the frame was captured
+        stage_times <dict<str, float>>: seconds of every stage (None if skipped)
+        """
+
+        if self._stages is None:
+            self._stages = tuple(stage_times)
+        self._frames.append(
+            (timestamp, [stage_times.get(stage) for stage in self._stages])
+        )
+
+    def stop(self):
+        """
+        stops sampling, the profile is written on a background thread
+        returns <tuple<str, str>>: paths of the collapsed stacks and frame trace
+        """
+
+        self.active = False
+        self._stop_event.set()
+        self.profiles += 1
+
+        # Milliseconds, so profiles started within a second do not collide
+        base = f"{self.log_base}.profile_{self.started_at.strftime('%H-%M-%S-%f')[:-3]}"
+        folded_path, frames_path = f"{base}.folded", f"{base}.frames.csv"
+
+        self._writers = [writer for writer in self._writers if writer.is_alive()]
+        writer = threading.Thread(
+            target=self._write,
+            args=(
+                self._sampler, self._stacks, self._frames, self._stages or (),
+                folded_path, frames_path
+            ),
+            name='profiler_writer', daemon=True
+        )
+        writer.start()
+        self._writers.append(writer)
+        return folded_path, frames_path
+
+    def close(self):
+        """
+        stops the profiler if active, and waits for the profiles to be written
+        """
+
+        if self.active:
+            self.stop()
+        for writer in self._writers:
+            writer.join()
+        self._writers = []
+
+    @staticmethod
+    def _write(sampler, stacks, frames, stages, folded_path, frames_path):
+        # Stacks are complete once the sampler is done
+        sampler.join()
+
+        with open(folded_path, 'w') as folded_file:
+            for stack, count in stacks.most_common():
+                folded_file.write(f"{stack} {count}\n")
+
+        with open(frames_path, 'w') as frames_file:
+            frames_file.write(
+                "frame,timestamp," + ",".join(f"{stage}_ms" for stage in stages) + "\n"
+            )
+            for frame, (timestamp, times) in enumerate(frames):
+                frames_file.write(
+                    f"{frame},{timestamp:.6f},"
+                    + ",".join(
+                        "" if seconds is None else f"{seconds * 1000:.3f}"
+                        for seconds in times
+                    ) + "\n"
+                )
+
+        print(
+            f"[profiler] {sum(stacks.values())} samples, "
+            f"{len(frames)} frames -> {folded_path}, {frames_path}"
+        )
+
+    def _sample(self, loop_ident, stacks, stop_event):
+        own_ident = threading.get_ident()
+        while not stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                name = 'frame_loop' if ident == loop_ident else names.get(ident, str(ident))
+                stacks[collapse_stack(name, frame)] += 1
@@ -0,0 +1,350 @@
+# ./remote.py
+
+import time
+import struct
+import asyncio
+from itertools import islice
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from motion import MotionDetector
+from metrics import summarize_latencies
+from preview import DebugOverlay
+from translate import open_camera
+from pose_backends import create_pose_backend
+from utils import (
+    VectorizedTranslatePose, keystroke_table, input_keys,
+    LandmarkIndexEnum, UNUSED_LANDMARKS
+)
+
+
+# kind, request id, payload size, seconds spent by the server (0 for requests)
+HEADER = struct.Struct('!BIIf')
+
+# Requests: JPEG frame, the server answers with MOVES or LANDMARKS
+FRAME = 1
+FRAME_FOR_LANDMARKS = 2
+# Responses: bitmask of utils.MOVES (uint16), or
+# (33, 4) float32 landmarks (empty if no body found)
+MOVES = 3
+LANDMARKS = 4
+
+# Latencies kept by a RemoteClient, the stats cover the last ones only
+LATENCY_SAMPLES = 10000
+
+MOVE_BITS = struct.Struct('!H')
+LANDMARKS_SHAPE = (len(LandmarkIndexEnum), 4)
+LANDMARKS_DTYPE = np.dtype('<f4')
+
+
+def pack_message(kind, request_id, payload=b'', server_time=0.0):
+    return HEADER.pack(kind, request_id, len(payload), server_time) + payload
+
+
+async def read_message(reader):
+    """
+    returns <tuple<int, int, float, bytes>>:
+        kind, request id, server time and payload of the next message
+    raises asyncio.IncompleteReadError if the connection is closed
+    """
+
+    kind, request_id, size, server_time = HEADER.unpack(
+        await reader.readexactly(HEADER.size)
+    )
+    payload = await reader.readexactly(size) if size else b''
+    return kind, request_id, server_time, payload
+
+
+class PoseServer:
+    """
+    Runs the pose model (and TranslatePose) for remote clients.
+
+    Every connection gets its own pose model, running on its own thread, requests
+    of a connection are answered in order, while the next ones are already
+    being received (clients may keep several requests in flight).
+    """
+
+    def __init__(self, host='0.0.0.0', port=9102, backend_options=None):
+        """
+        host, port: address to listen on
+        backend_options <dict>: arguments of pose_backends.create_pose_backend
+        """
+
+        self.host = host
+        self.port = port
+        self.backend_options = backend_options or {}
+        self.requests = 0
+
+    def infer(self, pose, translate_pose, kind, payload):
+        """
+        returns <tuple<int, bytes>>: kind and payload of the response
+        """
+
+        img = cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR)
+        pose_landmarks = pose.process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+
+        if kind == FRAME_FOR_LANDMARKS:
+            if pose_landmarks is None:
+                return LANDMARKS, b''
+            return LANDMARKS, pose_landmarks.astype(LANDMARKS_DTYPE).tobytes()
+
+        if pose_landmarks is None:
+            return MOVES, MOVE_BITS.pack(0)
+        pose_landmarks[list(UNUSED_LANDMARKS), 3] = 0
+        return MOVES, MOVE_BITS.pack(translate_pose.evaluate_bits(pose_landmarks))
+
+    async def handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(1)
+        translate_pose = VectorizedTranslatePose()
+        pose = None
+
+        try:
+            # Loading the model takes seconds, other clients keep being served
+            pose = await loop.run_in_executor(
+                executor, lambda: create_pose_backend(**self.backend_options)
+            )
+            while True:
+                kind, request_id, _, payload = await read_message(reader)
+                start = time.perf_counter()
+                response_kind, response = await loop.run_in_executor(
+                    executor, self.infer, pose, translate_pose, kind, payload
+                )
+                self.requests += 1
+                writer.write(pack_message(
+                    response_kind, request_id, response,
+                    time.perf_counter() - start
+                ))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            executor.shutdown()
+            if pose is not None:
+                pose.close()
+
+    async def serve(self, started=None):
+        """
+        started <asyncio.Event | threading.Event>: set once listening
+        """
+
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        # Actual port if 0 was asked for
+        self.port = server.sockets[0].getsockname()[1]
+        print(f"[remote] serving on {self.host}:{self.port}")
+        if started is not None:
+            started.set()
+        async with server:
+            await server.serve_forever()
+
+
+class RemoteClient:
+    """
+    Captures and motion-gates frames locally, sends them (JPEG) to a
+    PoseServer, and types the keystrokes of the Output Moves it answers.
+
+    Up to max_in_flight requests are pipelined, frames are skipped while
+    that many are waiting. Round-trip time of the last LATENCY_SAMPLES
+    requests is kept, along with the time the server spent on them.
+    """
+
+    def __init__(
+        self, host, port=9102, max_in_flight=2, jpeg_quality=80,
+        landmarks_flag=False, key_sink=input_keys
+    ):
+        """
+        host, port: address of the PoseServer
+        max_in_flight <int>: max requests waiting for a response
+        jpeg_quality <int>: 0 - 100, quality of the frames sent
+        landmarks_flag <bool>: the server only returns landmarks,
+            TranslatePose runs on the client
+        key_sink <callable>: called with list of keys for every response
+        """
+
+        self.host = host
+        self.port = port
+        self.max_in_flight = max_in_flight
+        self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self.landmarks_flag = landmarks_flag
+        self.key_sink = key_sink
+        self.translate_pose = VectorizedTranslatePose() if landmarks_flag else None
+        self.keystroke_table = keystroke_table()
+
+        self.moves = 0
+        self.sent = 0
+        self.skipped = 0
+        self.sent_bytes = 0
+        self.round_trips = deque(maxlen=LATENCY_SAMPLES)
+        self.server_times = deque(maxlen=LATENCY_SAMPLES)
+
+        # request id -> time.perf_counter() it was sent
+        self._in_flight = {}
+        self._request_id = 0
+
+    def send(self, writer, img):
+        """
+        sends img, unless max_in_flight requests are waiting
+        returns <bool>: whether img was sent
+        """
+
+        if len(self._in_flight) >= self.max_in_flight:
+            self.skipped += 1
+            return False
+
+        _, jpeg = cv2.imencode('.jpg', img, self.encode_params)
+        self._request_id += 1
+        self._in_flight[self._request_id] = time.perf_counter()
+        writer.write(pack_message(
+            FRAME_FOR_LANDMARKS if self.landmarks_flag else FRAME,
+            self._request_id, jpeg.tobytes()
+        ))
+        self.sent += 1
+        self.sent_bytes += HEADER.size + jpeg.size
+        return True
+
+    def handle_response(self, kind, request_id, server_time, payload):
+        self.round_trips.append(
+            time.perf_counter() - self._in_flight.pop(request_id)
+        )
+        self.server_times.append(server_time)
+
+        if kind == LANDMARKS:
+            if not payload:
+                moves = 0
+            else:
+                landmark_array = np.frombuffer(
+                    payload, LANDMARKS_DTYPE
+                ).reshape(LANDMARKS_SHAPE).copy()
+                landmark_array[list(UNUSED_LANDMARKS), 3] = 0
+                moves = self.translate_pose.evaluate_bits(landmark_array)
+        else:
+            moves = MOVE_BITS.unpack(payload)[0]
+
+        self.moves = moves
+        self.key_sink(self.keystroke_table[moves])
+
+    async def receive(self, reader):
+        try:
+            while True:
+                self.handle_response(*await read_message(reader))
+        except asyncio.IncompleteReadError:
+            pass
+
+    def stats(self):
+        """
+        returns <dict>: requests sent / skipped, and round trip / server
+            latencies (ms) of the last LATENCY_SAMPLES responses, the
+            difference is network and JPEG overhead
+        """
+
+        return {
+            'sent': self.sent,
+            'skipped': self.skipped,
+            'in_flight': len(self._in_flight),
+            'kb_per_frame': self.sent_bytes / self.sent / 1024 if self.sent else 0,
+            'round_trip_ms': summarize_latencies(self.round_trips),
+            'server_ms': summarize_latencies(self.server_times),
+        }
+
+    def status(self):
+        round_trip = summarize_latencies(list(islice(reversed(self.round_trips), 100)))
+        if not round_trip['count']:
+            return f"rtt=- in_flight={len(self._in_flight)}"
+        return (
+            f"rtt={round_trip['p50']:.1f}/{round_trip['p99']:.1f}ms "
+            f"in_flight={len(self._in_flight)}"
+        )
+
+    async def run(
+        self, live_flag=False, debug_level=0, camera_port="0",
+        motion_threshold_factor=48, motion_downscale=4, motion_grayscale=False,
+        camera_options=None, max_frames=0
+    ):
+        loop = asyncio.get_running_loop()
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        receiver = asyncio.create_task(self.receive(reader))
+
+        camera, prv_img = open_camera(camera_port, **(camera_options or {}))
+        height, width, _ = prv_img.shape
+        motion_detector = MotionDetector(
+            prv_img, motion_threshold_factor, motion_downscale, motion_grayscale
+        )
+        debug_overlay = DebugOverlay(width, height, min(debug_level, 1))
+
+        frames = 0
+        cur_time = time.time()
+        status_time = time.perf_counter()
+        try:
+            while not max_frames or frames < max_frames:
+                success, img = await loop.run_in_executor(None, camera.read)
+                if not success:
+                    break
+                frames += 1
+
+                # Only frames with motion are sent, keys stay as they are otherwise
+                if motion_detector.detect(img):
+                    self.send(writer, img)
+                    await writer.drain()
+
+                if live_flag:
+                    prv_time, cur_time = cur_time, time.time()
+                    if debug_level > 0:
+                        img = debug_overlay.draw(
+                            img, 1 / (cur_time - prv_time) if cur_time != prv_time else 0,
+                            self.moves, True, status=self.status()
+                        )
+                    cv2.imshow('Pose2Input Remote', img)
+                    if cv2.waitKey(1) & 0xFF == 27:
+                        break
+
+                if debug_level > 0 and time.perf_counter() - status_time >= 5:
+                    status_time = time.perf_counter()
+                    print(f"[remote] {self.status()}")
+        finally:
+            # Waits for requests still in flight
+            if writer.can_write_eof():
+                writer.write_eof()
+            await receiver
+            writer.close()
+            camera.release()
+            if live_flag:
+                cv2.destroyAllWindows()
+
+
+def translate_remote(host, port=9102, max_in_flight=2, jpeg_quality=80,
+                     landmarks_flag=False, key_sink=input_keys, **run_options):
+    """
+    translate() with pose inference offloaded to a PoseServer,
+    see RemoteClient for the arguments, run_options are same as translate()
+    (except logs, metrics, roi and scheduler)
+
+    returns <dict>: RemoteClient.stats()
+    """
+
+    client = RemoteClient(
+        host, port, max_in_flight, jpeg_quality, landmarks_flag, key_sink
+    )
+    asyncio.run(client.run(**run_options))
+
+    stats = client.stats()
+    print(
+        f"[remote] sent={stats['sent']} skipped={stats['skipped']} "
+        f"({stats['kb_per_frame']:.1f}KB/frame)"
+    )
+    for name in ('round_trip_ms', 'server_ms'):
+        if stats[name]['count']:
+            print(
+                f"[remote] {name}: " + " ".join(
+                    f"{key}={stats[name][key]:.2f}"
+                    for key in ('mean', 'p50', 'p90', 'p99', 'max')
+                )
+            )
+    return stats
+
+
+def serve(host='0.0.0.0', port=9102, backend_options=None):
+    asyncio.run(PoseServer(host, port, backend_options).serve())
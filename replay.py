@@ -0,0 +1,81 @@
+# ./replay.py
+
+import os
+
+import cv2
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+class VideoFileSource:
+    """
+    Recorded video (eg: the .avi written to "logs" folder) as a Capturing
+    Device, frames are returned as fast as they can be decoded
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise cv2.error(f"Invalid Video Source: {path}")
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 0
+
+    def read(self):
+        return self.capture.read()
+
+    def release(self):
+        self.capture.release()
+
+
+class ImageDirectorySource:
+    """
+    Directory of frames (sorted by file name) as a Capturing Device
+    """
+
+    def __init__(self, path, fps=0):
+        self.path = path
+        self.fps = fps
+        self.files = sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        self.index = 0
+        if not self.files:
+            raise cv2.error(f"Invalid Video Source: no images in {path}")
+
+    def read(self):
+        if self.index >= len(self.files):
+            return False, None
+        img = cv2.imread(self.files[self.index])
+        self.index += 1
+        return img is not None, img
+
+    def release(self):
+        self.index = len(self.files)
+
+
+def open_frame_source(path):
+    """
+    returns a VideoFileSource or an ImageDirectorySource for given path,
+    both have same `read` and `release` as cv2.VideoCapture
+    """
+
+    if os.path.isdir(path):
+        return ImageDirectorySource(path)
+    return VideoFileSource(path)
+
+
+class RecordingSink:
+    """
+    Replacement for input_keys, records the keys instead of typing them
+
+    self.records <list<tuple<int, list<str>>>>: (frame, keys) for every call
+    """
+
+    def __init__(self):
+        self.frame = 0
+        self.records = []
+
+    def __call__(self, inputs):
+        self.records.append((self.frame, list(inputs)))
@@ -0,0 +1,114 @@
+# ./roi.py
+
+class RoiTracker:
+    """
+    Tracks a Region of Interest around the player, so the pose model only gets
+    a crop of the frame instead of the whole frame.
+
+    The ROI is the bounding box of the previous frame's visible landmarks,
+    padded on every side. Landmarks found in the crop are mapped back to
+    full frame normalized coordinates, so TranslatePose sees no difference.
+    Whenever tracking is lost, the full frame is used again.
+    """
+
+    def __init__(self, width, height, padding=0.25, min_size=0.2, min_visibility=0.5):
+        """
+        width, height <int>: size of the full frame
+        padding <float>: fraction of the landmarks' box added on each side
+        min_size <float>: smallest ROI side, as a fraction of the frame side
+        min_visibility <float>: landmarks below this visibility are not tracked
+        """
+
+        self.width = width
+        self.height = height
+        self.padding = padding
+        self.min_size = min_size
+        self.min_visibility = min_visibility
+
+        self.full_frame = (0, 0, width, height)
+        self.roi = self.full_frame
+
+    @property
+    def tracking(self):
+        return self.roi != self.full_frame
+
+    def reset(self):
+        self.roi = self.full_frame
+
+    def crop(self, img):
+        """
+        returns <np.ndarray>: view (not a copy) of img inside current ROI
+        """
+
+        x0, y0, x1, y1 = self.roi
+        return img[y0:y1, x0:x1]
+
+    def update(self, pose_landmarks):
+        """
+        maps pose_landmarks found in the last crop back to full frame
+        normalized coordinates (in place), then computes the next ROI
+
+        pose_landmarks <np.ndarray | None>: (33, 4) result of the pose model
+        returns pose_landmarks
+        """
+
+        if pose_landmarks is None:
+            # Tracking Lost
+            self.reset()
+            return pose_landmarks
+
+        x0, y0, x1, y1 = self.roi
+        crop_width, crop_height = x1 - x0, y1 - y0
+
+        if self.tracking:
+            pose_landmarks[:, 0] = (x0 + pose_landmarks[:, 0] * crop_width) / self.width
+            pose_landmarks[:, 1] = (y0 + pose_landmarks[:, 1] * crop_height) / self.height
+            # z uses roughly the same scale as x
+            pose_landmarks[:, 2] *= crop_width / self.width
+
+        self.roi = self._next_roi(pose_landmarks)
+        return pose_landmarks
+
+    def _next_roi(self, pose_landmarks):
+        visible = pose_landmarks[pose_landmarks[:, 3] >= self.min_visibility]
+        if len(visible) < 4:
+            # Not enough of the body is visible to track it
+            return self.full_frame
+
+        min_x, min_y = visible[:, :2].min(axis=0) * (self.width, self.height)
+        max_x, max_y = visible[:, :2].max(axis=0) * (self.width, self.height)
+
+        pad_x = max(
+            (max_x - min_x) * self.padding,
+            (self.min_size * self.width - (max_x - min_x)) / 2
+        )
+        pad_y = max(
+            (max_y - min_y) * self.padding,
+            (self.min_size * self.height - (max_y - min_y)) / 2
+        )
+
+        roi = (
+            max(int(min_x - pad_x), 0), max(int(min_y - pad_y), 0),
+            min(int(max_x + pad_x) + 1, self.width),
+            min(int(max_y + pad_y) + 1, self.height),
+        )
+
+        # Player left the frame, or ROI collapsed
+        if roi[2] - roi[0] < 2 or roi[3] - roi[1] < 2:
+            return self.full_frame
+
+        # Keep the current ROI while the player is still well inside it
+        # (at least half the padding away from its edges),
+        # a steady crop helps MediaPipe's own frame to frame tracking
+        cur_x0, cur_y0, cur_x1, cur_y1 = self.roi
+        margin_x, margin_y = pad_x / 2, pad_y / 2
+        if (
+            self.tracking
+            and cur_x0 <= min_x - margin_x and max_x + margin_x <= cur_x1
+            and cur_y0 <= min_y - margin_y and max_y + margin_y <= cur_y1
+            and (cur_x1 - cur_x0) * (cur_y1 - cur_y0)
+                < 2 * (roi[2] - roi[0]) * (roi[3] - roi[1])
+        ):
+            return self.roi
+
+        return roi
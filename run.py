@@ -3,19 +3,25 @@
 import os
 import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
-import pyautogui
 from dotenv import load_dotenv
 
-from translate import translate
+from startup import StartupTimeline
 
 
 if __name__ == "__main__":
 
+    timeline = StartupTimeline()
+
+    # Only place .env is loaded, before any module reading it at import
+    # (constants.py), every subsystem is imported once it is needed
     load_dotenv()
 
-    # Time (sec) to pause after each PyAuto Function Call
-    pyautogui.PAUSE = float(os.getenv('PYAUTO_PAUSE', 0.1))
+    with timeline.step('import pose_backends'):
+        from pose_backends import (
+            POSE_BACKENDS, create_pose_backend, backend_options_from_env
+        )
 
     parser = argparse.ArgumentParser(
         prog="Pose2Input-MK9",
@@ -25,6 +31,11 @@ if __name__ == "__main__":
         '-d', '--debug_level', type=int, metavar='', default=0,
         help='<0, 1, 2, 3> set different levels of information for logs or live feed'
     )
+    parser.add_argument(
+        '-b', '--backend', metavar='', choices=POSE_BACKENDS,
+        default=os.getenv('POSE_BACKEND', 'mediapipe'),
+        help=f'pose estimation model <{", ".join(POSE_BACKENDS)}>'
+    )
     parser.add_argument(
         '-l', '--log_flag', action='store_true',
         help='stores the video_log in "logs" folder'
@@ -33,10 +44,72 @@ if __name__ == "__main__":
         '-L', '--live_flag', action='store_true',
         help='displays the captured video'
     )
+    parser.add_argument(
+        '-p', '--pipeline_flag', action='store_true',
+        help='runs capture, inference, keystrokes and logging on separate threads'
+    )
+    parser.add_argument(
+        '-r', '--roi_flag', action='store_true',
+        help='pose estimation only processes a region around the player'
+    )
+    parser.add_argument(
+        '-t', '--tap_flag', action='store_true',
+        help='presses and releases keys on every frame, instead of holding them'
+    )
+    parser.add_argument(
+        '-m', '--metrics_flag', action='store_true',
+        help='times every stage, logs percentiles and serves them for Prometheus'
+    )
+    parser.add_argument(
+        '-s', '--scheduler_flag', action='store_true',
+        help='skips pose inference under load, predicting landmarks instead'
+    )
+    parser.add_argument(
+        '-g', '--gate_flag', action='store_true',
+        help='only infers frames with a player in PLAY_ZONE, using a background model'
+    )
+    parser.add_argument(
+        '-e', '--events_flag', action='store_true',
+        help='publishes the moves of every frame to EVENTS_SHM and/or EVENTS_UDP'
+    )
+    parser.add_argument(
+        '-n', '--no_keys_flag', action='store_true',
+        help='types no keys, eg: to only publish move events'
+    )
+    parser.add_argument(
+        '-M', '--multiplayer_flag', action='store_true',
+        help='one player per camera in CAMERA_PORTS, each in its own process'
+    )
+    parser.add_argument(
+        '-c', '--calibrate_flag', action='store_true',
+        help='during DELAY_TIME, picks the model settings fitting CALIBRATION_BUDGET'
+    )
+    parser.add_argument(
+        '-C', '--client_flag', action='store_true',
+        help='sends frames to a remote pose server (REMOTE_HOST), types keys locally'
+    )
+    parser.add_argument(
+        '-S', '--server_flag', action='store_true',
+        help='runs the pose server for remote clients, no keys are typed'
+    )
+    parser.add_argument(
+        '--startup-report', action='store_true',
+        help='prints how long imports, model load and camera open took at startup'
+    )
     args = parser.parse_args()
 
-    # A Delay before Starting the Program
-    time.sleep(int(os.getenv('DELAY_TIME', 0)))
+    backend_options = backend_options_from_env(args.backend)
+
+    if args.server_flag:
+        from remote import serve
+
+        serve(
+            host=os.getenv('REMOTE_BIND', '0.0.0.0'),
+            port=int(os.getenv('REMOTE_PORT', 9102)),
+            backend_options=backend_options,
+        )
+        raise SystemExit
+
 
     live_flag = args.live_flag
     log_flag = args.log_flag
@@ -50,13 +123,266 @@ if __name__ == "__main__":
     if not os.path.exists('logs'):
         os.mkdir('logs')
 
-    translate(
-        log_flag=log_flag,
-        live_flag=live_flag,
-        debug_level=debug_level,
-        log_fps=int(os.getenv('LOG_FPS', 20)),
-        camera_port=os.getenv('CAMERA_PORT', '0'),
-        motion_threshold_factor=int(
-            os.getenv('MOTION_THRESHOLD_FACTOR', 64)
-        ),
-    )
+    camera_options = {
+        'backend': os.getenv('CAMERA_BACKEND', 'auto'),
+        'width': int(os.getenv('CAMERA_WIDTH', 0)),
+        'height': int(os.getenv('CAMERA_HEIGHT', 0)),
+        'fps': float(os.getenv('CAMERA_FPS', 0)),
+        'fourcc': os.getenv('CAMERA_FOURCC', ''),
+        'buffer_size': int(os.getenv('CAMERA_BUFFER_SIZE', 1)),
+    }
+
+    single_player = not (args.multiplayer_flag or args.client_flag)
+
+    if not single_player:
+        # Only translate() and the pipeline take these, reject them
+        # instead of silently playing without them
+        unsupported = [
+            option for option, used in (
+                ('--gate_flag', args.gate_flag),
+                ('--metrics_flag', args.metrics_flag),
+                ('--events_flag', args.events_flag),
+                ('--log_flag', args.log_flag),
+                ('--pipeline_flag', args.pipeline_flag),
+                ('--calibrate_flag', args.calibrate_flag),
+                ('DEBOUNCE_FRAMES', int(os.getenv('DEBOUNCE_FRAMES', 1)) > 1),
+                ('COMBO_FILE', bool(os.getenv('COMBO_FILE'))),
+            ) + (
+                (('--roi_flag', args.roi_flag), ('--scheduler_flag', args.scheduler_flag))
+                if args.client_flag else ()
+            ) if used
+        ]
+        if unsupported:
+            parser.error(
+                f"{', '.join(unsupported)} not available with "
+                + ('--multiplayer_flag' if args.multiplayer_flag else '--client_flag')
+            )
+
+    # A Delay before Starting the Program, the pose model is loaded
+    # (and calibrated), the camera opened and pyAutoGUI loaded meanwhile,
+    # each on its own thread
+    delay_start = time.perf_counter()
+
+    def open_player_camera():
+        with timeline.step('import translate'):
+            from translate import open_camera
+        with timeline.step('open camera'):
+            return open_camera(os.getenv('CAMERA_PORT', '0'), **camera_options)
+
+    def load_pose_backend():
+        if args.calibrate_flag:
+            with timeline.step('import calibration'):
+                from calibration import calibrate
+            with timeline.step('calibrate model'):
+                pose_backend, infer_scale, _ = calibrate(
+                    camera_port=os.getenv('CAMERA_PORT', '0'),
+                    camera_options=camera_options,
+                    backend_options=backend_options,
+                    latency_budget=float(os.getenv('CALIBRATION_BUDGET', 33)) / 1000,
+                    max_model_complexity=int(os.getenv('CALIBRATION_MAX_COMPLEXITY', 1)),
+                    # Timed on the camera opened meanwhile, if not cached
+                    open_camera_func=camera_future.result,
+                )
+            return pose_backend, infer_scale
+        with timeline.step('load model'):
+            return create_pose_backend(**backend_options), 1.0
+
+    def load_key_sink():
+        if args.no_keys_flag:
+            from utils import discard_keys
+
+            return discard_keys
+
+        with timeline.step('import pyautogui'):
+            import pyautogui
+
+            # Time (sec) to pause after each PyAuto Function Call
+            pyautogui.PAUSE = float(os.getenv('PYAUTO_PAUSE', 0.1))
+
+        if args.tap_flag:
+            from utils import input_keys
+
+            return input_keys
+
+        with timeline.step('import dispatcher'):
+            from constants import InputConfig
+            from dispatcher import KeyDispatcher
+
+        # Holds keys on its own thread, only sending press/release transitions
+        return KeyDispatcher(
+            min_hold={
+                move.name: float(os.getenv(f'{move.name}_MIN_HOLD'))
+                for move in InputConfig if os.getenv(f'{move.name}_MIN_HOLD')
+            },
+            default_min_hold=float(os.getenv('KEY_MIN_HOLD', 0.05)),
+        )
+
+    pose_backend, infer_scale, opened_camera = None, 1.0, None
+    with ThreadPoolExecutor(3, thread_name_prefix='startup') as executor:
+        key_sink_future = executor.submit(load_key_sink)
+        if single_player:
+            camera_future = executor.submit(open_player_camera)
+            backend_future = executor.submit(load_pose_backend)
+            pose_backend, infer_scale = backend_future.result()
+            opened_camera = camera_future.result()
+        key_sink = key_sink_future.result()
+
+    with timeline.step('rest of DELAY_TIME'):
+        time.sleep(max(
+            int(os.getenv('DELAY_TIME', 0)) - (time.perf_counter() - delay_start), 0
+        ))
+
+    metrics = None
+    if args.metrics_flag:
+        from metrics import StageMetrics
+        from translate import METRIC_STAGES
+
+        metrics = StageMetrics(
+            METRIC_STAGES,
+            window=float(os.getenv('METRICS_WINDOW', 60)),
+            log_interval=float(os.getenv('METRICS_LOG_INTERVAL', 10)),
+            port=int(os.getenv('METRICS_PORT', 9101)) or None,
+        )
+
+    scheduler = None
+    if args.scheduler_flag:
+        from scheduler import InferenceScheduler
+
+        scheduler = InferenceScheduler(
+            latency_budget=float(os.getenv('LATENCY_BUDGET', 0)) / 1000,
+            max_predicted=int(os.getenv('MAX_PREDICTED_FRAMES', 3)),
+        )
+
+    tracker = None
+    debounce_frames = int(os.getenv('DEBOUNCE_FRAMES', 1))
+    if debounce_frames > 1 or os.getenv('COMBO_FILE'):
+        from combos import MoveTracker, load_combos
+        from utils import input_sequence, discard_keys
+
+        tracker = MoveTracker(
+            debounce_frames=debounce_frames,
+            combos=load_combos(os.getenv('COMBO_FILE')) if os.getenv('COMBO_FILE') else None,
+            combo_sink=discard_keys if args.no_keys_flag else input_sequence,
+        )
+
+    gate_options = None
+    if args.gate_flag:
+        gate_options = {
+            'downscale': int(os.getenv('GATE_DOWNSCALE', 8)),
+            'play_zone': os.getenv('PLAY_ZONE', ''),
+            'pixel_threshold': int(os.getenv('GATE_PIXEL_THRESHOLD', 25)),
+            'min_foreground': float(os.getenv('GATE_MIN_FOREGROUND', 0.02)),
+            'min_change': float(os.getenv('GATE_MIN_CHANGE', 0.005)),
+            'hold_interval': float(os.getenv('GATE_HOLD_INTERVAL', 250)) / 1000,
+            'learning_rate': float(os.getenv('GATE_LEARNING_RATE', 0.02)),
+        }
+
+    events = None
+    if args.events_flag:
+        from events import create_event_publisher
+
+        events = create_event_publisher(
+            shm_name=os.getenv('EVENTS_SHM', 'pose2input_events'),
+            shm_slots=int(os.getenv('EVENTS_SHM_SLOTS', 256)),
+            udp_address=os.getenv('EVENTS_UDP', ''),
+            udp_landmarks=os.getenv('EVENTS_UDP_LANDMARKS', 'true').lower() == 'true',
+        )
+
+    extra_options = {}
+    if args.pipeline_flag:
+        from pipeline import translate_pipelined as translate_func
+    elif single_player:
+        from translate import translate as translate_func
+        from profiler import FrameProfiler
+
+        # Started and stopped while playing, by SIGUSR1 or "p" in the preview
+        extra_options['profiler'] = FrameProfiler(
+            duration=float(os.getenv('PROFILE_DURATION', 10)),
+            interval=float(os.getenv('PROFILE_INTERVAL', 5)) / 1000,
+        )
+
+    if args.startup_report:
+        print(timeline.report())
+
+    try:
+        if args.multiplayer_flag:
+            from multiplayer import translate_multiplayer
+
+            translate_multiplayer(
+                camera_ports=os.getenv('CAMERA_PORTS', '0,1').split(','),
+                live_flag=live_flag,
+                debug_level=debug_level,
+                motion_threshold_factor=int(
+                    os.getenv('MOTION_THRESHOLD_FACTOR', 64)
+                ),
+                motion_downscale=int(os.getenv('MOTION_DOWNSCALE', 4)),
+                motion_grayscale=os.getenv('MOTION_GRAYSCALE', 'false').lower() == 'true',
+                roi_flag=args.roi_flag,
+                key_sink=key_sink,
+                scheduler=scheduler,
+                camera_options=camera_options,
+                backend_options=backend_options,
+            )
+        elif args.client_flag:
+            from remote import translate_remote
+
+            translate_remote(
+                host=os.getenv('REMOTE_HOST', '127.0.0.1'),
+                port=int(os.getenv('REMOTE_PORT', 9102)),
+                max_in_flight=int(os.getenv('REMOTE_IN_FLIGHT', 2)),
+                jpeg_quality=int(os.getenv('REMOTE_JPEG_QUALITY', 80)),
+                landmarks_flag=os.getenv('REMOTE_LANDMARKS', 'false').lower() == 'true',
+                key_sink=key_sink,
+                live_flag=live_flag,
+                debug_level=debug_level,
+                camera_port=os.getenv('CAMERA_PORT', '0'),
+                motion_threshold_factor=int(
+                    os.getenv('MOTION_THRESHOLD_FACTOR', 64)
+                ),
+                motion_downscale=int(os.getenv('MOTION_DOWNSCALE', 4)),
+                motion_grayscale=os.getenv('MOTION_GRAYSCALE', 'false').lower() == 'true',
+                camera_options=camera_options,
+            )
+        else:
+            translate_func(
+                log_flag=log_flag,
+                live_flag=live_flag,
+                debug_level=debug_level,
+                log_fps=float(os.getenv('LOG_FPS', 0)),
+                camera_port=os.getenv('CAMERA_PORT', '0'),
+                motion_threshold_factor=int(
+                    os.getenv('MOTION_THRESHOLD_FACTOR', 64)
+                ),
+                motion_downscale=int(os.getenv('MOTION_DOWNSCALE', 4)),
+                motion_grayscale=os.getenv('MOTION_GRAYSCALE', 'false').lower() == 'true',
+                roi_flag=args.roi_flag,
+                key_sink=key_sink,
+                metrics=metrics,
+                log_options={
+                    'codec': os.getenv('LOG_CODEC', 'XVID'),
+                    'container': os.getenv('LOG_CONTAINER', 'avi'),
+                    'scale': float(os.getenv('LOG_SCALE', 1)),
+                    'every': int(os.getenv('LOG_EVERY', 1)),
+                },
+                log_annotated=os.getenv('LOG_ANNOTATED', 'true').lower() == 'true',
+                preview_options={
+                    'scale': float(os.getenv('PREVIEW_SCALE', 0.5)),
+                    'max_fps': float(os.getenv('PREVIEW_FPS', 15)),
+                },
+                scheduler=scheduler,
+                camera_options=camera_options,
+                pose_backend=pose_backend,
+                infer_scale=infer_scale,
+                tracker=tracker,
+                opened_camera=opened_camera,
+                gate_options=gate_options,
+                events=events,
+                **extra_options,
+            )
+    finally:
+        if metrics:
+            metrics.close()
+
+        if not (args.tap_flag or args.no_keys_flag):
+            # Releases every held key
+            key_sink.close()
@@ -0,0 +1,165 @@
+# ./scheduler.py
+
+import time
+
+import numpy as np
+
+from utils import LandmarkIndexEnum, UNUSED_LANDMARKS
+
+
+_UNUSED_LANDMARKS = np.array(UNUSED_LANDMARKS)
+
+
+class InferenceScheduler:
+    """
+    Decides which frames get a full MediaPipe inference, so that the time
+    spent per frame stays within a latency budget, the frames in between
+    get landmarks extrapolated from the velocity of the last two inferences.
+
+    With C the average inference cost, P the average prediction cost and
+    B the budget, a fraction f = (B - P) / (C - P) of the frames is
+    inferred (all of them while C <= B), spread evenly with a credit counter.
+    """
+
+    # Weight of the newest sample in the moving averages
+    SMOOTHING = 0.1
+
+    def __init__(self, latency_budget=0, max_predicted=3, min_infer_ratio=0.2):
+        """
+        latency_budget <float>: seconds a frame may take, <= 0 to keep up with
+            the camera (1 / source_fps, or the measured interval between frames)
+        max_predicted <int>: max consecutive frames without inference
+        min_infer_ratio <float>: min fraction of frames that are inferred
+        """
+
+        self.latency_budget = latency_budget
+        self.max_predicted = max_predicted
+        self.min_infer_ratio = min_infer_ratio
+
+        self.inferred = 0
+        self.predicted = 0
+
+        # FPS reported by the Capturing Device, if any
+        self.source_fps = None
+
+        self.inference_cost = None
+        self.prediction_cost = 0.0
+        self.frame_interval = None
+
+        self._credit = 1.0
+        self._consecutive_predicted = 0
+        self._last_frame = None
+
+        # Last two inferred landmarks and their timestamps
+        self._history = np.zeros((2, len(LandmarkIndexEnum), 4), np.float32)
+        self._history_time = [0.0, 0.0]
+        self._history_size = 0
+
+    def _average(self, average, sample):
+        if average is None:
+            return sample
+        return average + self.SMOOTHING * (sample - average)
+
+    def budget(self):
+        if self.latency_budget > 0:
+            return self.latency_budget
+        if self.source_fps:
+            return 1 / self.source_fps
+        return self.frame_interval
+
+    def infer_ratio(self):
+        """
+        returns <float>: fraction of frames that should be inferred
+        """
+
+        budget = self.budget()
+        if self.inference_cost is None or budget is None:
+            return 1.0
+        if self.inference_cost <= budget:
+            return 1.0
+
+        ratio = (budget - self.prediction_cost) / (
+            self.inference_cost - self.prediction_cost
+        )
+        return min(max(ratio, self.min_infer_ratio), 1.0)
+
+    def should_infer(self, now):
+        """
+        called once per frame with motion, before inference
+
+        now <float>: time.perf_counter() of the frame
+        returns <bool>: True if the frame should get a full inference
+        """
+
+        if self._last_frame is not None:
+            self.frame_interval = self._average(
+                self.frame_interval, now - self._last_frame
+            )
+        self._last_frame = now
+
+        self._credit = min(self._credit + self.infer_ratio(), 1.0)
+        if (
+            self._history_size < 2
+            or self._credit >= 1.0
+            or self._consecutive_predicted >= self.max_predicted
+        ):
+            self._credit -= 1.0
+            self._consecutive_predicted = 0
+            return True
+
+        self._consecutive_predicted += 1
+        return False
+
+    def update(self, landmarks, now, cost):
+        """
+        called after a full inference
+
+        landmarks <np.ndarray | None>: (33, 4) landmarks found, None if no body
+        now <float>: time.perf_counter() of the frame
+        cost <float>: seconds spent on inference
+        """
+
+        self.inferred += 1
+        self.inference_cost = self._average(self.inference_cost, cost)
+
+        if landmarks is None:
+            # Body Lost, nothing to extrapolate from
+            self._history_size = 0
+            return
+
+        self._history[0] = self._history[1]
+        self._history_time[0] = self._history_time[1]
+        self._history[1] = landmarks
+        self._history_time[1] = now
+        self._history_size = min(self._history_size + 1, 2)
+
+    def predict(self, now, cost_start):
+        """
+        returns <np.ndarray>: (33, 4) landmarks extrapolated to `now` from
+            the velocity of the last two inferences, visibility of the last
+            inference is kept (UNUSED_LANDMARKS are hidden as usual)
+
+        now <float>: time.perf_counter() of the frame
+        cost_start <float>: time.perf_counter() before deciding, to time prediction
+        """
+
+        self.predicted += 1
+        previous, last = self._history
+        elapsed = self._history_time[1] - self._history_time[0]
+
+        # a new array, as it may still be used by another stage
+        predicted = last.copy()
+        if elapsed > 0:
+            predicted[:, :3] += (last[:, :3] - previous[:, :3]) * (
+                (now - self._history_time[1]) / elapsed
+            )
+        predicted[_UNUSED_LANDMARKS, 3] = 0
+
+        self.prediction_cost = self._average(
+            self.prediction_cost, time.perf_counter() - cost_start
+        )
+        return predicted
+
+    def stats(self):
+        return f"inferred={self.inferred} predicted={self.predicted}"
+
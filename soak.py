@@ -0,0 +1,609 @@
+# ./soak.py
+
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import threading
+import tracemalloc
+from datetime import datetime
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+if __name__ == "__main__":
+    # .env is loaded before any module reading it at import (constants.py)
+    load_dotenv()
+
+from replay import open_frame_source
+from video_log import AsyncVideoLog
+from dispatcher import KeyDispatcher
+from pipeline import TranslatePipeline
+from translate import translate, METRIC_STAGES
+from metrics import summarize_latencies
+from pose_backends import (
+    POSE_BACKENDS, create_pose_backend, backend_options_from_env
+)
+
+
+# Default of MOTION_THRESHOLD_FACTOR, same as run.py, so that a soak from
+# the command line and from run_soak gate frames the same way
+MOTION_THRESHOLD_FACTOR = 64
+
+
+class LoopingSource:
+    """
+    Recorded video (or directory of frames) replayed from the start
+    whenever it ends, for as long as the soak test runs
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.source = open_frame_source(path)
+        self.loops = 0
+
+    def read(self):
+        success, img = self.source.read()
+        if not success:
+            self.source.release()
+            self.source = open_frame_source(self.path)
+            self.loops += 1
+            success, img = self.source.read()
+        return success, img
+
+    def release(self):
+        self.source.release()
+
+
+class SyntheticSource:
+    """
+    Frames of a bright block moving across a scrolling background of
+    noisy tiles, so the motion gate passes on every frame (even once
+    downscaled), without any recording
+    """
+
+    # Side (px) of a background tile, the background scrolls by one per frame
+    TILE = 16
+
+    def __init__(self, width=640, height=480, period=90, seed=0):
+        """
+        period <int>: frames for the block to cross the frame and back
+        """
+
+        rng = np.random.default_rng(seed)
+        tiles = rng.integers(
+            0, 96, (height // self.TILE + 1, width // self.TILE + 1, 3), np.uint8
+        )
+        self.background = np.repeat(
+            np.repeat(tiles, self.TILE, axis=0), self.TILE, axis=1
+        )[:height, :width]
+        self.width = width
+        self.height = height
+        self.period = period
+        self.frames = 0
+
+    def read(self):
+        # a new frame every read, as a Capturing Device would return
+        img = np.roll(self.background, self.frames * self.TILE, axis=1)
+        phase = abs((self.frames % self.period) / self.period * 2 - 1)
+        x = int(phase * (self.width - self.width // 4))
+        cv2.rectangle(
+            img, (x, self.height // 4), (x + self.width // 4, self.height * 3 // 4),
+            (220, 220, 220), -1
+        )
+        self.frames += 1
+        return True, img
+
+    def release(self):
+        pass
+
+
+class ReplayCamera:
+    """
+    Camera like wrapper of a frame source (same read, release and get),
+    paced at fps like a Capturing Device, which runs out of frames once
+    the deadline is reached, so the frame loop stops by itself
+    """
+
+    def __init__(self, source, fps=30, deadline=None):
+        """
+        source <LoopingSource | SyntheticSource>
+        fps <float>: frames per second, <= 0 to read as fast as possible
+        deadline <float>: time.perf_counter() after which reads fail
+        """
+
+        self.source = source
+        self.fps = fps
+        self.deadline = deadline
+        self.frames = 0
+        self._next_frame = None
+
+    def read(self):
+        now = time.perf_counter()
+        if self.deadline is not None and now >= self.deadline:
+            return False, None
+
+        if self.fps > 0:
+            if self._next_frame is not None and now < self._next_frame:
+                time.sleep(self._next_frame - now)
+            self._next_frame = max(now, self._next_frame or now) + 1 / self.fps
+
+        success, img = self.source.read()
+        if success:
+            self.frames += 1
+        return success, img
+
+    def get(self, prop):
+        return self.fps if prop == cv2.CAP_PROP_FPS and self.fps > 0 else 0
+
+    def release(self):
+        self.source.release()
+
+
+class CountingKeys:
+    """
+    key_down and key_up of the KeyDispatcher, only counts the transitions,
+    so nothing is typed and nothing grows during the soak test
+    """
+
+    def __init__(self):
+        self.presses = 0
+        self.releases = 0
+
+    def key_down(self, key):
+        self.presses += 1
+
+    def key_up(self, key):
+        self.releases += 1
+
+
+class NullVideoLog(AsyncVideoLog):
+    """
+    AsyncVideoLog whose frames (and timestamps) go to /dev/null, so its
+    buffer and worker run as in a session, without filling the disk
+    """
+
+    class NullWriter:
+        def write(self, img):
+            pass
+
+        def release(self):
+            pass
+
+    def __init__(self, fps, size, scale=1.0, every=1):
+        super().__init__(os.devnull, fps, size, scale=scale, every=every)
+
+    def _open_timestamps(self):
+        return open(os.devnull, "w")
+
+    def _open_writer(self, timestamps):
+        self._writer = self.NullWriter()
+
+
+class IntervalMetrics:
+    """
+    Same observe, count and record as metrics.StageMetrics, but keeps
+    every latency until drained, so that percentiles are exact per interval
+    """
+
+    def __init__(self, stages):
+        self.stages = stages
+        self._lock = threading.Lock()
+        self._durations = {stage: [] for stage in stages}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self._durations[stage].append(seconds)
+
+    def count(self, counter, value):
+        pass
+
+    def record(self, stage_times, stages=None):
+        with self._lock:
+            for stage in stages or stage_times:
+                if stage_times.get(stage) is not None:
+                    self._durations[stage].append(stage_times[stage])
+
+    def drain(self):
+        """
+        returns <dict<str:stage, list<float>>>: latencies since the last drain
+        """
+
+        with self._lock:
+            durations = self._durations
+            self._durations = {stage: [] for stage in self.stages}
+        return durations
+
+
+def rss_bytes():
+    """
+    returns <int>: resident set size of the process, None if unknown
+    """
+
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # peak, not current, on platforms without /proc (kB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def open_fds():
+    """
+    returns <int>: file descriptors open in the process, None if unknown
+    """
+
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None
+
+
+def gc_collections():
+    return [stats['collections'] for stats in gc.get_stats()]
+
+
+def top_growth(baseline, snapshot, limit=10):
+    """
+    returns <list<dict>>: source lines whose allocations grew the most
+        between two tracemalloc snapshots
+    """
+
+    # Allocations of tracemalloc itself (the snapshots) are not of interest
+    exclude = (tracemalloc.Filter(False, tracemalloc.__file__),)
+    baseline = baseline.filter_traces(exclude)
+    snapshot = snapshot.filter_traces(exclude)
+    return [
+        {
+            'location': str(stat.traceback),
+            'size_diff_kb': stat.size_diff / 1024,
+            'count_diff': stat.count_diff,
+        }
+        for stat in snapshot.compare_to(baseline, 'lineno')[:limit]
+        if stat.size_diff > 0
+    ]
+
+
+def run_soak(
+    source_path=None, duration=600, interval=30, warmup=30,
+    max_rss_growth=64, max_traced_growth=32, max_p99_drift=1.5,
+    max_fd_growth=16, trace_memory=True, debug_level=1, fps=30,
+    pipeline_flag=True, motion_threshold_factor=MOTION_THRESHOLD_FACTOR,
+    motion_downscale=4, motion_grayscale=False, roi_flag=False,
+    backend_options=None
+):
+    """
+    Replays a frame source through the whole frame loop for duration
+    seconds: TranslatePipeline (or translate()) with a KeyDispatcher that
+    only counts keys, an AsyncVideoLog to /dev/null, and the
+    PreviewCompositor drawing the overlay on the logged frames if
+    debug_level > 0. Every interval seconds a sampler thread records:
+    traced memory (tracemalloc), RSS, open file descriptors, threads,
+    GC collections and objects, and latency percentiles of every stage
+    over the interval.
+
+    The first sample after warmup seconds is the baseline, the run fails
+    if memory or file descriptors grow by more than the thresholds over it,
+    if the p99 latency of a frame in the last interval exceeds
+    max_p99_drift times the one of the baseline, or if threads started by
+    the run are still running once it is closed.
+
+    source_path <str>: video file or directory of frames (replayed in a
+        loop), synthetic frames if None
+    max_rss_growth, max_traced_growth <float>: MB
+    max_p99_drift <float>: ratio of the last p99 over the baseline p99
+    max_fd_growth <int>: file descriptors
+    trace_memory <bool>: if False, tracemalloc is not started (it slows
+        down every allocation), only RSS is checked
+    fps <float>: frames are read at this rate, as from a Capturing Device
+    pipeline_flag <bool>: if True, TranslatePipeline runs the stages
+        concurrently, otherwise translate() runs them one after another
+    backend_options <dict>: arguments of pose_backends.create_pose_backend
+    other arguments are same as translate()
+
+    returns <dict>: report, which can be dumped as JSON, report['passed']
+        tells whether every threshold held
+    """
+
+    source = LoopingSource(source_path) if source_path else SyntheticSource()
+    success, first_img = source.read()
+    if not success:
+        raise ValueError(f"Empty Video Source: {source_path}")
+    height, width, _ = first_img.shape
+
+    # Resources held before the run, every thread started by the run
+    # must be gone once it is closed
+    threads_before = threading.active_count()
+    fds_before = open_fds()
+
+    backend_options = backend_options or {'name': 'mediapipe'}
+    keys = CountingKeys()
+    key_dispatcher = KeyDispatcher(key_down=keys.key_down, key_up=keys.key_up)
+    video_log = NullVideoLog(fps, (width, height))
+    metrics = IntervalMetrics(METRIC_STAGES)
+
+    start = time.perf_counter()
+    camera = ReplayCamera(source, fps, deadline=start + duration)
+
+    def take_sample():
+        now = time.perf_counter()
+        traced, traced_peak = (
+            tracemalloc.get_traced_memory() if trace_memory else (None, None)
+        )
+        rss = rss_bytes()
+        sample = {
+            'elapsed': now - start,
+            'frames': camera.frames,
+            'rss_mb': rss / 2 ** 20 if rss is not None else None,
+            'traced_mb': traced / 2 ** 20 if trace_memory else None,
+            'traced_peak_mb': traced_peak / 2 ** 20 if trace_memory else None,
+            'open_fds': open_fds(),
+            'threads': threading.active_count(),
+            'gc_collections': gc_collections(),
+            'gc_objects': len(gc.get_objects()),
+            'latency_ms': {
+                stage: summarize_latencies(durations)
+                for stage, durations in metrics.drain().items()
+            },
+        }
+
+        frame_latency = sample['latency_ms']['frame']
+        print(
+            f"[soak] {sample['elapsed']:.0f}s {sample['frames']} frames"
+            f" rss={sample['rss_mb'] or 0:.1f}MB"
+            + (f" traced={sample['traced_mb']:.2f}MB" if trace_memory else "")
+            + f" fds={sample['open_fds']} threads={sample['threads']}"
+            + f" gc={sample['gc_collections']}"
+            + (f" p99={frame_latency['p99']:.2f}ms" if frame_latency['count'] else "")
+        )
+        return sample
+
+    samples = []
+    baseline = None
+    baseline_snapshot = None
+    stop_event = threading.Event()
+
+    def sampler():
+        nonlocal baseline, baseline_snapshot
+        while not stop_event.wait(interval):
+            sample = take_sample()
+            samples.append(sample)
+            if baseline is None and sample['elapsed'] >= warmup:
+                baseline = sample
+                if trace_memory:
+                    baseline_snapshot = tracemalloc.take_snapshot()
+
+    if trace_memory:
+        tracemalloc.start()
+
+    # Samples are taken while the frame loop runs on this thread
+    sampler_thread = threading.Thread(target=sampler, name='soak_sampler', daemon=True)
+    sampler_thread.start()
+
+    options = dict(
+        log_flag=True, live_flag=False, debug_level=debug_level,
+        motion_threshold_factor=motion_threshold_factor,
+        motion_downscale=motion_downscale, motion_grayscale=motion_grayscale,
+        roi_flag=roi_flag, key_sink=key_dispatcher, metrics=metrics,
+        pose_backend=create_pose_backend(**backend_options),
+        opened_camera=(camera, first_img), video_log=video_log,
+    )
+    queues = None
+    try:
+        if pipeline_flag:
+            pipeline = TranslatePipeline(**options)
+            pipeline.run()
+            queues = pipeline.queue_stats()
+        else:
+            translate(**options)
+    finally:
+        stop_event.set()
+        sampler_thread.join()
+        key_dispatcher.close()
+
+    # Once everything is closed (its latencies are the end of the last interval)
+    closed = take_sample()
+    if not samples:
+        # Run shorter than an interval
+        samples.append(closed)
+
+    final_snapshot = tracemalloc.take_snapshot() if trace_memory else None
+    if trace_memory:
+        tracemalloc.stop()
+
+    last = samples[-1]
+    baseline = baseline or samples[0]
+    failures = []
+
+    drift = {}
+    if baseline['rss_mb'] is not None:
+        drift['rss_growth_mb'] = last['rss_mb'] - baseline['rss_mb']
+        if drift['rss_growth_mb'] > max_rss_growth:
+            failures.append(
+                f"RSS grew by {drift['rss_growth_mb']:.1f}MB (max {max_rss_growth}MB)"
+            )
+    if trace_memory:
+        drift['traced_growth_mb'] = last['traced_mb'] - baseline['traced_mb']
+        if drift['traced_growth_mb'] > max_traced_growth:
+            failures.append(
+                f"traced memory grew by {drift['traced_growth_mb']:.1f}MB "
+                f"(max {max_traced_growth}MB)"
+            )
+    if baseline['open_fds'] is not None:
+        drift['fd_growth'] = last['open_fds'] - baseline['open_fds']
+        if drift['fd_growth'] > max_fd_growth:
+            failures.append(
+                f"{drift['fd_growth']} file descriptors leaked (max {max_fd_growth})"
+            )
+    drift['threads_left'] = closed['threads'] - threads_before
+    if drift['threads_left'] > 0:
+        failures.append(f"{drift['threads_left']} threads still running once closed")
+    if fds_before is not None:
+        drift['fds_left'] = closed['open_fds'] - fds_before
+    if baseline['latency_ms']['frame']['count'] and last['latency_ms']['frame']['count']:
+        drift['p99_ratio'] = (
+            last['latency_ms']['frame']['p99'] / baseline['latency_ms']['frame']['p99']
+        )
+        if drift['p99_ratio'] > max_p99_drift:
+            failures.append(
+                f"p99 of a frame drifted x{drift['p99_ratio']:.2f} (max x{max_p99_drift})"
+            )
+
+    return {
+        'source': source_path or 'synthetic',
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'settings': {
+            'duration': duration,
+            'interval': interval,
+            'warmup': warmup,
+            'max_rss_growth_mb': max_rss_growth,
+            'max_traced_growth_mb': max_traced_growth,
+            'max_p99_drift': max_p99_drift,
+            'max_fd_growth': max_fd_growth,
+            'trace_memory': trace_memory,
+            'debug_level': debug_level,
+            'fps': fps,
+            'pipeline_flag': pipeline_flag,
+            'roi_flag': roi_flag,
+            'pose_backend': backend_options,
+        },
+        'frames': camera.frames,
+        'key_presses': keys.presses,
+        'key_releases': keys.releases,
+        'video_log': {
+            'written': video_log.frames_written, 'dropped': video_log.dropped
+        },
+        'queues': queues,
+        'closed': closed,
+        'baseline_elapsed': baseline['elapsed'],
+        'drift': drift,
+        'failures': failures,
+        'passed': not failures,
+        'top_growth': (
+            top_growth(baseline_snapshot, final_snapshot)
+            if baseline_snapshot is not None else []
+        ),
+        'samples': samples,
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        prog="Pose2Input-MK9 Soak",
+        description="Replay frames through the whole frame loop for a long "
+            "time, and fail if memory, file descriptors or p99 latency drift"
+    )
+    parser.add_argument(
+        'source', nargs='?',
+        help='video file or directory of frames, replayed in a loop, '
+            'synthetic frames if not given'
+    )
+    parser.add_argument(
+        '-t', '--duration', type=float, metavar='', default=600,
+        help='seconds to run'
+    )
+    parser.add_argument(
+        '-i', '--interval', type=float, metavar='', default=30,
+        help='seconds between two samples'
+    )
+    parser.add_argument(
+        '-w', '--warmup', type=float, metavar='', default=30,
+        help='seconds before the baseline sample'
+    )
+    parser.add_argument(
+        '--max_rss_growth', type=float, metavar='', default=64,
+        help='MB the RSS may grow over the baseline'
+    )
+    parser.add_argument(
+        '--max_traced_growth', type=float, metavar='', default=32,
+        help='MB the memory traced by tracemalloc may grow over the baseline'
+    )
+    parser.add_argument(
+        '--max_p99_drift', type=float, metavar='', default=1.5,
+        help='max ratio of the last p99 latency of a frame over the baseline one'
+    )
+    parser.add_argument(
+        '--max_fd_growth', type=int, metavar='', default=16,
+        help='file descriptors that may be opened over the baseline'
+    )
+    parser.add_argument(
+        '-n', '--no_tracemalloc', action='store_true',
+        help='only checks RSS, tracemalloc slows down every allocation'
+    )
+    parser.add_argument(
+        '-d', '--debug_level', type=int, metavar='', default=1,
+        help='debug overlay drawn on the logged frames, 0 to log them raw'
+    )
+    parser.add_argument(
+        '-f', '--fps', type=float, metavar='', default=30,
+        help='frames read per second, <= 0 to read as fast as possible'
+    )
+    parser.add_argument(
+        '-s', '--sequential_flag', action='store_true',
+        help='runs translate() instead of the concurrent pipeline'
+    )
+    parser.add_argument(
+        '-r', '--roi_flag', action='store_true',
+        help='pose estimation only processes a region around the player'
+    )
+    parser.add_argument(
+        '-b', '--backend', metavar='', choices=POSE_BACKENDS,
+        default=os.getenv('POSE_BACKEND', 'mediapipe'),
+        help=f'pose estimation model <{", ".join(POSE_BACKENDS)}>'
+    )
+    parser.add_argument(
+        '-o', '--output', metavar='',
+        help='JSON file for the report, defaults to "logs/soak_<time>.json"'
+    )
+    args = parser.parse_args()
+
+    report = run_soak(
+        args.source,
+        duration=args.duration,
+        interval=args.interval,
+        warmup=args.warmup,
+        max_rss_growth=args.max_rss_growth,
+        max_traced_growth=args.max_traced_growth,
+        max_p99_drift=args.max_p99_drift,
+        max_fd_growth=args.max_fd_growth,
+        trace_memory=not args.no_tracemalloc,
+        debug_level=args.debug_level,
+        fps=args.fps,
+        pipeline_flag=not args.sequential_flag,
+        motion_threshold_factor=int(
+            os.getenv('MOTION_THRESHOLD_FACTOR', MOTION_THRESHOLD_FACTOR)
+        ),
+        motion_downscale=int(os.getenv('MOTION_DOWNSCALE', 4)),
+        motion_grayscale=os.getenv('MOTION_GRAYSCALE', 'false').lower() == 'true',
+        roi_flag=args.roi_flag,
+        backend_options=backend_options_from_env(args.backend),
+    )
+
+    output = args.output or (
+        f"logs/soak_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json"
+    )
+    if os.path.dirname(output) and not os.path.exists(os.path.dirname(output)):
+        os.makedirs(os.path.dirname(output))
+    with open(output, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+
+    print(f"[soak] drift: {report['drift']}")
+    for growth in report['top_growth'][:5]:
+        print(f"[soak] +{growth['size_diff_kb']:.1f}KB {growth['location']}")
+    print(f"report saved to {output}")
+
+    if not report['passed']:
+        for failure in report['failures']:
+            print(f"[soak] FAILED: {failure}")
+        sys.exit(1)
+    print("[soak] passed")
@@ -0,0 +1,62 @@
+# ./startup.py
+
+import time
+import threading
+from contextlib import contextmanager
+
+
+class StartupTimeline:
+    """
+    Records how long every step of the startup took (imports, model load,
+    camera open, ...) and on which thread, relative to the creation of the
+    timeline, so steps running concurrently during DELAY_TIME show up as
+    overlapping in the report.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.steps = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def step(self, name):
+        """
+        times the body of the with statement as the step `name`
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.steps.append((
+                    name, threading.current_thread().name,
+                    start - self.origin, end - self.origin
+                ))
+
+    def report(self, width=40):
+        """
+        returns <str>: one line per step, in start order, with its start, its
+            duration (ms) and a bar of when it ran, `width` chars for the
+            whole startup
+        """
+
+        with self._lock:
+            steps = sorted(self.steps, key=lambda step: step[2])
+        if not steps:
+            return "[startup] nothing recorded"
+
+        total = max(end for _, _, _, end in steps)
+        name_width = max(len(name) for name, _, _, _ in steps)
+        thread_width = max(len(thread) for _, thread, _, _ in steps)
+        lines = [f"[startup] {total * 1000:.1f}ms in total"]
+        for name, thread, start, end in steps:
+            first = min(int(start / total * width) if total else 0, width - 1)
+            last = max(int(end / total * width) if total else 0, first + 1)
+            lines.append(
+                f"[startup] {name:<{name_width}} {thread:<{thread_width}} "
+                f"{start * 1000:8.1f}ms +{(end - start) * 1000:8.1f}ms "
+                f"|{' ' * first}{'#' * (last - first)}{' ' * (width - last)}|"
+            )
+        return "\n".join(lines)
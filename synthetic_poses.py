@@ -0,0 +1,458 @@
+# ./synthetic_poses.py
+
+import os
+import time
+import argparse
+
+import numpy as np
+
+from utils import VectorizedTranslatePose, LandmarkIndexEnum, MOVES, MOVE_FLAGS
+
+
+# Kind of every sample of a corpus, see generate_corpus
+KINDS = ('neutral', 'move', 'combo', 'edge', 'low_visibility', 'degenerate')
+
+# Share of every kind in a corpus
+KIND_RATIOS = (0.05, 0.25, 0.34, 0.15, 0.2, 0.01)
+
+# (x, y) of every body part of a player standing with the arms down,
+# facing the camera (their left is on the right of the frame), in a
+# frame normalized to 1 x 1
+STANDING = {
+    LandmarkIndexEnum.NOSE: (0.50, 0.15),
+    LandmarkIndexEnum.LEFT_EYE_INNER: (0.51, 0.13),
+    LandmarkIndexEnum.LEFT_EYE: (0.52, 0.13),
+    LandmarkIndexEnum.LEFT_EYE_OUTER: (0.53, 0.13),
+    LandmarkIndexEnum.RIGHT_EYE_INNER: (0.49, 0.13),
+    LandmarkIndexEnum.RIGHT_EYE: (0.48, 0.13),
+    LandmarkIndexEnum.RIGHT_EYE_OUTER: (0.47, 0.13),
+    LandmarkIndexEnum.LEFT_EAR: (0.54, 0.14),
+    LandmarkIndexEnum.RIGHT_EAR: (0.46, 0.14),
+    LandmarkIndexEnum.MOUTH_LEFT: (0.51, 0.17),
+    LandmarkIndexEnum.MOUTH_RIGHT: (0.49, 0.17),
+    LandmarkIndexEnum.LEFT_SHOULDER: (0.57, 0.25),
+    LandmarkIndexEnum.RIGHT_SHOULDER: (0.43, 0.25),
+    LandmarkIndexEnum.LEFT_ELBOW: (0.59, 0.37),
+    LandmarkIndexEnum.RIGHT_ELBOW: (0.41, 0.37),
+    LandmarkIndexEnum.LEFT_WRIST: (0.60, 0.48),
+    LandmarkIndexEnum.RIGHT_WRIST: (0.40, 0.48),
+    LandmarkIndexEnum.LEFT_PINKY: (0.605, 0.51),
+    LandmarkIndexEnum.RIGHT_PINKY: (0.395, 0.51),
+    LandmarkIndexEnum.LEFT_INDEX: (0.60, 0.515),
+    LandmarkIndexEnum.RIGHT_INDEX: (0.40, 0.515),
+    LandmarkIndexEnum.LEFT_THUMB: (0.595, 0.505),
+    LandmarkIndexEnum.RIGHT_THUMB: (0.405, 0.505),
+    LandmarkIndexEnum.LEFT_HIP: (0.55, 0.52),
+    LandmarkIndexEnum.RIGHT_HIP: (0.45, 0.52),
+    LandmarkIndexEnum.LEFT_KNEE: (0.555, 0.72),
+    LandmarkIndexEnum.RIGHT_KNEE: (0.445, 0.72),
+    LandmarkIndexEnum.LEFT_ANKLE: (0.56, 0.92),
+    LandmarkIndexEnum.RIGHT_ANKLE: (0.44, 0.92),
+    LandmarkIndexEnum.LEFT_HEEL: (0.56, 0.94),
+    LandmarkIndexEnum.RIGHT_HEEL: (0.44, 0.94),
+    LandmarkIndexEnum.LEFT_FOOT_INDEX: (0.58, 0.96),
+    LandmarkIndexEnum.RIGHT_FOOT_INDEX: (0.42, 0.96),
+}
+
+# Body parts following a wrist or an ankle when it is placed
+EXTREMITIES = {
+    LandmarkIndexEnum.LEFT_WRIST: (
+        LandmarkIndexEnum.LEFT_PINKY, LandmarkIndexEnum.LEFT_INDEX,
+        LandmarkIndexEnum.LEFT_THUMB,
+    ),
+    LandmarkIndexEnum.RIGHT_WRIST: (
+        LandmarkIndexEnum.RIGHT_PINKY, LandmarkIndexEnum.RIGHT_INDEX,
+        LandmarkIndexEnum.RIGHT_THUMB,
+    ),
+    LandmarkIndexEnum.LEFT_ANKLE: (
+        LandmarkIndexEnum.LEFT_HEEL, LandmarkIndexEnum.LEFT_FOOT_INDEX,
+    ),
+    LandmarkIndexEnum.RIGHT_ANKLE: (
+        LandmarkIndexEnum.RIGHT_HEEL, LandmarkIndexEnum.RIGHT_FOOT_INDEX,
+    ),
+}
+
+# Poses of the legs, of the left arm and of the right arm: (x, y) of the
+# body parts moved from STANDING, keyed by the move they portray
+LEG_POSES = {
+    'UP': {
+        LandmarkIndexEnum.LEFT_ANKLE: (0.56, 0.70),
+        LandmarkIndexEnum.RIGHT_ANKLE: (0.44, 0.70),
+    },
+    # DOWN also lowers the upper body, see CROUCH
+    'DOWN': {},
+    'LEFT': {
+        LandmarkIndexEnum.LEFT_KNEE: (0.515, 0.72),
+        LandmarkIndexEnum.RIGHT_KNEE: (0.405, 0.72),
+        LandmarkIndexEnum.LEFT_ANKLE: (0.48, 0.92),
+        LandmarkIndexEnum.RIGHT_ANKLE: (0.36, 0.92),
+    },
+    'RIGHT': {
+        LandmarkIndexEnum.LEFT_KNEE: (0.595, 0.72),
+        LandmarkIndexEnum.RIGHT_KNEE: (0.485, 0.72),
+        LandmarkIndexEnum.LEFT_ANKLE: (0.64, 0.92),
+        LandmarkIndexEnum.RIGHT_ANKLE: (0.52, 0.92),
+    },
+    'FRONT_KICK': {
+        LandmarkIndexEnum.LEFT_KNEE: (0.70, 0.58),
+        LandmarkIndexEnum.LEFT_ANKLE: (0.85, 0.55),
+    },
+    'BACK_KICK': {
+        LandmarkIndexEnum.RIGHT_KNEE: (0.30, 0.58),
+        LandmarkIndexEnum.RIGHT_ANKLE: (0.15, 0.55),
+    },
+}
+LEFT_ARM_POSES = {
+    'FRONT_PUNCH': {
+        LandmarkIndexEnum.LEFT_ELBOW: (0.70, 0.25),
+        LandmarkIndexEnum.LEFT_WRIST: (0.83, 0.25),
+    },
+    'THROW': {
+        LandmarkIndexEnum.LEFT_ELBOW: (0.60, 0.10),
+        LandmarkIndexEnum.LEFT_WRIST: (0.61, 0.03),
+    },
+    'BLOCK': {
+        LandmarkIndexEnum.LEFT_ELBOW: (0.58, 0.24),
+        LandmarkIndexEnum.LEFT_WRIST: (0.54, 0.08),
+    },
+}
+RIGHT_ARM_POSES = {
+    'BACK_PUNCH': {
+        LandmarkIndexEnum.RIGHT_ELBOW: (0.30, 0.25),
+        LandmarkIndexEnum.RIGHT_WRIST: (0.17, 0.25),
+    },
+    'THROW': {
+        LandmarkIndexEnum.RIGHT_ELBOW: (0.40, 0.10),
+        LandmarkIndexEnum.RIGHT_WRIST: (0.39, 0.03),
+    },
+    'BLOCK': {
+        LandmarkIndexEnum.RIGHT_ELBOW: (0.42, 0.24),
+        LandmarkIndexEnum.RIGHT_WRIST: (0.46, 0.08),
+    },
+}
+# Both arms together
+TAG_POSE = {
+    LandmarkIndexEnum.LEFT_ELBOW: (0.64, 0.33),
+    LandmarkIndexEnum.RIGHT_ELBOW: (0.36, 0.33),
+    LandmarkIndexEnum.LEFT_WRIST: (0.51, 0.33),
+    LandmarkIndexEnum.RIGHT_WRIST: (0.49, 0.33),
+}
+
+# DOWN: body parts above the hips are lowered by 0.25, hips by 0.16
+# and knees by 0.02, so the nose gets close to the knees
+CROUCH = np.zeros((len(LandmarkIndexEnum), 2))
+CROUCH[:LandmarkIndexEnum.LEFT_HIP, 1] = 0.25
+CROUCH[[LandmarkIndexEnum.LEFT_HIP, LandmarkIndexEnum.RIGHT_HIP], 1] = 0.16
+CROUCH[[LandmarkIndexEnum.LEFT_KNEE, LandmarkIndexEnum.RIGHT_KNEE], 1] = 0.02
+
+
+def standing_points():
+    """
+    returns <np.ndarray>: (33, 2) float64 (x, y) of STANDING
+    """
+
+    points = np.empty((len(LandmarkIndexEnum), 2))
+    for landmark, point in STANDING.items():
+        points[landmark] = point
+    return points
+
+
+def place(points, parts):
+    """
+    moves the body parts to their (x, y) in place, with their extremities
+
+    parts <dict<LandmarkIndexEnum, tuple<float>>>: eg: an entry of LEG_POSES
+    """
+
+    for landmark, point in parts.items():
+        offset = np.subtract(point, points[landmark])
+        points[landmark] = point
+        for extremity in EXTREMITIES.get(landmark, ()):
+            points[extremity] += offset
+
+
+def pose_points(legs=None, left_arm=None, right_arm=None):
+    """
+    legs <str>: key of LEG_POSES, None to stand
+    left_arm <str>: key of LEFT_ARM_POSES, 'TAG' for TAG_POSE (both arms),
+        None for arm down
+    right_arm <str>: key of RIGHT_ARM_POSES, None for arm down
+    returns <tuple<np.ndarray, int>>: (33, 2) (x, y) of the pose, and the
+        bitmask of the moves it is meant to portray
+    """
+
+    points = standing_points()
+    intended = 0
+    if left_arm == 'TAG':
+        place(points, TAG_POSE)
+        intended |= MOVE_FLAGS['TAG']
+    else:
+        if left_arm:
+            place(points, LEFT_ARM_POSES[left_arm])
+            intended |= MOVE_FLAGS[left_arm]
+        if right_arm:
+            place(points, RIGHT_ARM_POSES[right_arm])
+            intended |= MOVE_FLAGS[right_arm]
+
+    if legs:
+        place(points, LEG_POSES[legs])
+        if legs == 'DOWN':
+            points += CROUCH
+        intended |= MOVE_FLAGS[legs]
+    return points, intended
+
+
+def random_pose(rng, combo):
+    """
+    combo <bool>: if True, legs and arms get a random pose each (possibly
+        none), otherwise the pose portrays a single random move
+    returns <tuple<np.ndarray, int>>: same as pose_points
+    """
+
+    if not combo:
+        move = rng.choice(MOVES)
+        if move in LEG_POSES:
+            return pose_points(legs=move)
+        if move == 'TAG':
+            return pose_points(left_arm='TAG')
+        if move not in RIGHT_ARM_POSES or (
+            move in LEFT_ARM_POSES and rng.random() < 0.5
+        ):
+            return pose_points(left_arm=move)
+        return pose_points(right_arm=move)
+
+    legs = rng.choice([None] + list(LEG_POSES))
+    if rng.random() < 0.1:
+        return pose_points(legs, 'TAG')
+    return pose_points(
+        legs, rng.choice([None] + list(LEFT_ARM_POSES)),
+        rng.choice([None] + list(RIGHT_ARM_POSES))
+    )
+
+
+def to_landmarks(points, rng, noise=0.004, max_tilt=3, min_visibility=0.93):
+    """
+    places the pose in the frame like a camera would: random size, position
+    and tilt, jitter on every body part, z and visibility
+
+    points <np.ndarray>: (33, 2) or (N, 33, 2) poses from pose_points, the
+        same placement is used for all of them
+    noise <float>: standard deviation of the jitter (normalized coordinates)
+    max_tilt <float>: max rotation of the pose (degrees)
+    min_visibility <float>: visibilities are drawn between this and 1
+    returns <np.ndarray>: (33, 4) or (N, 33, 4) float32 landmarks
+    """
+
+    scale = rng.uniform(0.5, 1.1)
+    tilt = np.radians(rng.uniform(-max_tilt, max_tilt))
+    rotation = np.array([
+        [np.cos(tilt), -np.sin(tilt)], [np.sin(tilt), np.cos(tilt)]
+    ])
+    shift = rng.uniform(-0.5, 0.5, 2) * (1 - scale)
+    jitter = rng.normal(0, noise, points.shape[-2:])
+
+    landmarks = np.empty(points.shape[:-1] + (4,), np.float32)
+    landmarks[..., :2] = ((points - 0.5) @ rotation.T) * scale + 0.5 + shift + jitter
+    landmarks[..., 2] = rng.normal(0, 0.1, points.shape[-2])
+    landmarks[..., 3] = rng.uniform(min_visibility, 1, points.shape[-2])
+    return landmarks
+
+
+def lower_visibility(landmarks, rng):
+    """
+    in place, about half the body parts get any visibility, some of them
+    right at (or next to) TranslatePose's visibility_threshold
+    """
+
+    lowered = rng.random(len(landmarks)) < rng.uniform(0.3, 0.7)
+    threshold = np.float32(VectorizedTranslatePose().visibility_threshold)
+    near = np.array([
+        np.nextafter(threshold, np.float32(0)), threshold,
+        np.nextafter(threshold, np.float32(1)),
+    ], np.float32)
+    visibility = np.where(
+        rng.random(len(landmarks)) < 0.5,
+        rng.choice(near, len(landmarks)), rng.random(len(landmarks))
+    ).astype(np.float32)
+    landmarks[lowered, 3] = visibility[lowered]
+
+
+def zero_denominators(landmarks, rng):
+    """
+    in place, the knees get the height of the nose (zero denominator of
+    the DOWN ratio) and/or the elbows the same x (same for the TAG ratio)
+    """
+
+    choice = rng.integers(1, 4)
+    if choice & 1:
+        landmarks[[LandmarkIndexEnum.LEFT_KNEE, LandmarkIndexEnum.RIGHT_KNEE], 1] = (
+            landmarks[LandmarkIndexEnum.NOSE, 1]
+        )
+    if choice & 2:
+        landmarks[LandmarkIndexEnum.LEFT_ELBOW, 0] = (
+            landmarks[LandmarkIndexEnum.RIGHT_ELBOW, 0]
+        )
+
+
+def edge_pairs(starts, ends, bits, translate_pose, iterations=40):
+    """
+    for every start -> end interpolation of landmarks, finds where the
+    move `bits` turns on, by bisection
+
+    starts, ends <np.ndarray>: (N, 33, 4) landmarks, the move is off on
+        starts and on on ends
+    bits <np.ndarray>: (N,) bitmask of the move of every pair
+    returns <tuple<np.ndarray, np.ndarray>>: (N, 33, 4) float32 landmarks
+        on both sides of the threshold (move off, move on), as close as
+        float32 allows
+    """
+
+    low = np.zeros(len(starts))
+    high = np.ones(len(starts))
+    for _ in range(iterations):
+        middle = (low + high) / 2
+        landmarks = (
+            starts + (ends - starts) * middle[:, np.newaxis, np.newaxis]
+        ).astype(np.float32)
+        on = translate_pose.mask_to_bits(translate_pose.evaluate_batch(landmarks)) & bits
+        high = np.where(on != 0, middle, high)
+        low = np.where(on != 0, low, middle)
+
+    off, on = (
+        (starts + (ends - starts) * ratio[:, np.newaxis, np.newaxis]).astype(np.float32)
+        for ratio in (low, high)
+    )
+    return off, on
+
+
+def generate_corpus(size=100000, seed=0, kind_ratios=KIND_RATIOS):
+    """
+    Builds synthetic landmarks without any camera or pose model, for every
+    kind of KINDS:
+        - neutral: standing with the arms down, no move
+        - move: every single move, in random placements
+        - combo: random poses of the legs and of each arm together
+        - edge: pairs of landmarks on both sides of the threshold of a move,
+          interpolated between standing and the move
+        - low_visibility: moves and combos with about half the body parts
+          barely (or not) visible, some right at the visibility threshold
+        - degenerate: moves and combos where the DOWN and/or TAG ratio has
+          a zero denominator (counted as an infinite ratio)
+    Jitter and placement may turn a move on or off, so `intended` is what
+    the pose is meant to portray, not the reference.
+
+    size <int>: number of samples
+    seed <int>: same seed, same corpus
+    kind_ratios <tuple<float>>: share of every kind, aligned with KINDS
+    returns <dict<str, np.ndarray>>:
+        - landmarks: (size, 33, 4) float32, same layout as landmarks_to_array
+        - kinds: (size,) uint8 index into KINDS
+        - intended: (size,) uint16 bitmask of the moves meant to be portrayed
+    """
+
+    rng = np.random.default_rng(seed)
+    counts = np.floor(np.asarray(kind_ratios) / sum(kind_ratios) * size).astype(int)
+    counts[KINDS.index('combo')] += size - counts.sum()
+    # edge samples come in pairs
+    counts[KINDS.index('combo')] += counts[KINDS.index('edge')] % 2
+    counts[KINDS.index('edge')] -= counts[KINDS.index('edge')] % 2
+
+    landmarks = np.empty((size, len(LandmarkIndexEnum), 4), np.float32)
+    kinds = np.repeat(np.arange(len(KINDS), dtype=np.uint8), counts)
+    intended = np.zeros(size, np.uint16)
+    standing = standing_points()
+
+    index = 0
+    for kind, count in zip(KINDS, counts):
+        if kind == 'edge':
+            translate_pose = VectorizedTranslatePose()
+            starts = np.empty((count // 2, len(LandmarkIndexEnum), 4), np.float32)
+            ends = np.empty_like(starts)
+            bits = np.zeros(count // 2, np.int64)
+            pair = 0
+            while pair < count // 2:
+                points, move_bits = random_pose(rng, combo=False)
+                # same placement (and visibility) for standing and the move
+                start, end = to_landmarks(np.stack((standing, points)), rng)
+                flags = translate_pose.mask_to_bits(
+                    translate_pose.evaluate_batch(np.stack((start, end)))
+                )
+                # threshold only lies in between if the move turns on
+                if flags[0] & move_bits or not flags[1] & move_bits:
+                    continue
+                starts[pair], ends[pair], bits[pair] = start, end, move_bits
+                pair += 1
+            off, on = edge_pairs(starts, ends, bits, translate_pose)
+            landmarks[index:index + count:2] = off
+            landmarks[index + 1:index + count:2] = on
+            intended[index + 1:index + count:2] = bits
+            index += count
+            continue
+
+        for _ in range(count):
+            if kind == 'neutral':
+                points, move_bits = standing, 0
+            else:
+                points, move_bits = random_pose(rng, combo=kind != 'move' and (
+                    kind == 'combo' or rng.random() < 0.5
+                ))
+            landmarks[index] = to_landmarks(points, rng)
+            if kind == 'low_visibility':
+                lower_visibility(landmarks[index], rng)
+            if kind == 'degenerate':
+                zero_denominators(landmarks[index], rng)
+            intended[index] = move_bits
+            index += 1
+
+    return {'landmarks': landmarks, 'kinds': kinds, 'intended': intended}
+
+
+def save_corpus(path, corpus):
+    if os.path.dirname(path) and not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    np.savez_compressed(path, **corpus)
+
+
+def load_corpus(path):
+    """
+    returns <dict<str, np.ndarray>>: same as generate_corpus
+    """
+
+    with np.load(path) as corpus_file:
+        return {key: corpus_file[key] for key in corpus_file.files}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        prog="Pose2Input-MK9 Synthetic Poses",
+        description="Generate a corpus of synthetic landmarks covering every "
+            "move, combinations of moves, threshold edges, low visibility "
+            "and zero denominators"
+    )
+    parser.add_argument(
+        '-o', '--output', metavar='',
+        default=os.path.join('logs', 'synthetic_poses.npz'),
+        help='.npz file of the corpus, defaults to "logs/synthetic_poses.npz"'
+    )
+    parser.add_argument(
+        '-n', '--size', type=int, metavar='', default=100000,
+        help='number of landmark sets'
+    )
+    parser.add_argument(
+        '-s', '--seed', type=int, metavar='', default=0,
+        help='same seed, same corpus'
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    corpus = generate_corpus(args.size, args.seed)
+    save_corpus(args.output, corpus)
+    print(f"[synthetic] {args.size} landmark sets in "
+          f"{time.perf_counter() - start:.1f}s -> {args.output}")
+    for kind_index, kind in enumerate(KINDS):
+        intended = corpus['intended'][corpus['kinds'] == kind_index]
+        moves = (intended[:, np.newaxis] >> np.arange(len(MOVES))) & 1
+        print(f"[synthetic] {kind:<16}{len(intended):>8} " + " ".join(
+            f"{move}={count}" for move, count in zip(MOVES, moves.sum(axis=0)) if count
+        ))
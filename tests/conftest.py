@@ -0,0 +1,7 @@
+# ./tests/conftest.py
+
+import os
+import sys
+
+# Modules of the repository are imported as top level modules, as run.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,55 @@
+# ./tests/test_classifier.py
+
+import numpy as np
+import pytest
+
+from classifier_benchmark import run_classifier_benchmark, landmark_lists, FAILED
+from synthetic_poses import KINDS, generate_corpus, pose_points, to_landmarks
+from utils import TranslatePose, VectorizedTranslatePose, LandmarkIndexEnum
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    return generate_corpus(size=1000, seed=1)
+
+
+def test_every_implementation_agrees(corpus):
+    # every kind is in the corpus, zero denominators included
+    assert set(np.unique(corpus['kinds'])) == set(range(len(KINDS)))
+
+    results = run_classifier_benchmark(corpus, repeat=1)
+
+    for name, result in results['implementations'].items():
+        assert result['failed'] == 0, name
+        assert result['mismatches'] == 0, (name, result['mismatched_samples'])
+    assert results['passed']
+
+
+def test_disagreement_is_reported(corpus):
+    implementations = {
+        'reference': lambda landmarks, lists: np.zeros(len(landmarks), np.int64),
+        'failing': lambda landmarks, lists: np.full(len(landmarks), FAILED),
+    }
+
+    results = run_classifier_benchmark(corpus, implementations, repeat=1)
+
+    assert results['implementations']['failing']['mismatches'] == len(corpus['landmarks'])
+    assert not results['passed']
+
+
+@pytest.mark.parametrize('legs, left_arm', [(None, 'TAG'), ('DOWN', None)])
+def test_zero_denominators(legs, left_arm):
+    points, _ = pose_points(legs, left_arm)
+    landmarks = to_landmarks(points, np.random.default_rng(0))
+    # knees at the height of the nose, elbows at the same x
+    landmarks[[LandmarkIndexEnum.LEFT_KNEE, LandmarkIndexEnum.RIGHT_KNEE], 1] = (
+        landmarks[LandmarkIndexEnum.NOSE, 1]
+    )
+    landmarks[LandmarkIndexEnum.LEFT_ELBOW, 0] = landmarks[LandmarkIndexEnum.RIGHT_ELBOW, 0]
+
+    moves = TranslatePose().process(landmark_lists(landmarks[np.newaxis])[0])
+
+    # an infinite ratio: DOWN fires, TAG does not
+    assert 'DOWN' in moves
+    assert 'TAG' not in moves
+    assert VectorizedTranslatePose().process(landmarks) == moves
@@ -0,0 +1,135 @@
+# ./tests/test_events.py
+
+import os
+import uuid
+
+import numpy as np
+import pytest
+
+from events import (
+    create_event_publisher, SharedMemoryRingReader, UdpEventReceiver,
+    UdpEventSender, BODY_FOUND, MOTION_DETECTED
+)
+
+
+SLOTS = 8
+
+
+@pytest.fixture
+def loopback():
+    """
+    publisher to a SharedMemoryRing and to an UdpEventReceiver on 127.0.0.1,
+    with a reader of the ring
+    returns <tuple<MoveEventPublisher, SharedMemoryRingReader, UdpEventReceiver>>
+    """
+
+    receiver = UdpEventReceiver(('127.0.0.1', 0))
+    publisher = create_event_publisher(
+        shm_name=f"p2i_test_{os.getpid()}_{uuid.uuid4().hex[:8]}", shm_slots=SLOTS,
+        udp_address=f"127.0.0.1:{receiver.address[1]}"
+    )
+    reader = SharedMemoryRingReader(publisher.channels[0].name)
+    yield publisher, reader, receiver
+    reader.close()
+    publisher.close()
+    receiver.close()
+
+
+def read_udp(receiver, count):
+    events = []
+    while len(events) < count:
+        received = receiver.read(timeout=1)
+        if not received:
+            break
+        events += received
+    return events
+
+
+def publish(publisher, count, rng):
+    """
+    returns <list<tuple<int, np.ndarray>>>: moves and landmarks published
+    """
+
+    published = []
+    for _ in range(count):
+        moves = int(rng.integers(0, 1 << 11))
+        landmarks = rng.random((33, 4), dtype=np.float32)
+        publisher.publish(moves, landmarks, True, 1000.0 + publisher.sequence)
+        published.append((moves, landmarks))
+    return published
+
+
+def test_loopback(loopback):
+    publisher, reader, receiver = loopback
+    published = publish(publisher, SLOTS - 1, np.random.default_rng(0))
+    # no motion: moves of the last frame with motion, no landmarks
+    publisher.publish(0, None, False, 2000.0)
+
+    for events in (reader.read(), read_udp(receiver, SLOTS)):
+        assert [event.sequence for event in events] == list(range(1, SLOTS + 1))
+        for event, (moves, landmarks) in zip(events, published):
+            assert event.moves == moves
+            assert event.motion_detected
+            assert event.captured_time == 1000.0 + event.sequence - 1
+            np.testing.assert_array_equal(event.landmarks, landmarks)
+        assert events[-1].moves == published[-1][0]
+        assert not events[-1].motion_detected
+        assert events[-1].landmarks is None
+
+    assert (reader.received, reader.lost) == (SLOTS, 0)
+    assert (receiver.received, receiver.lost) == (SLOTS, 0)
+    assert publisher.stats() == {
+        'published': SLOTS,
+        'dropped': {'SharedMemoryRing': 0, 'UdpEventSender': 0},
+    }
+
+
+def test_ring_wraparound(loopback):
+    publisher, reader, receiver = loopback
+    rng = np.random.default_rng(1)
+
+    # the ring laps the reader: only the last SLOTS events are left
+    published = publish(publisher, SLOTS * 2 + 4, rng)
+    events = reader.read()
+    assert [event.sequence for event in events] == list(
+        range(SLOTS + 5, SLOTS * 2 + 5)
+    )
+    assert [event.moves for event in events] == [moves for moves, _ in published[-SLOTS:]]
+    assert (reader.received, reader.lost) == (SLOTS, SLOTS + 4)
+
+    # slots are reused from the start of the ring, nothing more is lost
+    published = publish(publisher, 3, rng)
+    events = reader.read()
+    assert [event.sequence for event in events] == list(
+        range(SLOTS * 2 + 5, SLOTS * 2 + 8)
+    )
+    for event, (moves, landmarks) in zip(events, published):
+        assert event.moves == moves
+        np.testing.assert_array_equal(event.landmarks, landmarks)
+    assert (reader.received, reader.lost) == (SLOTS + 3, SLOTS + 4)
+    assert reader.read() == []
+
+    # every datagram made it over the loopback
+    assert len(read_udp(receiver, SLOTS * 2 + 7)) == SLOTS * 2 + 7
+    assert receiver.lost == 0
+
+
+def test_udp_lost():
+    receiver = UdpEventReceiver(('127.0.0.1', 0))
+    sender = UdpEventSender(receiver.address, landmarks_flag=False)
+    landmarks = np.zeros((33, 4), np.float32)
+    try:
+        # sequences 3, 4 and 7 never make it
+        for sequence in (1, 2, 5, 6, 8):
+            assert sender.publish(
+                sequence, 0.0, 0.0, sequence, MOTION_DETECTED | BODY_FOUND, landmarks
+            )
+        events = read_udp(receiver, 5)
+    finally:
+        sender.close()
+        receiver.close()
+
+    assert [event.sequence for event in events] == [1, 2, 5, 6, 8]
+    # landmarks are not sent with landmarks_flag=False
+    assert all(event.landmarks is None for event in events)
+    assert (receiver.received, receiver.lost) == (5, 3)
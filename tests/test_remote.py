@@ -0,0 +1,111 @@
+# ./tests/test_remote.py
+
+import asyncio
+
+import numpy as np
+import pytest
+
+import remote
+from synthetic_poses import pose_points, to_landmarks
+from utils import VectorizedTranslatePose, keystroke_table, UNUSED_LANDMARKS
+
+
+class FakePose:
+    """
+    Pose backend answering the same landmarks for every frame
+    """
+
+    def __init__(self, landmarks):
+        self.landmarks = landmarks
+
+    def process(self, rgb_img):
+        return None if self.landmarks is None else self.landmarks.copy()
+
+    def close(self):
+        pass
+
+
+def expected_bits(landmarks):
+    if landmarks is None:
+        return 0
+    landmarks = landmarks.copy()
+    landmarks[list(UNUSED_LANDMARKS), 3] = 0
+    return VectorizedTranslatePose().evaluate_bits(landmarks)
+
+
+async def round_trip(landmarks, landmarks_flag, frames=3, max_in_flight=2):
+    """
+    serves FakePose on a loopback port and sends `frames` frames at once
+    returns <tuple<RemoteClient, list, PoseServer>>
+    """
+
+    server = remote.PoseServer('127.0.0.1', 0)
+    started = asyncio.Event()
+    serving = asyncio.create_task(server.serve(started))
+    await started.wait()
+
+    keys = []
+    client = remote.RemoteClient(
+        '127.0.0.1', server.port, max_in_flight=max_in_flight,
+        landmarks_flag=landmarks_flag, key_sink=keys.append
+    )
+    reader, writer = await asyncio.open_connection('127.0.0.1', server.port)
+    receiving = asyncio.create_task(client.receive(reader))
+
+    img = np.zeros((48, 64, 3), np.uint8)
+    for _ in range(frames):
+        client.send(writer, img)
+    await writer.drain()
+    writer.write_eof()
+    await asyncio.wait_for(receiving, 10)
+    writer.close()
+
+    serving.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await serving
+    return client, keys, server
+
+
+@pytest.mark.parametrize('landmarks_flag', (False, True))
+@pytest.mark.parametrize('legs', (None, 'UP', 'FRONT_KICK'))
+def test_round_trip(monkeypatch, landmarks_flag, legs):
+    points, _ = pose_points(legs=legs)
+    landmarks = to_landmarks(points, np.random.default_rng(0))
+    monkeypatch.setattr(
+        remote, 'create_pose_backend', lambda **options: FakePose(landmarks)
+    )
+
+    client, keys, server = asyncio.run(round_trip(landmarks, landmarks_flag))
+
+    bits = expected_bits(landmarks)
+    assert legs is None or bits
+    # Third frame is skipped, two requests are already in flight
+    assert (client.sent, client.skipped, server.requests) == (2, 1, 2)
+    assert client.moves == bits
+    assert keys == [keystroke_table()[bits]] * 2
+
+    stats = client.stats()
+    assert stats['in_flight'] == 0
+    assert stats['round_trip_ms']['count'] == stats['server_ms']['count'] == 2
+
+
+@pytest.mark.parametrize('landmarks_flag', (False, True))
+def test_no_body(monkeypatch, landmarks_flag):
+    monkeypatch.setattr(remote, 'create_pose_backend', lambda **options: FakePose(None))
+
+    client, keys, _ = asyncio.run(round_trip(None, landmarks_flag, frames=1))
+
+    assert client.moves == 0
+    assert keys == [keystroke_table()[0]]
+
+
+def test_latencies_are_bounded(monkeypatch):
+    monkeypatch.setattr(remote, 'LATENCY_SAMPLES', 5)
+    client = remote.RemoteClient('127.0.0.1', key_sink=lambda keys: None)
+
+    for request_id in range(1, 21):
+        client._in_flight[request_id] = 0.0
+        client.handle_response(remote.MOVES, request_id, 0.001, remote.MOVE_BITS.pack(0))
+
+    assert len(client.round_trips) == len(client.server_times) == 5
+    assert client.stats()['server_ms']['count'] == 5
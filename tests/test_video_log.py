@@ -0,0 +1,41 @@
+# ./tests/test_video_log.py
+
+import cv2
+import numpy as np
+import pytest
+
+from video_log import AsyncVideoLog
+
+
+CAMERA_FPS = 30
+EVERY = 3
+
+
+@pytest.mark.parametrize('fps', [CAMERA_FPS, 0])
+def test_decimated_log_replays_at_true_speed(tmp_path, fps):
+    path = str(tmp_path / 'log.avi')
+    video_log = AsyncVideoLog(path, fps, (64, 48), codec='MJPG', every=EVERY)
+
+    # frames of a camera at CAMERA_FPS, every EVERY-th one is kept
+    timestamps = [1000 + frame / CAMERA_FPS for frame in range(2 * EVERY)]
+    for frame, timestamp in enumerate(timestamps):
+        video_log.write(np.full((48, 64, 3), frame * 10, np.uint8), timestamp)
+    video_log.release()
+
+    assert video_log.fps == pytest.approx(CAMERA_FPS / EVERY)
+    assert (video_log.frames_written, video_log.dropped) == (2, 0)
+
+    with open(f"{path}.timestamps.csv") as timestamps_file:
+        rows = timestamps_file.read().splitlines()
+    assert rows[0] == "frame,timestamp"
+    assert [
+        (int(frame), float(timestamp))
+        for frame, timestamp in (row.split(',') for row in rows[1:])
+    ] == [(0, pytest.approx(timestamps[0])), (1, pytest.approx(timestamps[EVERY]))]
+
+    capture = cv2.VideoCapture(path)
+    try:
+        assert capture.get(cv2.CAP_PROP_FPS) == pytest.approx(CAMERA_FPS / EVERY, rel=1e-3)
+        assert int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) == 2
+    finally:
+        capture.release()
@@ -4,142 +4,421 @@ import time
 from datetime import datetime
 
 import cv2
-import mediapipe.python.solutions as mp
+import numpy as np
 
-from utils import TranslatePose, moves_to_keystroke, input_keys, UNUSED_LANDMARKS
+from roi import RoiTracker
+from camera import Camera
+from motion import MotionDetector, ForegroundGate
+from video_log import AsyncVideoLog
+from preview import PreviewCompositor
+from pose_backends import MediaPipeBackend
+from utils import (
+    VectorizedTranslatePose, keystroke_table, input_keys, UNUSED_LANDMARKS
+)
 
 
-def translate(
-    log_flag=True, live_flag=False, debug_level=0, log_fps=20,
-    camera_port="0", motion_threshold_factor=48
-):
+def open_camera(camera_port, **camera_options):
     """
-    function translate input settings for camera, captures frames accordingly,
-    process the captured frame and types the associated keystroke.
+    opens the capturing device, reports the negotiated settings
+    and grabs the first frame
 
-    log_flag <bool>: if True, it stores the video_log in "logs" folder
-    live_flag <bool>: if True, it displays the captured video
-    log_fps <int>: FPS Setting for video_log
     camera_port <str>: select the port, can be url address or port number in str
-    motion_threshold_factor <int>: More the value is, More the Motion is Captured
-    debug_level <int> -> <0 | 1 | 2 | 3>:
-        - 0: Raw Video Footage
-        - 1: 0 + FPS and Output Moves
-        - 2: 1 + Virtual Exoskeleton of Body Parts Found
-        - 3: 2 + Black Screen if no motion found
+    camera_options: requested settings, see camera.Camera for the arguments
+    returns <tuple<camera.Camera, np.ndarray>>: camera and first frame
     """
 
     camera_port = int(camera_port) if camera_port.isdigit() else camera_port
 
-    translate_pose = TranslatePose()
-
-    camera = cv2.VideoCapture(camera_port, cv2.CAP_DSHOW)
-    success, prv_img = camera.read()
+    camera = Camera(camera_port, **camera_options)
+    success, img = camera.read()
 
     if not success:
         raise cv2.error("Invalid Video Source")
 
-    height, width, channel = prv_img.shape
-
-    # More the value is, More the Motion is Captured
-    motion_theshold = height * width * channel * 255 // motion_threshold_factor
+    print(
+        f"[camera] {camera.settings}"
+        + (" (drained on a thread)" if camera.drain else "")
+    )
+    return camera, img
 
-    # MediaPipe Pose
-    pose = mp.pose.Pose()
 
-    if log_flag:
-        # Intialise VideoWriter for logs in `./logs/` folder
-        video_log = cv2.VideoWriter(
-            f"logs/log_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.avi",
-            cv2.VideoWriter_fourcc(*"XVID"), log_fps, (width, height)
-        )
-        video_log.write(prv_img)
+def open_video_log(
+    log_fps, width, height, codec="XVID", container="avi", scale=1.0, every=1
+):
+    """
+    Intialise AsyncVideoLog for logs in `./logs/` folder,
+    see video_log.AsyncVideoLog for the arguments
+    """
 
-    if debug_level > 0:
-        # FPS and Output Moves setting
-        cur_time = 0
-        cv_font_vars_outline = (cv2.FONT_HERSHEY_PLAIN, 1.7, (192, 44, 44), 3)
-        cv_font_vars = (cv2.FONT_HERSHEY_PLAIN, 1.7, (245,66,66), 2)
-        fps_coord = (width - 100, 50)
-        movelist_coord = (50, height - 50)
+    return AsyncVideoLog(
+        f"logs/log_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.{container}",
+        log_fps, (width, height), codec, scale, every
+    )
 
 
-    while cv2.waitKey(1) & 0xFF != 27:
-        if debug_level > 0:
-            # Update prv_time for FPS
-            prv_time = cur_time
+class FrameProcessor:
+    """
+    Per frame work of translate(), split into two halves so that they can
+    also run on different threads (see pipeline.py):
+        - infer: motion gate, color conversion and MediaPipe Pose
+        - dispatch: deduces the Move(s) and types the associated keystroke
 
-        # Set to false for Each Frame
-        motion_detected = False
+    Duration (sec) of every stage for the last frame is kept in
+    self.stage_times, stages skipped for the frame are set to None
+    """
 
-        # Grabs image form Capturing Device
-        _, img = camera.read()
+    INFER_STAGES = ('motion_gate', 'cvt_color', 'pose_process')
+    DISPATCH_STAGES = ('mask_landmarks', 'translate_pose', 'keystroke')
+    STAGES = INFER_STAGES + DISPATCH_STAGES
+
+    def __init__(
+        self, first_img, pose=None, motion_threshold_factor=48,
+        motion_downscale=4, motion_grayscale=False, roi_flag=False,
+        key_sink=input_keys, scheduler=None, key_map=None, infer_scale=1.0,
+        tracker=None, gate_options=None
+    ):
+        """
+        first_img <np.ndarray>: first BGR frame from the Capturing Device
+        pose <pose_backends.PoseBackend>: pose estimation model,
+            MediaPipeBackend is created if not given
+        key_sink <callable>: called with list of keys for every frame with
+            a body found, defaults to input_keys (pyAutoGUI)
+        scheduler <scheduler.InferenceScheduler>: if given, decides which
+            frames get a full inference, others get predicted landmarks
+        key_map <dict<str:move, str:key>>: keys of the player, InputConfig if None
+        infer_scale <float>: frame (or ROI) is resized by this factor before
+            the pose model (see calibration.py), 1 to keep it as is
+        tracker <combos.MoveTracker>: if given, keeps the history of the
+            frames, debounces the Output Moves and matches combos
+        gate_options <dict>: if given, a motion.ForegroundGate with these
+            arguments replaces frame differencing (motion_* arguments)
+        other arguments are same as translate()
+        """
+
+        height, width, _ = first_img.shape
+
+        # Pose estimation model
+        self.pose = pose if pose is not None else MediaPipeBackend()
+
+        if gate_options is not None:
+            self.motion_detector = ForegroundGate(first_img, **gate_options)
+        else:
+            self.motion_detector = MotionDetector(
+                first_img, motion_threshold_factor, motion_downscale, motion_grayscale
+            )
+        self.roi_tracker = RoiTracker(width, height) if roi_flag else None
+
+        self.translate_pose = VectorizedTranslatePose()
+        self.key_sink = key_sink
+        self.key_map = key_map
+        # keys of every combination of moves, indexed by bitmask
+        self.keystroke_table = keystroke_table(key_map)
+        self.scheduler = scheduler
+        self.infer_scale = infer_scale
+        self.tracker = tracker
+
+        self.unused_landmarks = np.array(UNUSED_LANDMARKS)
+
+        self.stage_times = dict.fromkeys(self.STAGES)
+
+    def infer(self, img):
+        """
+        img <np.ndarray>: BGR frame from the Capturing Device
+        returns <tuple<bool, np.ndarray, tuple<int>>>:
+            motion_detected, (33, 4) pose_landmarks (None if no motion or
+            no body, predicted if the scheduler skipped inference),
+            Region of Interest given to the model (None without roi_flag)
+        """
+
+        stage_times = self.stage_times
+
+        # Frame differencing (or foreground) gate for motion detection
+        start = time.perf_counter()
+        motion_detected = self.motion_detector.detect(img)
+        end = time.perf_counter()
+        stage_times['motion_gate'] = end - start
+
+        if not motion_detected:
+            stage_times['cvt_color'] = stage_times['pose_process'] = None
+            return False, None, None
+
+        if self.scheduler and not self.scheduler.should_infer(end):
+            # Extrapolated landmarks instead of a full inference
+            stage_times['cvt_color'] = stage_times['pose_process'] = None
+            return True, self.scheduler.predict(end, end), None
+
+        # Region of Interest used for this frame
+        roi = None
+        if self.roi_tracker:
+            roi = self.roi_tracker.roi
+            img = self.roi_tracker.crop(img)
+
+        if self.infer_scale < 1:
+            # Landmarks are normalized, so nothing to map back
+            img = cv2.resize(
+                img, None, fx=self.infer_scale, fy=self.infer_scale,
+                interpolation=cv2.INTER_AREA
+            )
+        rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        start = time.perf_counter()
+        stage_times['cvt_color'] = start - end
+
+        # Pose model finds marker for all body parts
+        pose_landmarks = self.pose.process(rgb_img)
+
+        if self.roi_tracker:
+            # Back to full frame coordinates, and ROI for next frame
+            self.roi_tracker.update(pose_landmarks)
+
+        inferred = time.perf_counter()
+        stage_times['pose_process'] = inferred - start
+
+        if self.scheduler:
+            self.scheduler.update(pose_landmarks, end, inferred - end)
+
+        return True, pose_landmarks, roi
+
+    def dispatch(self, pose_landmarks, motion_detected=True):
+        """
+        pose_landmarks <np.ndarray>: result of self.infer
+        motion_detected <bool>: result of self.infer, if True but no body
+            was found, key_sink is told that no key is wanted anymore
+        returns <int>: bitmask of the Move(s) deduced (see utils.MOVES),
+            and typed through key_sink
+        """
+
+        stage_times = self.stage_times
+
+        if pose_landmarks is None:
+            stage_times['mask_landmarks'] = stage_times['translate_pose'] = None
+            stage_times['keystroke'] = None
+            if not motion_detected:
+                return 0
+            if self.tracker:
+                # Body Lost, moves are released once debounced
+                moves = self.tracker.update(None, 0, time.perf_counter())
+                self.key_sink(self.keystroke_table[moves])
+                return moves
+            # Body Lost, nothing to hold (no-op for input_keys)
+            self.key_sink(())
+            return 0
+
+        # removing lankmarks that will not be used futher:
+        start = time.perf_counter()
+        pose_landmarks[self.unused_landmarks, 3] = 0
+        end = time.perf_counter()
+        stage_times['mask_landmarks'] = end - start
+
+        # Using Coordinates, Deduces the Move(s)
+        moves = self.translate_pose.evaluate_bits(pose_landmarks)
+        if self.tracker:
+            moves = self.tracker.update(pose_landmarks, moves, end)
+        start = time.perf_counter()
+        stage_times['translate_pose'] = start - end
+
+        # Using Move(s), returns the associated key
+        # and inputs them (Uses pyAutoGUI by default)
+        self.key_sink(self.keystroke_table[moves])
+        stage_times['keystroke'] = time.perf_counter() - start
+
+        return moves
+
+
+# Every stage timed when metrics are enabled, `frame` is the whole frame
+METRIC_STAGES = (
+    ('camera_read',) + FrameProcessor.STAGES
+    + ('publish_events', 'draw', 'video_log', 'frame')
+)
 
-        # Frame differencing for motion detection
-        diff_img = cv2.absdiff(img, prv_img)
 
-        # Compare the sum of pixel after differencing with initalized theshold
-        if diff_img.flatten().sum() > motion_theshold:
-            motion_detected = True
+def translate(
+    log_flag=True, live_flag=False, debug_level=0, log_fps=0,
+    camera_port="0", motion_threshold_factor=48, motion_downscale=4,
+    motion_grayscale=False, roi_flag=False, key_sink=input_keys, metrics=None,
+    log_options=None, scheduler=None, camera_options=None, pose_backend=None,
+    infer_scale=1.0, tracker=None, preview_options=None, log_annotated=True,
+    profiler=None, opened_camera=None, gate_options=None, events=None,
+    video_log=None
+):
+    """
+    function translate input settings for camera, captures frames accordingly,
+    process the captured frame and types the associated keystroke.
 
-        # same img for next comparsion
-        prv_img = img.copy()
+    log_flag <bool>: if True, it stores the video_log in "logs" folder
+    live_flag <bool>: if True, it displays the captured video
+    log_fps <int>: FPS of the camera for video_log, <= 0 to use the measured FPS
+    log_options <dict>: codec, container, scale and every (frame decimation)
+        for video_log, see open_video_log
+    camera_options <dict>: backend, width, height, fps, fourcc and buffer_size
+        requested from the Capturing Device, see camera.Camera
+    camera_port <str>: select the port, can be url address or port number in str
+    motion_threshold_factor <int>: More the value is, More the Motion is Captured
+    motion_downscale <int>: frame is downscaled by this factor for motion detection
+    motion_grayscale <bool>: if True, motion detection is done in grayscale
+    roi_flag <bool>: if True, MediaPipe only processes a crop around the player
+    key_sink <callable>: called with list of keys, defaults to input_keys
+        (see dispatcher.KeyDispatcher to hold keys without blocking)
+    metrics <metrics.StageMetrics>: if given, every stage in METRIC_STAGES is timed
+    scheduler <scheduler.InferenceScheduler>: if given, skips inference under
+        load, using landmarks extrapolated from recent velocities instead
+    pose_backend <pose_backends.PoseBackend>: pose estimation model,
+        MediaPipe Pose with default settings if not given
+    infer_scale <float>: frame is resized by this factor before the pose model
+    tracker <combos.MoveTracker>: if given, Output Moves are debounced and
+        combos (special moves) are typed
+    preview_options <dict>: scale and max_fps of the live preview,
+        see preview.PreviewCompositor
+    log_annotated <bool>: if True (and debug_level > 0), the debug overlay
+        is drawn on the logged frames too, otherwise they are logged raw
+    profiler <profiler.FrameProfiler>: if given, a profile of the frame loop
+        is taken on its signal, or its key in the preview window
+    opened_camera <tuple<camera.Camera, np.ndarray>>: camera already opened
+        by open_camera (eg: during DELAY_TIME) and its first frame,
+        camera_port and camera_options are ignored then
+    gate_options <dict>: if given, inference is gated by a background model
+        of the play zone instead of frame differencing, see
+        motion.ForegroundGate for the arguments
+    events <events.MoveEventPublisher>: if given, moves, landmarks and
+        timestamps of every frame are published for external consumers
+    video_log <video_log.AsyncVideoLog>: if given (and log_flag), frames are
+        logged to it instead of a new video in "logs" folder,
+        log_fps and log_options are ignored then
+    debug_level <int> -> <0 | 1 | 2 | 3>:
+        - 0: Raw Video Footage
+        - 1: 0 + FPS and Output Moves
+        - 2: 1 + Virtual Exoskeleton of Body Parts Found
+        - 3: 2 + Black Screen if no motion found
+    """
 
-        if motion_detected:
-            # MediaPipe finds marker for all body parts
-            pose_landmarks = pose.process(
-                cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            ).pose_landmarks
+    camera, prv_img = opened_camera or open_camera(
+        camera_port, **(camera_options or {})
+    )
 
-        movelist = []
-        if motion_detected and pose_landmarks:
+    height, width, _ = prv_img.shape
 
-            # removing lankmarks that will not be used futher:
-            for mark in UNUSED_LANDMARKS:
-                pose_landmarks.landmark[mark].visibility = 0
+    if scheduler and not scheduler.source_fps:
+        # Budget of a frame, to keep up with the camera
+        scheduler.source_fps = camera.get(cv2.CAP_PROP_FPS) or None
 
-            # Using Coordinates, Deduces the Move(s)
-            movelist = translate_pose.process(pose_landmarks.landmark)
+    frame_processor = FrameProcessor(
+        prv_img, pose_backend, motion_threshold_factor, motion_downscale,
+        motion_grayscale, roi_flag, key_sink, scheduler, infer_scale=infer_scale,
+        tracker=tracker, gate_options=gate_options
+    )
 
-            # Using Move(s), returns the associated key
-            inputs = moves_to_keystroke(movelist)
+    if log_flag:
+        video_log = video_log or open_video_log(
+            log_fps, width, height, **(log_options or {})
+        )
+        video_log.write(prv_img)
 
-            # Uses pyAutoGUI to input the key(s)
-            input_keys(inputs)
+    # Overlay and preview are drawn on their own thread
+    annotated_log = log_flag and log_annotated and debug_level > 0
+    preview = None
+    if live_flag or annotated_log:
+        preview = PreviewCompositor(
+            width, height, debug_level, live_flag,
+            video_log=video_log if annotated_log else None,
+            on_key=profiler.on_key if profiler else None,
+            **(preview_options or {})
+        )
 
-        if debug_level > 0:
-            cur_time = time.time()
+    if profiler:
+        if profiler.log_base is None:
+            profiler.log_base = (
+                video_log.path if log_flag else
+                f"logs/log_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
+            )
+        profiler.install()
 
-            if debug_level > 1 and motion_detected and pose_landmarks:
-                mp.drawing_utils.draw_landmarks(
-                    img, pose_landmarks, mp.pose.POSE_CONNECTIONS,
-                    mp.drawing_utils.DrawingSpec(color=(66,66,245)),
-                    mp.drawing_utils.DrawingSpec(color=(66,245,66))
-                )
+    cur_time = 0
 
-            if debug_level > 2 and not motion_detected:
-                img = diff_img
+    while not (
+        preview.show() if live_flag else cv2.waitKey(1) & 0xFF == 27
+    ):
+        # Update prv_time for FPS
+        prv_time = cur_time
 
+        # Grabs image form Capturing Device
+        frame_start = time.perf_counter()
+        success, img = camera.read()
+        if not success:
+            # Capturing Device ran out of frames (eg: a replayed recording)
+            break
+        camera_read = time.perf_counter() - frame_start
+        capture_time = time.time()
+
+        # Motion gate, then MediaPipe finds marker for all body parts
+        motion_detected, pose_landmarks, roi = frame_processor.infer(img)
+
+        # Deduces the Move(s), and inputs the associated key(s)
+        moves = frame_processor.dispatch(pose_landmarks, motion_detected)
+
+        publish_start = time.perf_counter()
+        if events:
+            events.publish(moves, pose_landmarks, motion_detected, capture_time)
+
+        draw_start = time.perf_counter()
+        cur_time = time.time()
+        if preview and preview.wants():
             # FPS: 1 frame  / time taken to process a whole frame
             fps = 1/(cur_time - prv_time)  if (cur_time - prv_time) !=0 else 0
 
-            # FPS and Output Moves Output
-            cv2.putText(img, f"{fps:.2f}", fps_coord, *cv_font_vars_outline)
-            cv2.putText(img, f"{fps:.2f}", fps_coord, *cv_font_vars)
-
-            cv2.putText(img, f"{list(movelist)}", movelist_coord, *cv_font_vars_outline)
-            cv2.putText(img, f"{list(movelist)}", movelist_coord, *cv_font_vars)
-
-        # live_flag is set to True, Display the captured image
-        if live_flag:
-            cv2.imshow("Pose2Input-MK9", img)
+            # live_flag is set to True, Display the (downscaled) captured image
+            preview.submit(
+                img, fps, moves, motion_detected, pose_landmarks,
+                frame_processor.motion_detector.diff_image,
+                status=scheduler.stats() if scheduler else None,
+                roi=roi, captured_time=capture_time
+            )
+        draw_end = time.perf_counter()
 
         # log_flag is set to True, Store the captured image
-        if log_flag:
-            video_log.write(img)
-
-    # Closes Capturing Device
+        if log_flag and not annotated_log:
+            video_log.write(img, capture_time)
+
+        if metrics:
+            frame_end = time.perf_counter()
+            metrics.record(frame_processor.stage_times)
+            metrics.count(
+                'gate_decisions', frame_processor.motion_detector.last_decision
+            )
+            metrics.observe('camera_read', camera_read)
+            if events:
+                metrics.observe('publish_events', draw_start - publish_start)
+            metrics.observe('draw', draw_end - draw_start)
+            if log_flag:
+                metrics.observe('video_log', frame_end - draw_end)
+            metrics.observe('frame', frame_end - frame_start)
+
+        if profiler and profiler.poll():
+            frame_end = time.perf_counter()
+            profiler.record(capture_time, {
+                'camera_read': camera_read, **frame_processor.stage_times,
+                'publish_events': draw_start - publish_start if events else None,
+                'draw': draw_end - draw_start, 'frame': frame_end - frame_start,
+            })
+
+    if profiler:
+        profiler.close()
+
+    # Closes Capturing Device and Pose model
     camera.release()
+    frame_processor.pose.close()
+
+    print(f"[gate] {frame_processor.motion_detector.stats()}")
+    if scheduler:
+        print(f"[scheduler] {scheduler.stats()}")
+    if tracker:
+        tracker.close()
+        print(f"[tracker] {tracker.stats()}")
+    if events:
+        events.close()
+        print(f"[events] {events.stats()}")
+
+    if preview:
+        # Draws (and logs) the frames still queued
+        preview.close()
 
     if log_flag:
         # Closes Video Writer
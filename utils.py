@@ -1,12 +1,52 @@
 # ./utils.py
 
-import pyautogui
+import enum
+
 import numpy as np
 
 from constants import InputConfig
-from mediapipe.python.solutions.pose import (
-    PoseLandmark as LandmarkIndexEnum
-)
+
+
+@enum.unique
+class LandmarkIndexEnum(enum.IntEnum):
+    """
+    Index of every body part in the landmarks, same as
+    mediapipe.python.solutions.pose.PoseLandmark, kept here so that
+    MediaPipe is only imported by the backend using it
+    """
+    NOSE = 0
+    LEFT_EYE_INNER = 1
+    LEFT_EYE = 2
+    LEFT_EYE_OUTER = 3
+    RIGHT_EYE_INNER = 4
+    RIGHT_EYE = 5
+    RIGHT_EYE_OUTER = 6
+    LEFT_EAR = 7
+    RIGHT_EAR = 8
+    MOUTH_LEFT = 9
+    MOUTH_RIGHT = 10
+    LEFT_SHOULDER = 11
+    RIGHT_SHOULDER = 12
+    LEFT_ELBOW = 13
+    RIGHT_ELBOW = 14
+    LEFT_WRIST = 15
+    RIGHT_WRIST = 16
+    LEFT_PINKY = 17
+    RIGHT_PINKY = 18
+    LEFT_INDEX = 19
+    RIGHT_INDEX = 20
+    LEFT_THUMB = 21
+    RIGHT_THUMB = 22
+    LEFT_HIP = 23
+    RIGHT_HIP = 24
+    LEFT_KNEE = 25
+    RIGHT_KNEE = 26
+    LEFT_ANKLE = 27
+    RIGHT_ANKLE = 28
+    LEFT_HEEL = 29
+    RIGHT_HEEL = 30
+    LEFT_FOOT_INDEX = 31
+    RIGHT_FOOT_INDEX = 32
 
 
 UNUSED_LANDMARKS = (
@@ -22,6 +62,13 @@ UNUSED_LANDMARKS = (
     LandmarkIndexEnum.LEFT_FOOT_INDEX, LandmarkIndexEnum.RIGHT_FOOT_INDEX,
 )
 
+# Moves as bit flags, bit i of a bitmask is MOVES[i]
+MOVES = (
+    'UP', 'DOWN', 'LEFT', 'RIGHT', 'FRONT_PUNCH', 'BACK_PUNCH',
+    'FRONT_KICK', 'BACK_KICK', 'THROW', 'TAG', 'BLOCK',
+)
+MOVE_FLAGS = {move: 1 << bit for bit, move in enumerate(MOVES)}
+
 
 def input_keys(inputs):
     """
@@ -32,22 +79,101 @@ def input_keys(inputs):
     input <list<str:PyAutoGUI recognizes key string>>
     """
 
+    # Loaded on the first keystroke, not when utils is imported
+    import pyautogui
+
     for key in inputs:
         pyautogui.keyDown(key)
     for key in reversed(inputs):
         pyautogui.keyUp(key)
 
-def moves_to_keystroke(movelist):
+def input_sequence(inputs):
+    """
+    types the given list of keys one after the other (eg: keys of a combo)
+
+    input <list<str:PyAutoGUI recognizes key string>>
+    """
+
+    import pyautogui
+
+    for key in inputs:
+        pyautogui.keyDown(key)
+        pyautogui.keyUp(key)
+
+def discard_keys(inputs):
+    """
+    key sink typing nothing, when the moves are only published (see events.py)
+
+    input <list<str:PyAutoGUI recognizes key string>>
+    """
+
+def landmarks_to_array(landmark_list, out=None):
+    """
+    converts the landmark_list returned by MediaPipe into a single
+    (33, 4) float32 array, one row per body part with `x`, `y`, `z` and
+    `visibility` columns, rows are indexed by LandmarkIndexEnum
+
+    landmark_list <NamedTuple<NamedTuple>>: pose_landmarks.landmark
+    out <np.ndarray>: optional preallocated (33, 4) float32 array to fill
+    """
+
+    values = [
+        (mark.x, mark.y, mark.z, mark.visibility) for mark in landmark_list
+    ]
+    if out is None:
+        return np.array(values, dtype=np.float32)
+
+    out[:] = values
+    return out
+
+def moves_to_keystroke(movelist, key_map=None):
     """
     Uses InputConfig to return list of keys from given moves in movelist
 
     movelist <list<str:move>>
+    key_map <dict<str:move, str:key>>: used instead of InputConfig if given,
+        moves without a key are skipped (eg: for other players)
     """
 
+    if key_map is not None:
+        return [key_map[move] for move in movelist if key_map.get(move)]
+
     return [
         getattr(InputConfig, move, 'DEFAULT').value for move in movelist
     ]
 
+def moves_to_bitmask(movelist):
+    """
+    movelist <iterable<str:move>>
+    returns <int>: bitmask of the moves, see MOVES
+    """
+
+    bits = 0
+    for move in movelist:
+        bits |= MOVE_FLAGS[move]
+    return bits
+
+def bitmask_to_moves(bits):
+    """
+    returns <list<str:move>>: moves of the bitmask, in MOVES order
+    """
+
+    return [move for bit, move in enumerate(MOVES) if bits >> bit & 1]
+
+def keystroke_table(key_map=None):
+    """
+    precomputes the keys of every combination of moves, so that
+    table[bits] is what moves_to_keystroke(bitmask_to_moves(bits)) returns
+
+    key_map <dict<str:move, str:key>>: used instead of InputConfig if given
+    returns <tuple<tuple<str:key>>>: 2 ** len(MOVES) tuples of keys
+    """
+
+    return tuple(
+        tuple(moves_to_keystroke(bitmask_to_moves(bits), key_map))
+        for bits in range(1 << len(MOVES))
+    )
+
 class TranslatePose:
     """
     Using Coordinates of body parts, this class can deduces the Move(s)/Pose(s)
@@ -67,6 +193,16 @@ class TranslatePose:
         self.all_transaltion_funcs.remove(self.move_sample)
         self.visibility_threshold = 0.9
 
+        # abs(sin(angle)) limits, 0.18 ~ 10.5° from horizontal (punch, tag)
+        # and 0.7 ~ 45° from horizontal (kick)
+        self.parallel_threshold = 0.18
+        self.kick_threshold = 0.7
+
+        # dist(hip->nose) : dist(hip->knee) for DOWN
+        # and dist(wrists) : dist(elbows) for TAG
+        self.down_ratio_threshold = 0.7
+        self.tag_ratio_threshold = 0.3
+
     def process(self, landmark_list):
         """
         pass landmark_list to all the functions in
@@ -144,14 +280,17 @@ class TranslatePose:
         ]) < self.visibility_threshold:
             return False
 
-        hip = np.complex(0, (r_hip.y + l_hip.y)/2)
-        knee = np.complex(0, (r_knee.y + l_knee.y)/2)
-        nose = np.complex(0, nose.y)
+        hip = complex(0, (r_hip.y + l_hip.y)/2)
+        knee = complex(0, (r_knee.y + l_knee.y)/2)
+        nose = complex(0, nose.y)
 
         knee_to_nose = knee - nose
         hip_to_nose = hip - nose
 
-        if abs(hip_to_nose)/abs(knee_to_nose) > 0.7:
+        # knees at the height of the nose is an infinite ratio (deep crouch)
+        if not abs(knee_to_nose):
+            return True
+        if abs(hip_to_nose)/abs(knee_to_nose) > self.down_ratio_threshold:
             return True
         return False
 
@@ -195,8 +334,8 @@ class TranslatePose:
 
         median_of_body_x = (r_ankle.x + l_ankle.x)/2
 
-        l_ankle_to_hip = np.complex(hip.x - l_ankle.x, hip.y - l_ankle.y)
-        r_ankle_to_hip = np.complex(hip.x - r_ankle.x, hip.y - r_ankle.y)
+        l_ankle_to_hip = complex(hip.x - l_ankle.x, hip.y - l_ankle.y)
+        r_ankle_to_hip = complex(hip.x - r_ankle.x, hip.y - r_ankle.y)
 
         if np.average(np.abs([
             np.sin(np.angle(l_ankle_to_hip)) , np.sin(np.angle(r_ankle_to_hip))
@@ -243,14 +382,14 @@ class TranslatePose:
         ]) < self.visibility_threshold:
             return False
 
-        elbow_to_wrist = np.complex(wrist.x - elbow.x, wrist.y - elbow.y)
-        elbow_to_shoulder = np.complex(shoulder.x - elbow.x , shoulder.y - elbow.y)
-        wrist_to_shoulder = np.complex(shoulder.x - wrist.x , shoulder.y - wrist.y)
+        elbow_to_wrist = complex(wrist.x - elbow.x, wrist.y - elbow.y)
+        elbow_to_shoulder = complex(shoulder.x - elbow.x , shoulder.y - elbow.y)
+        wrist_to_shoulder = complex(shoulder.x - wrist.x , shoulder.y - wrist.y)
 
         if abs(np.sin(
             np.angle(elbow_to_wrist) + np.angle(elbow_to_shoulder)
-        )) < 0.18:
-            if abs(np.sin(np.angle(wrist_to_shoulder))) < 0.18:
+        )) < self.parallel_threshold:
+            if abs(np.sin(np.angle(wrist_to_shoulder))) < self.parallel_threshold:
                 return True
         return False
 
@@ -282,9 +421,9 @@ class TranslatePose:
         if np.average([hip.visibility, ankle.visibility]) < self.visibility_threshold:
             return False
 
-        ankle_to_hip = np.complex(hip.x - ankle.x, hip.y - ankle.y)
+        ankle_to_hip = complex(hip.x - ankle.x, hip.y - ankle.y)
 
-        if abs(np.sin(np.angle(ankle_to_hip))) < 0.7:
+        if abs(np.sin(np.angle(ankle_to_hip))) < self.kick_threshold:
             return True
         return False
 
@@ -333,13 +472,18 @@ class TranslatePose:
         wirst_x = (l_wrist.x + r_wrist.x)/2
         wirst_y = (l_wrist.y + r_wrist.y)/2
 
-        l_elbow_to_wrist = np.complex(wirst_x - l_elbow.x, wirst_y - l_elbow.y)
-        r_elbow_to_wrist = np.complex(wirst_x - r_elbow.x, wirst_y - r_elbow.y)
+        l_elbow_to_wrist = complex(wirst_x - l_elbow.x, wirst_y - l_elbow.y)
+        r_elbow_to_wrist = complex(wirst_x - r_elbow.x, wirst_y - r_elbow.y)
 
         if abs(np.sin(
             np.angle(l_elbow_to_wrist) + np.angle(r_elbow_to_wrist)
-        )) < 0.18:
-            if abs(r_wrist.x - l_wrist.x) / abs(r_elbow.x - l_elbow.x) < 0.3:
+        )) < self.parallel_threshold:
+            # elbows at the same x is an infinite ratio, so never a TAG
+            if (
+                abs(r_elbow.x - l_elbow.x)
+                and abs(r_wrist.x - l_wrist.x) / abs(r_elbow.x - l_elbow.x)
+                < self.tag_ratio_threshold
+            ):
                 return True
         return False
 
@@ -383,3 +527,393 @@ class TranslatePose:
     #     Not Gonna Implement
     #     """
     #     return False
+
+
+class VectorizedTranslatePose(TranslatePose):
+    """
+    Same Move(s)/Pose(s) as TranslatePose, but every `move_` predicate is
+    evaluated together with a fixed set of array operations on a single
+    (33, 4) landmark array (see landmarks_to_array), instead of dozens of
+    tiny NumPy calls on individual landmarks
+    """
+
+    # Order of moves in the boolean mask computed by self.evaluate,
+    # and of the bits of self.evaluate_bits
+    MOVES = MOVES
+
+    # Row 33 of the point array is the midpoint of the wrists (used by TAG)
+    _WRISTS_MID = len(LandmarkIndexEnum)
+
+    # (from, to) pairs for every vector whose angle is needed,
+    # np.angle(complex(to.x - from.x, to.y - from.y)) in TranslatePose
+    _VECTORS = np.array([
+        # LEFT: ankles -> right hip
+        (LandmarkIndexEnum.LEFT_ANKLE, LandmarkIndexEnum.RIGHT_HIP),
+        (LandmarkIndexEnum.RIGHT_ANKLE, LandmarkIndexEnum.RIGHT_HIP),
+        # RIGHT: ankles -> left hip
+        (LandmarkIndexEnum.LEFT_ANKLE, LandmarkIndexEnum.LEFT_HIP),
+        (LandmarkIndexEnum.RIGHT_ANKLE, LandmarkIndexEnum.LEFT_HIP),
+        # FRONT_PUNCH: elbow -> wrist, elbow -> shoulder, wrist -> shoulder
+        (LandmarkIndexEnum.LEFT_ELBOW, LandmarkIndexEnum.LEFT_WRIST),
+        (LandmarkIndexEnum.LEFT_ELBOW, LandmarkIndexEnum.LEFT_SHOULDER),
+        (LandmarkIndexEnum.LEFT_WRIST, LandmarkIndexEnum.LEFT_SHOULDER),
+        # BACK_PUNCH: elbow -> wrist, elbow -> shoulder, wrist -> shoulder
+        (LandmarkIndexEnum.RIGHT_ELBOW, LandmarkIndexEnum.RIGHT_WRIST),
+        (LandmarkIndexEnum.RIGHT_ELBOW, LandmarkIndexEnum.RIGHT_SHOULDER),
+        (LandmarkIndexEnum.RIGHT_WRIST, LandmarkIndexEnum.RIGHT_SHOULDER),
+        # FRONT_KICK, BACK_KICK: ankle -> hip
+        (LandmarkIndexEnum.LEFT_ANKLE, LandmarkIndexEnum.LEFT_HIP),
+        (LandmarkIndexEnum.RIGHT_ANKLE, LandmarkIndexEnum.RIGHT_HIP),
+        # TAG: elbows -> midpoint of wrists
+        (LandmarkIndexEnum.LEFT_ELBOW, _WRISTS_MID),
+        (LandmarkIndexEnum.RIGHT_ELBOW, _WRISTS_MID),
+    ])
+
+    # abs(sin(angle_a + angle_b)) is computed for each (a, b) pair of
+    # indices into _VECTORS, index len(_VECTORS) is a constant 0 angle
+    _NO_ANGLE = len(_VECTORS)
+    _SINES = np.array([
+        (0, _NO_ANGLE), (1, _NO_ANGLE), (2, _NO_ANGLE), (3, _NO_ANGLE),
+        (4, 5), (6, _NO_ANGLE), (7, 8), (9, _NO_ANGLE),
+        (10, _NO_ANGLE), (11, _NO_ANGLE), (12, 13),
+    ])
+
+    # Landmarks whose visibility is averaged for each check,
+    # padded with -1 where a group has less than 5 landmarks
+    _VISIBILITY_GROUPS = (
+        # UP
+        (
+            LandmarkIndexEnum.LEFT_ANKLE, LandmarkIndexEnum.RIGHT_ANKLE,
+            LandmarkIndexEnum.LEFT_KNEE, LandmarkIndexEnum.RIGHT_KNEE,
+        ),
+        # DOWN
+        (
+            LandmarkIndexEnum.RIGHT_HIP, LandmarkIndexEnum.LEFT_HIP,
+            LandmarkIndexEnum.RIGHT_KNEE, LandmarkIndexEnum.LEFT_KNEE,
+            LandmarkIndexEnum.NOSE,
+        ),
+        # LEFT, RIGHT
+        (
+            LandmarkIndexEnum.RIGHT_ANKLE, LandmarkIndexEnum.LEFT_ANKLE,
+            LandmarkIndexEnum.RIGHT_HIP,
+        ),
+        (
+            LandmarkIndexEnum.RIGHT_ANKLE, LandmarkIndexEnum.LEFT_ANKLE,
+            LandmarkIndexEnum.LEFT_HIP,
+        ),
+        # FRONT_PUNCH, BACK_PUNCH
+        (
+            LandmarkIndexEnum.LEFT_ELBOW, LandmarkIndexEnum.LEFT_WRIST,
+            LandmarkIndexEnum.LEFT_SHOULDER,
+        ),
+        (
+            LandmarkIndexEnum.RIGHT_ELBOW, LandmarkIndexEnum.RIGHT_WRIST,
+            LandmarkIndexEnum.RIGHT_SHOULDER,
+        ),
+        # FRONT_KICK, BACK_KICK
+        (LandmarkIndexEnum.LEFT_HIP, LandmarkIndexEnum.LEFT_ANKLE),
+        (LandmarkIndexEnum.RIGHT_HIP, LandmarkIndexEnum.RIGHT_ANKLE),
+        # THROW, BLOCK: right arm, left arm
+        (LandmarkIndexEnum.RIGHT_WRIST, LandmarkIndexEnum.RIGHT_ELBOW),
+        (LandmarkIndexEnum.LEFT_WRIST, LandmarkIndexEnum.LEFT_ELBOW),
+        # TAG
+        (
+            LandmarkIndexEnum.RIGHT_WRIST, LandmarkIndexEnum.LEFT_WRIST,
+            LandmarkIndexEnum.RIGHT_ELBOW, LandmarkIndexEnum.LEFT_ELBOW,
+        ),
+    )
+    _VISIBILITY_INDEX = np.array([
+        group + (-1,) * (5 - len(group)) for group in _VISIBILITY_GROUPS
+    ])
+    _VISIBILITY_MASK = _VISIBILITY_INDEX >= 0
+    _VISIBILITY_COUNT = _VISIBILITY_MASK.sum(axis=1)
+
+    # Landmarks whose `y` and `x` are compared directly
+    _Y_LANDMARKS = np.array([
+        LandmarkIndexEnum.NOSE,
+        LandmarkIndexEnum.RIGHT_WRIST, LandmarkIndexEnum.LEFT_WRIST,
+        LandmarkIndexEnum.RIGHT_ELBOW, LandmarkIndexEnum.LEFT_ELBOW,
+        LandmarkIndexEnum.RIGHT_HIP, LandmarkIndexEnum.LEFT_HIP,
+        LandmarkIndexEnum.RIGHT_KNEE, LandmarkIndexEnum.LEFT_KNEE,
+        LandmarkIndexEnum.RIGHT_ANKLE, LandmarkIndexEnum.LEFT_ANKLE,
+    ])
+    _X_LANDMARKS = np.array([
+        LandmarkIndexEnum.RIGHT_WRIST, LandmarkIndexEnum.LEFT_WRIST,
+        LandmarkIndexEnum.RIGHT_ELBOW, LandmarkIndexEnum.LEFT_ELBOW,
+        LandmarkIndexEnum.RIGHT_HIP, LandmarkIndexEnum.LEFT_HIP,
+        LandmarkIndexEnum.RIGHT_ANKLE, LandmarkIndexEnum.LEFT_ANKLE,
+    ])
+
+    def __init__(self):
+        super().__init__()
+
+        # Preallocated buffers, reused for every frame
+        self._landmarks = np.zeros((len(LandmarkIndexEnum), 4), np.float32)
+        self._points = np.zeros((len(LandmarkIndexEnum) + 1, 2), np.float64)
+        self._angles = np.zeros(len(self._VECTORS) + 1, np.float64)
+
+    def process(self, landmark_list):
+        """
+        landmark_list can be pose_landmarks.landmark or an array
+        returned by landmarks_to_array, returns same set as TranslatePose
+        """
+
+        return set([
+            self.MOVES[i] for i in np.flatnonzero(self.evaluate(landmark_list))
+        ])
+
+    def evaluate(self, landmark_list):
+        """
+        returns a boolean array, aligned with self.MOVES, of the moves
+        portrayed by given landmarks
+        """
+
+        return np.array(self._flags(landmark_list), dtype=bool)
+
+    def evaluate_bits(self, landmark_list):
+        """
+        returns <int>: bitmask of the moves portrayed by given landmarks,
+            bit i is self.MOVES[i] (see utils.MOVES)
+        """
+
+        bits = 0
+        for bit, flag in enumerate(self._flags(landmark_list)):
+            if flag:
+                bits |= 1 << bit
+        return bits
+
+    @classmethod
+    def mask_to_bits(cls, moves):
+        """
+        moves <np.ndarray>: boolean array(s) from evaluate or evaluate_batch
+        returns <int | np.ndarray>: bitmask(s) of the moves
+        """
+
+        bits = moves.astype(np.int64) @ (1 << np.arange(len(cls.MOVES)))
+        return int(bits) if np.ndim(bits) == 0 else bits
+
+    def _flags(self, landmark_list):
+        """
+        returns <list<bool>>: aligned with self.MOVES
+        """
+
+        if not isinstance(landmark_list, np.ndarray):
+            landmark_list = landmarks_to_array(landmark_list, self._landmarks)
+
+        # float32 -> float64 is exact, math is done in float64
+        # to match the scalar implementation at threshold boundaries
+        points = self._points
+        points[:-1] = landmark_list[:, :2]
+        points[-1] = (
+            points[LandmarkIndexEnum.LEFT_WRIST]
+            + points[LandmarkIndexEnum.RIGHT_WRIST]
+        ) / 2
+        visibility = landmark_list[:, 3].astype(np.float64)
+
+        # Visibility Check
+        visible = np.where(
+            self._VISIBILITY_MASK, visibility[self._VISIBILITY_INDEX], 0
+        ).sum(axis=1) / self._VISIBILITY_COUNT
+        (
+            up_vis, down_vis, left_vis, right_vis, f_punch_vis, b_punch_vis,
+            f_kick_vis, b_kick_vis, _, _, tag_vis
+        ) = (visible >= self.visibility_threshold).tolist()
+        # THROW and BLOCK require arms to be strictly above the threshold
+        r_arm_vis, l_arm_vis = (visible[8:10] > self.visibility_threshold).tolist()
+        nose_vis = bool(
+            visibility[LandmarkIndexEnum.NOSE] >= self.visibility_threshold
+        )
+
+        # Mathematics: every angle and sine in one go
+        delta = points[self._VECTORS[:, 1]] - points[self._VECTORS[:, 0]]
+        np.arctan2(delta[:, 1], delta[:, 0], out=self._angles[:-1])
+        (
+            l_sin_l_ankle, l_sin_r_ankle, r_sin_l_ankle, r_sin_r_ankle,
+            f_punch_arm, f_punch_slope, b_punch_arm, b_punch_slope,
+            f_kick, b_kick, tag_arms,
+        ) = np.abs(np.sin(
+            self._angles[self._SINES[:, 0]] + self._angles[self._SINES[:, 1]]
+        )).tolist()
+
+        # remaining comparisons are on a handful of python floats
+        (
+            nose_y, r_wrist_y, l_wrist_y, r_elbow_y, l_elbow_y,
+            r_hip_y, l_hip_y, r_knee_y, l_knee_y, r_ankle_y, l_ankle_y,
+        ) = points[self._Y_LANDMARKS, 1].tolist()
+        (
+            r_wrist_x, l_wrist_x, r_elbow_x, l_elbow_x,
+            r_hip_x, l_hip_x, r_ankle_x, l_ankle_x,
+        ) = points[self._X_LANDMARKS, 0].tolist()
+
+        median_of_body_x = (r_ankle_x + l_ankle_x)/2
+
+        hip_y = (r_hip_y + l_hip_y)/2
+        knee_y = (r_knee_y + l_knee_y)/2
+        try:
+            down_ratio = abs(hip_y - nose_y) / abs(knee_y - nose_y)
+        except ZeroDivisionError:
+            down_ratio = float('inf')
+        try:
+            tag_ratio = abs(r_wrist_x - l_wrist_x) / abs(r_elbow_x - l_elbow_x)
+        except ZeroDivisionError:
+            tag_ratio = float('inf')
+
+        return [
+            # UP
+            up_vis and (l_ankle_y + r_ankle_y) < (r_knee_y + l_knee_y),
+            # DOWN
+            down_vis and down_ratio > self.down_ratio_threshold,
+            # LEFT
+            left_vis
+            and (l_sin_l_ankle + l_sin_r_ankle)/2 > self.visibility_threshold
+            and median_of_body_x < r_hip_x,
+            # RIGHT
+            right_vis
+            and (r_sin_l_ankle + r_sin_r_ankle)/2 > self.visibility_threshold
+            and median_of_body_x > l_hip_x,
+            # FRONT_PUNCH
+            f_punch_vis and f_punch_arm < self.parallel_threshold
+            and f_punch_slope < self.parallel_threshold,
+            # BACK_PUNCH
+            b_punch_vis and b_punch_arm < self.parallel_threshold
+            and b_punch_slope < self.parallel_threshold,
+            # FRONT_KICK
+            f_kick_vis and f_kick < self.kick_threshold,
+            # BACK_KICK
+            b_kick_vis and b_kick < self.kick_threshold,
+            # THROW
+            nose_vis and (
+                (r_arm_vis and r_wrist_y < r_elbow_y < nose_y)
+                or (l_arm_vis and l_wrist_y < l_elbow_y < nose_y)
+            ),
+            # TAG
+            tag_vis and tag_arms < self.parallel_threshold
+            and tag_ratio < self.tag_ratio_threshold,
+            # BLOCK
+            nose_vis and (
+                (r_arm_vis and r_wrist_y < nose_y < r_elbow_y)
+                or (l_arm_vis and l_wrist_y < nose_y < l_elbow_y)
+            ),
+        ]
+
+    def evaluate_batch(self, landmarks):
+        """
+        landmarks <np.ndarray>: (N, 33, 4) landmarks of N frames
+        returns <np.ndarray>: (N, len(self.MOVES)) boolean array, row i has
+            the moves portrayed by landmarks[i]
+        """
+
+        # float32 -> float64 is exact, math is done in float64
+        # to match the scalar implementation at threshold boundaries
+        points = landmarks[:, :, :2].astype(np.float64)
+        points = np.concatenate((
+            points,
+            (
+                points[:, LandmarkIndexEnum.LEFT_WRIST]
+                + points[:, LandmarkIndexEnum.RIGHT_WRIST]
+            )[:, np.newaxis] / 2
+        ), axis=1)
+        x, y = points[:, :, 0], points[:, :, 1]
+        visibility = landmarks[:, :, 3].astype(np.float64)
+
+        # Visibility Check
+        visible = np.where(
+            self._VISIBILITY_MASK, visibility[:, self._VISIBILITY_INDEX], 0
+        ).sum(axis=2) / self._VISIBILITY_COUNT
+        passed = visible >= self.visibility_threshold
+        # THROW and BLOCK require arms to be strictly above the threshold
+        r_arm_vis, l_arm_vis = (visible[:, 8:10] > self.visibility_threshold).T
+        nose_vis = visibility[:, LandmarkIndexEnum.NOSE] >= self.visibility_threshold
+
+        # Mathematics: every angle and sine in one go
+        delta = points[:, self._VECTORS[:, 1]] - points[:, self._VECTORS[:, 0]]
+        angles = np.zeros((len(landmarks), self._NO_ANGLE + 1))
+        np.arctan2(delta[:, :, 1], delta[:, :, 0], out=angles[:, :-1])
+        (
+            l_sin_l_ankle, l_sin_r_ankle, r_sin_l_ankle, r_sin_r_ankle,
+            f_punch_arm, f_punch_slope, b_punch_arm, b_punch_slope,
+            f_kick, b_kick, tag_arms,
+        ) = np.abs(np.sin(
+            angles[:, self._SINES[:, 0]] + angles[:, self._SINES[:, 1]]
+        )).T
+
+        nose_y = y[:, LandmarkIndexEnum.NOSE]
+        r_wrist_y = y[:, LandmarkIndexEnum.RIGHT_WRIST]
+        l_wrist_y = y[:, LandmarkIndexEnum.LEFT_WRIST]
+        r_elbow_y = y[:, LandmarkIndexEnum.RIGHT_ELBOW]
+        l_elbow_y = y[:, LandmarkIndexEnum.LEFT_ELBOW]
+
+        median_of_body_x = (
+            x[:, LandmarkIndexEnum.RIGHT_ANKLE] + x[:, LandmarkIndexEnum.LEFT_ANKLE]
+        ) / 2
+        hip_y = (
+            y[:, LandmarkIndexEnum.RIGHT_HIP] + y[:, LandmarkIndexEnum.LEFT_HIP]
+        ) / 2
+        knee_y = (
+            y[:, LandmarkIndexEnum.RIGHT_KNEE] + y[:, LandmarkIndexEnum.LEFT_KNEE]
+        ) / 2
+
+        # a zero denominator counts as an infinite ratio, as in TranslatePose
+        with np.errstate(divide='ignore', invalid='ignore'):
+            denominator = np.abs(knee_y - nose_y)
+            down_ratio = np.where(
+                denominator == 0, np.inf, np.abs(hip_y - nose_y) / denominator
+            )
+            denominator = np.abs(
+                x[:, LandmarkIndexEnum.RIGHT_ELBOW] - x[:, LandmarkIndexEnum.LEFT_ELBOW]
+            )
+            tag_ratio = np.where(
+                denominator == 0, np.inf, np.abs(
+                    x[:, LandmarkIndexEnum.RIGHT_WRIST]
+                    - x[:, LandmarkIndexEnum.LEFT_WRIST]
+                ) / denominator
+            )
+
+        moves = np.empty((len(landmarks), len(self.MOVES)), dtype=bool)
+        # UP
+        moves[:, 0] = passed[:, 0] & (
+            y[:, LandmarkIndexEnum.LEFT_ANKLE] + y[:, LandmarkIndexEnum.RIGHT_ANKLE]
+            < y[:, LandmarkIndexEnum.RIGHT_KNEE] + y[:, LandmarkIndexEnum.LEFT_KNEE]
+        )
+        # DOWN
+        moves[:, 1] = passed[:, 1] & (down_ratio > self.down_ratio_threshold)
+        # LEFT
+        moves[:, 2] = (
+            passed[:, 2]
+            & ((l_sin_l_ankle + l_sin_r_ankle) / 2 > self.visibility_threshold)
+            & (median_of_body_x < x[:, LandmarkIndexEnum.RIGHT_HIP])
+        )
+        # RIGHT
+        moves[:, 3] = (
+            passed[:, 3]
+            & ((r_sin_l_ankle + r_sin_r_ankle) / 2 > self.visibility_threshold)
+            & (median_of_body_x > x[:, LandmarkIndexEnum.LEFT_HIP])
+        )
+        # FRONT_PUNCH, BACK_PUNCH
+        moves[:, 4] = (
+            passed[:, 4] & (f_punch_arm < self.parallel_threshold)
+            & (f_punch_slope < self.parallel_threshold)
+        )
+        moves[:, 5] = (
+            passed[:, 5] & (b_punch_arm < self.parallel_threshold)
+            & (b_punch_slope < self.parallel_threshold)
+        )
+        # FRONT_KICK, BACK_KICK
+        moves[:, 6] = passed[:, 6] & (f_kick < self.kick_threshold)
+        moves[:, 7] = passed[:, 7] & (b_kick < self.kick_threshold)
+        # THROW
+        moves[:, 8] = nose_vis & (
+            (r_arm_vis & (r_wrist_y < r_elbow_y) & (r_elbow_y < nose_y))
+            | (l_arm_vis & (l_wrist_y < l_elbow_y) & (l_elbow_y < nose_y))
+        )
+        # TAG
+        moves[:, 9] = (
+            passed[:, 10] & (tag_arms < self.parallel_threshold)
+            & (tag_ratio < self.tag_ratio_threshold)
+        )
+        # BLOCK
+        moves[:, 10] = nose_vis & (
+            (r_arm_vis & (r_wrist_y < nose_y) & (nose_y < r_elbow_y))
+            | (l_arm_vis & (l_wrist_y < nose_y) & (nose_y < l_elbow_y))
+        )
+        return moves
@@ -0,0 +1,147 @@
+# ./video_log.py
+
+import time
+import threading
+from collections import deque
+
+import cv2
+
+
+class AsyncVideoLog:
+    """
+    Same `write` and `release` as cv2.VideoWriter, but frames are encoded on
+    a background thread, `write` only appends the frame to a bounded buffer
+    (if the encoder falls behind, new frames are dropped instead of blocking).
+
+    Every encoded frame gets its real timestamp written to a sidecar
+    `<path>.timestamps.csv`, and with fps <= 0 the FPS of the video is
+    measured from the first frames, so that logs replay at true speed.
+    """
+
+    # Frames used to measure the FPS when fps <= 0
+    FPS_SAMPLE_SIZE = 30
+
+    def __init__(
+        self, path, fps, size, codec="XVID", scale=1.0, every=1, buffer_size=64
+    ):
+        """
+        path <str>: path of the video, its extension decides the container
+        fps <float>: FPS of the frames given to write (divided by `every`
+            for the video), <= 0 to measure it from the first kept frames
+        size <tuple<int>>: (width, height) of the frames given to write
+        codec <str>: FourCC of the codec (eg: XVID, MJPG, mp4v, avc1)
+        scale <float>: frames are resized by this factor before encoding
+        every <int>: only every nth frame is kept (frame decimation)
+        buffer_size <int>: max frames waiting to be encoded
+        """
+
+        self.path = path
+        self.fps = fps
+        self.codec = codec
+        self.every = max(int(every), 1)
+        self.buffer_size = buffer_size
+        self.size = size
+        self.out_size = (
+            max(int(size[0] * scale), 1), max(int(size[1] * scale), 1)
+        )
+
+        self.frames_given = 0
+        self.frames_written = 0
+        self.dropped = 0
+
+        self._writer = None
+        self._buffer = deque()
+        self._closed = False
+        self._not_empty = threading.Condition()
+        self._timestamps = self._open_timestamps()
+        self._timestamps.write("frame,timestamp\n")
+
+        self._worker = threading.Thread(
+            target=self._run, name='video_log', daemon=True
+        )
+        self._worker.start()
+
+    def write(self, img, timestamp=None):
+        """
+        img <np.ndarray>: BGR frame, must not be modified afterwards
+        timestamp <float>: time.time() the frame was captured, defaults to now
+        """
+
+        self.frames_given += 1
+        if (self.frames_given - 1) % self.every:
+            return
+
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._not_empty:
+            if len(self._buffer) >= self.buffer_size:
+                self.dropped += 1
+                return
+            self._buffer.append((img, timestamp))
+            self._not_empty.notify()
+
+    def release(self):
+        """
+        encodes the remaining frames, then closes the video and the sidecar
+        """
+
+        with self._not_empty:
+            self._closed = True
+            self._not_empty.notify()
+        self._worker.join()
+
+        if self._writer is not None:
+            self._writer.release()
+        self._timestamps.close()
+
+    def _open_timestamps(self):
+        return open(f"{self.path}.timestamps.csv", "w")
+
+    def _open_writer(self, timestamps):
+        if self.fps > 0:
+            # Only every nth frame of the source is kept
+            fps = self.fps / self.every
+        else:
+            # Measured FPS of the kept frames
+            elapsed = timestamps[-1] - timestamps[0]
+            fps = (len(timestamps) - 1) / elapsed if elapsed > 0 else 20
+        self.fps = fps
+
+        self._writer = cv2.VideoWriter(
+            self.path, cv2.VideoWriter_fourcc(*self.codec), fps, self.out_size
+        )
+
+    def _encode(self, img, timestamp):
+        if self.out_size != self.size:
+            img = cv2.resize(img, self.out_size, interpolation=cv2.INTER_AREA)
+        self._writer.write(img)
+        self._timestamps.write(f"{self.frames_written},{timestamp:.6f}\n")
+        self.frames_written += 1
+
+    def _run(self):
+        # Frames held back until the FPS is known
+        pending = []
+
+        while True:
+            with self._not_empty:
+                while not self._buffer and not self._closed:
+                    self._not_empty.wait()
+                if not self._buffer:
+                    break
+                img, timestamp = self._buffer.popleft()
+
+            if self._writer is None:
+                pending.append((img, timestamp))
+                if self.fps > 0 or len(pending) >= self.FPS_SAMPLE_SIZE:
+                    self._open_writer([timestamp for _, timestamp in pending])
+                    for frame in pending:
+                        self._encode(*frame)
+                    pending = []
+                continue
+
+            self._encode(img, timestamp)
+
+        # Closed before the FPS could be measured
+        if pending:
+            self._open_writer([timestamp for _, timestamp in pending])
+            for frame in pending:
+                self._encode(*frame)